@@ -0,0 +1,110 @@
+import argparse
+import os
+import sqlite3
+import sys
+
+from .export import export_dataset
+from .image_index import ImageIndex
+from .journal import Journal
+from .label_import import LabelImporter
+from .store import AnnotationStore
+from .stored_label_check import MODE_FOLDERS, MODES, render_label_checks
+from .video import is_frame_path, source_file
+
+# Where the GUI writes dataset/, labels/ and data.yaml
+APP_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_session(folder_path, image_paths, store, labels_directory):
+    # Fill store with the saved session of folder_path (snapshot + journal) if there is one,
+    # otherwise with the YOLO labels of image_paths found in labels_directory. A session that
+    # ended mid-import gets the labels of the images it does not have yet.
+    # Returns a description of the source.
+    journal = Journal(folder_path)
+    sources = []
+    if journal.has_session():
+        journal.replay(store)
+        sources.append(f"session in {journal.directory}")
+        if not journal.import_pending():
+            return sources[0]
+    importer = LabelImporter(os.path.join(labels_directory, "labels"), os.path.join(labels_directory, "data.yaml"),
+                             folder=folder_path, skip=store.path_ids)
+    try:
+        importer.load_now(store, image_paths)
+    finally:
+        importer.close()
+    sources.append(f"labels in {os.path.join(labels_directory, 'labels')}")
+    return " and ".join(sources)
+
+
+def open_index(folder_path, workers=8, video_stride=1):
+    try:
+        index = ImageIndex(folder_path, workers=workers, video_stride=video_stride)
+    except (OSError, sqlite3.Error):
+        # Read-only folder: index in memory for this run
+        index = ImageIndex(folder_path, database=":memory:", workers=workers, video_stride=video_stride)
+    index.refresh()
+    return index
+
+
+def export_command(args):
+    folder_path = os.path.abspath(args.folder)
+    output_directory = os.path.abspath(args.output)
+    index = open_index(folder_path, args.workers, args.video_stride)
+    image_paths = index.paths()
+    store = AnnotationStore()
+    source = load_session(folder_path, image_paths, store, args.labels or output_directory)
+    # Frames labelled at another stride than this run's are exported too
+    listed = set(image_paths)
+    image_paths += [p for p in store.labelled_paths()
+                    if is_frame_path(p) and p not in listed and os.path.exists(source_file(p))]
+    print(f"Loaded {len(store)} bounding boxes on {len(store.labelled_paths())} of {len(image_paths)} images from {source}.")
+
+    export_stats = export_dataset(store, image_paths, output_directory, args.workers, sizes=index, folder=folder_path)
+    index.set_labelled(store.labelled_paths())
+    index.close()
+    print(export_stats.summary())
+    for image_path, error in export_stats.errors:
+        print(f"Failed to export {image_path}: {error}")
+
+    failed = bool(export_stats.errors)
+    if args.label_check != "none":
+        check_stats = render_label_checks(output_directory, args.workers, mode=args.label_check)
+        print(check_stats.summary())
+        for filename, error in check_stats.errors:
+            print(f"Failed to render {filename}: {error}")
+        failed = failed or bool(check_stats.errors)
+        print(f"Label check written to {os.path.join(output_directory, 'labelcheck', MODE_FOLDERS[args.label_check])}")
+    print(f"DONE: dataset/, labels/ and data.yaml written to {output_directory}")
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app", description="YOLO labeling app.")
+    commands = parser.add_subparsers(dest="command")
+    gui = commands.add_parser("gui", help="start the labeling window (default)")
+    gui.add_argument("--video-stride", type=int, default=1, help="show every Nth frame of videos in the folder")
+    export = commands.add_parser("export", help="export a labeled folder without opening a window")
+    export.add_argument("folder", help="image folder that was labeled")
+    export.add_argument("-o", "--output", default=APP_DIRECTORY,
+                        help="where to write dataset/, labels/ and data.yaml (default: the app folder, like DONE)")
+    export.add_argument("--labels", default=None,
+                        help="folder with labels/ and data.yaml to load when the image folder has no saved "
+                             "session (default: the output folder)")
+    export.add_argument("-j", "--workers", type=int, default=8, help="worker threads and processes")
+    export.add_argument("--label-check", choices=MODES + ("none",), default="sheets",
+                        help="label check output to render after the export")
+    export.add_argument("--video-stride", type=int, default=1,
+                        help="every Nth frame of videos is looked up in labels/ (frames with boxes are always exported)")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        return export_command(args)
+    # Only the GUI needs tkinter, so it is imported here
+    from .app import main as gui_main
+    gui_main(getattr(args, "video_stride", 1))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,39 @@
 import tkinter as tk
 from tkinter import filedialog, simpledialog
-from PIL import Image, ImageTk
+from PIL import ImageTk
 import os
+import sqlite3
+import sys
+
+if not __package__:
+    # Allow running as a plain script (python app/app.py) as well as python -m app.app
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = "app"
+
+from .box_panel import BoxListPanel
+from .canvas_layer import BoxLayer, TileLayer
+from .export import export_dataset
+from .filmstrip import Filmstrip
+from .frame_cache import FrameCache
+from .image_index import ImageIndex
+from .journal import Journal
+from .label_import import LabelImporter
+from .motion import MotionCoalescer
+from .prefetch import ImagePrefetcher
+from .scanner import FolderScanner
+from .spatial_index import GridIndex
+from .store import AnnotationStore
+from .tracing import save_trace_from_env, traced, tracer
+from .stored_label_check import render_label_checks
+from .thumbnails import ThumbnailSource
+from .tiles import TileSource
+from .video import DECODE_ERRORS, source_file
 
 # Class definition
 class ImageBoundingBoxApp:
-    def __init__(self, master):
+    def __init__(self, master, video_stride=1):
         self.master = master
+        self.video_stride = video_stride  # Every how many frames of a video are shown
         self.master.title("Image Bounding Box app")
 
         # Frame for the main window
@@ -17,20 +44,55 @@ class ImageBoundingBoxApp:
         self.side_panel = tk.Frame(master)
         self.side_panel.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
 
+        # Initialize variables
+        self.image_files = []
+        self.image_file_set = set()  # Same paths, for membership tests while scanning
+        self.current_index = 0
+        self.current_image = None
+        self.store = AnnotationStore()  # Bounding box coordinates and labels of every image
+        self.selected_bbox = None  # Box id of the currently selected bounding box
+        self.spatial_indexes = {}  # Per-image grid index of the boxes for hit testing
+        self.journal = None  # Write-ahead log of the edits in the selected folder
+        self.label_importer = None  # Background loader of previously exported labels
+        self.image_index = None  # Persistent index of the images in the selected folder
+        self.scanner = None  # Background walk of the selected folder
+        self.scan_seen = []  # Index names the current walk has found
+
         # Button to select a folder
         self.select_folder_btn = tk.Button(frame, text="Select Folder", command=self.select_folder)
         self.select_folder_btn.pack()
 
-        # Create canvas to display images
+        # Thumbnails of the whole folder along the bottom; clicking one jumps to that image
+        self.thumbnail_source = ThumbnailSource(workers=2)
+        self.filmstrip = Filmstrip(frame, self.thumbnail_source, lambda: self.image_files, self.store.count,
+                                   self.go_to_image)
+
+        # Create canvas to display images; it grows with the window
         self.canvas = tk.Canvas(frame, width=800, height=600)
-        self.canvas.pack()
+        self.canvas.pack(fill=tk.BOTH, expand=True)
 
-        # Initialize variables
-        self.image_files = []
-        self.current_index = 0
-        self.current_image = None
-        self.bounding_boxes = {}  # Dictionary to hold bounding box coordinates and labels for each image
-        self.selected_bbox = None  # Track the currently selected bounding box
+        # The image is re-fitted from its decoded pixels once the window has stopped changing size
+        self.canvas_size = (800, 600)
+        self.refit_delay_ms = 120
+        self.refit_job = None
+        self.decoded = None  # DecodedImage currently shown at the fitted zoom
+        self.canvas.bind("<Configure>", self.on_canvas_configure)
+
+        # Persistent canvas items for the bounding boxes of the current image
+        self.box_layer = BoxLayer(self.canvas)
+
+        # Zoomed-in views are drawn from a tile pyramid so only the visible part is decoded
+        self.tile_source = TileSource(workers=2)
+        self.tile_layer = TileLayer(self.canvas, self.tile_source)
+        self.max_zoom = 8.0  # Screen pixels per image pixel
+        self.zoom_step = 1.25
+
+        # Decode neighbouring images in the background so Previous/Next do not stall the UI
+        self.prefetcher = ImagePrefetcher(radius=3, max_bytes=256 * 1024 * 1024, budget_ms=25)
+
+        # Re-render at full quality once the user has stayed on an image for this long
+        self.upgrade_delay_ms = 400
+        self.upgrade_job = None
 
         # Create buttons to navigate images
         self.prev_btn = tk.Button(frame, text="Previous", command=self.prev_image)
@@ -47,84 +109,385 @@ class ImageBoundingBoxApp:
         self.done_btn = tk.Button(frame, text="DONE", command=self.on_done)
         self.done_btn.pack(side=tk.RIGHT)
 
-        # Add a listbox to the side panel to display bounding box information
-        self.bbox_listbox = tk.Listbox(self.side_panel)
-        self.bbox_listbox.pack(fill=tk.BOTH, expand=True)
+        # Side panel listing the bounding boxes of the current image, filterable by class
+        self.box_panel = BoxListPanel(self.side_panel, self.store, self.on_box_panel_select)
 
         # Bind mouse events to draw and select bounding boxes
         self.canvas.bind("<Button-1>", self.on_mouse_down)
         self.canvas.bind("<B1-Motion>", self.on_mouse_drag)
         self.canvas.bind("<ButtonRelease-1>", self.on_mouse_up)
 
-        # Bind listbox selection event
-        self.bbox_listbox.bind("<<ListboxSelect>>", self.on_bbox_listbox_select)
+        # Wheel zooms around the pointer, the right (or middle) button drags the view
+        self.canvas.bind("<MouseWheel>", self.on_wheel)
+        self.canvas.bind("<Button-4>", self.on_wheel)
+        self.canvas.bind("<Button-5>", self.on_wheel)
+        for button in (2, 3):
+            self.canvas.bind(f"<Button-{button}>", self.on_pan_start)
+            self.canvas.bind(f"<B{button}-Motion>", self.on_pan_drag)
 
         # Initial state
         self.drawing = False
         self.bbox_start = None
 
+        # Rubber band updates are coalesced to one per frame however fast motion events arrive
+        self.drag_motion = MotionCoalescer(self.master, self.draw_rubber_band)
+        self.pan_motion = MotionCoalescer(self.master, self.pan_to)
+
         # Add a message widget to display status messages
         self.status_message = tk.Message(frame, text="", width=200)
         self.status_message.pack(side=tk.BOTTOM)
 
+        # Make sure the journal reaches the disk when the window is closed
+        self.master.protocol("WM_DELETE_WINDOW", self.on_close)
+
     def select_folder(self):
         # Open file dialog to select a folder
         folder_path = filedialog.askdirectory()
         if folder_path:
-            self.image_files = [os.path.join(folder_path, f) for f in os.listdir(folder_path) if f.endswith(('jpg', 'jpeg', 'png'))]
+            # Start from the images indexed in a previous session, then pick up what changed on disk
+            # with a background scan, so neither a huge nor a slow folder blocks the UI
+            self.open_image_index(folder_path)
+            self.image_files = self.image_index.paths()
+            self.image_file_set = set(self.image_files)
             self.current_index = 0
+            self.thumbnail_source.set_folder(folder_path)
+            self.filmstrip.reset()
+            self.prefetcher.clear()
+            self.open_frame_cache(folder_path)
+            self.tile_layer.clear()
+            self.tile_source.clear()
+            self.tile_source.set_folder(folder_path)
+            self.spatial_indexes = {}
+            self.stop_label_import()
+            recovered = self.open_journal(folder_path)
+            if not recovered or (self.journal is not None and self.journal.import_pending()):
+                # First session here, or one that ended before its import finished
+                self.start_label_import()
             self.load_image()
+            self.start_scan()
+
+    def open_image_index(self, folder_path):
+        # Only files added or modified since the last session are probed
+        self.close_image_index()
+        try:
+            self.image_index = ImageIndex(folder_path, video_stride=self.video_stride)
+        except (OSError, sqlite3.Error):
+            # Read-only folder: keep the index in memory for this session
+            self.image_index = ImageIndex(folder_path, database=":memory:", video_stride=self.video_stride)
+
+    def open_frame_cache(self, folder_path):
+        # Renders from earlier sessions are mapped from disk instead of decoded again
+        try:
+            frames = FrameCache.for_folder(folder_path)
+        except (OSError, sqlite3.Error):
+            frames = None
+        self.prefetcher.set_frame_cache(frames)
+
+    def close_image_index(self):
+        self.stop_scan()
+        if self.image_index is not None:
+            self.image_index.set_labelled(self.store.labelled_paths())
+            self.image_index.close()
+            self.image_index = None
+
+    def start_scan(self):
+        index = self.image_index
+        known = index.known_files()
+        # New and modified files are probed on the scanner thread; the index is written here
+        scanner = FolderScanner(index.folder, process=lambda batch: index.probe_changed(batch, known))
+        self.scanner = scanner
+        self.scan_seen = []
+        scanner.start()
+        self.master.after(50, self.poll_scan, scanner, known)
+
+    def poll_scan(self, scanner, known):
+        if scanner is not self.scanner:
+            return
+        new_paths = []
+        for names, rows in scanner.poll():
+            self.image_index.apply(rows)
+            self.scan_seen.extend(names)
+            for image_path in self.image_index.expand(names):
+                if image_path not in self.image_file_set:
+                    self.image_file_set.add(image_path)
+                    new_paths.append(image_path)
+        if new_paths:
+            first_images = not self.image_files
+            self.image_files.extend(new_paths)
+            self.filmstrip.set_count(len(self.image_files))
+            if self.label_importer is not None:
+                if first_images:
+                    self.journal_import(self.label_importer.load_now, new_paths[:1])
+                self.label_importer.submit(new_paths)
+            if first_images:
+                # Show the first image as soon as it is found
+                self.load_image()
 
+        if not scanner.done():
+            self.status_message.config(text=f"Scanning... {scanner.found} images found")
+            self.master.after(100, self.poll_scan, scanner, known)
+            return
+        self.scanner = None
+        removed = set(self.image_index.remove_missing(self.scan_seen, known))
+        if removed:
+            self.remove_image_files(removed)
+        if scanner.error is not None:
+            self.status_message.config(text=f"Scan failed: {scanner.error}")
+        else:
+            self.status_message.config(text=f"Found {len(self.image_files)} images.")
+
+    def remove_image_files(self, removed):
+        # Drop images (and the frames of videos) deleted from disk since the last session,
+        # staying on the current image if it still exists
+        current = self.image_files[self.current_index] if self.image_files else None
+        self.image_files = [p for p in self.image_files if source_file(p) not in removed]
+        self.image_file_set = set(self.image_files)
+        self.filmstrip.reset()
+        if current is not None and source_file(current) in removed:
+            self.current_index = max(0, min(self.current_index, len(self.image_files) - 1))
+            self.load_image()
+        elif current is not None:
+            self.current_index = self.image_files.index(current)
+            self.filmstrip.show_current(self.current_index)
+
+    def stop_scan(self):
+        if self.scanner is not None:
+            self.scanner.cancel()
+            self.scanner = None
+
+    def open_journal(self, folder_path):
+        # Recover the boxes of a previous session in this folder and keep journaling new edits.
+        # Returns True if a saved session was found.
+        self.close_journal()
+        journal = Journal(folder_path)
+        # A snapshot or a non-empty journal; DONE closes the journal without compacting it, so
+        # most sessions are only a journal. Either way labels/ must not be imported on top.
+        recovered = journal.has_session()
+        try:
+            journal.replay(self.store)
+            journal.start()
+        except OSError as error:
+            # Read-only folder: labeling still works, just without crash recovery
+            self.status_message.config(text=f"Autosave disabled: {error}")
+            return recovered
+        self.journal = journal
+        if len(self.store):
+            self.status_message.config(text=f"Recovered {len(self.store)} bounding boxes.")
+        return recovered
+
+    def start_label_import(self):
+        # Resume editing the labels written to labels/ by a previous export. Images already in a
+        # resumed session keep what the session has.
+        self.stop_label_import()
+        script_directory = os.path.dirname(__file__)
+        importer = LabelImporter(os.path.join(script_directory, "labels"), os.path.join(script_directory, "data.yaml"),
+                                 folder=self.image_index.folder, skip=self.store.path_ids)
+        if importer.empty():
+            importer.close()
+            self.label_importer = None
+            if self.journal is not None and self.journal.import_pending():
+                self.journal.end_import(self.store)
+                self.check_journal()
+            return
+        if self.journal is not None:
+            try:
+                self.journal.begin_import()
+            except OSError as error:
+                self.status_message.config(text=f"Autosave failed: {error}")
+        self.label_importer = importer
+        # The first image gets its labels right away, the rest load in the background
+        self.journal_import(importer.load_now, self.image_files[:1])
+        importer.submit(self.image_files)
+        self.master.after(50, self.poll_label_import, importer)
+
+    def journal_import(self, apply, *args):
+        # Run an importer step that appends boxes to the store, and journal the appended rows so
+        # imported boxes survive a crash like edits do
+        start = self.store.rows_used
+        changed = apply(self.store, *args)
+        if self.journal is not None:
+            self.journal.record_extend(self.store, start, self.store.rows_used)
+        return changed
+
+    def poll_label_import(self, importer):
+        if importer is not self.label_importer:
+            return
+        changed = self.journal_import(importer.apply_ready)
+        for image_path in changed:
+            self.spatial_indexes.pop(image_path, None)
+        if changed:
+            self.filmstrip.refresh_badges(set(changed))
+        if self.image_files and self.image_files[self.current_index] in changed:
+            self.redraw_bounding_boxes()
+            self.update_bounding_box_list()
+        if importer.done() and self.scanner is None:
+            self.status_message.config(text=f"Loaded {importer.loaded_boxes} existing bounding boxes.")
+            # Fold the imported boxes into a snapshot and clear the import marker
+            if self.journal is not None:
+                self.journal.end_import(self.store)
+                self.check_journal()
+            importer.close()
+            self.label_importer = None
+        else:
+            self.status_message.config(text=f"Loading labels... {importer.loaded_boxes} bounding boxes")
+            self.master.after(50, self.poll_label_import, importer)
+
+    def stop_label_import(self):
+        # Its pending results belong to the folder it was started for
+        if self.label_importer is not None:
+            self.label_importer.close()
+            self.label_importer = None
+
+    def close_journal(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    def check_journal(self):
+        # The writer thread only records its I/O errors (disk full, folder gone); report each one
+        # once, where scan errors go, so the user knows edits are no longer being saved
+        error = self.journal.error
+        if error is not None:
+            self.journal.error = None
+            self.status_message.config(text=f"Autosave failed: {error}")
+
+    @traced("load_image")
     def load_image(self):
-        # Clear existing bounding boxes and labels from the canvas
-        self.canvas.delete("bbox")
-        self.canvas.delete("bbox_label")
+        # Clear the previous image and existing bounding boxes and labels from the canvas
+        self.canvas.delete("image")
+        self.tile_layer.clear()
+        self.box_layer.clear()
+        self.selected_bbox = None
+        self.pyramid = None
+        self.decoded = None
 
         if self.image_files:
             image_path = self.image_files[self.current_index]
-            self.current_image = Image.open(image_path)
-
-            # Resize the image to fit within the canvas while maintaining the aspect ratio
-            canvas_width, canvas_height = self.canvas.winfo_width(), self.canvas.winfo_height()
-            img_width, img_height = self.current_image.size
-            self.resize_ratio = min(canvas_width / img_width, canvas_height / img_height)
-            new_width, new_height = int(img_width * self.resize_ratio), int(img_height * self.resize_ratio)
-            resized_image = self.current_image.resize((new_width, new_height), Image.LANCZOS)  # Use Image.LANCZOS here
 
-            self.photo_image = ImageTk.PhotoImage(resized_image)
-            self.canvas.create_image(0, 0, anchor=tk.NW, image=self.photo_image)
+            # Take the image fitted to the canvas from the prefetch cache (decoding it now on a miss)
+            canvas_size = self.canvas_size
+            try:
+                with tracer.span("get_decoded"):
+                    decoded = self.prefetcher.get(image_path, canvas_size)
+            except DECODE_ERRORS as error:
+                # Corrupt, truncated or too large: stay on it with an empty canvas so the user can move on
+                self.current_image = None
+                self.status_message.config(text=f"Cannot open {os.path.basename(image_path)}: {error}")
+                self.filmstrip.show_current(self.current_index)
+                self.prefetcher.prefetch(self.image_files, self.current_index, canvas_size)
+                self.update_bounding_box_list()
+                return
+            self.decoded = decoded
+            self.current_image = decoded.image
+            self.current_image_size = decoded.original_size
+            # Every image opens fitted to the canvas; resize_ratio is the current zoom from there on
+            self.fit_ratio = decoded.resize_ratio
+            self.resize_ratio = decoded.resize_ratio
+
+            with tracer.span("photo_image"):
+                self.photo_image = ImageTk.PhotoImage(decoded.image)
+            with tracer.span("canvas_image"):
+                self.canvas.create_image(0, 0, anchor=tk.NW, image=self.photo_image, tag="image")
+                self.canvas.tag_lower("image")
+            self.canvas.config(scrollregion=(0, 0, decoded.image.width, decoded.image.height))
+            self.canvas.xview_moveto(0)
+            self.canvas.yview_moveto(0)
+
+            self.filmstrip.show_current(self.current_index)
+
+            # Start decoding the neighbours of the new position
+            self.prefetcher.prefetch(self.image_files, self.current_index, canvas_size)
+            self.schedule_quality_upgrade(decoded, canvas_size)
 
             # Draw existing bounding boxes and labels for the current image
-            if image_path in self.bounding_boxes:
-                for bbox in self.bounding_boxes[image_path]:
-                    # Adjust bounding box coordinates according to the resized image
-                    coords = bbox["coords"]
-                    scaled_coords = (
-                        coords[0] * self.resize_ratio,
-                        coords[1] * self.resize_ratio,
-                        coords[2] * self.resize_ratio,
-                        coords[3] * self.resize_ratio
-                    )
-                    # Draw bounding box
-                    self.canvas.create_rectangle(scaled_coords[0], scaled_coords[1], scaled_coords[2], scaled_coords[3],
-                                                 outline="red", tag="bbox")
-                    # Display label near the bounding box
-                    self.canvas.create_text(scaled_coords[0], scaled_coords[1] - 10, text=bbox["label"], fill="red",
-                                            anchor=tk.SW, tag="bbox_label")
+            self.redraw_bounding_boxes()
 
             # Update the bounding box list in the listbox
             self.update_bounding_box_list()
 
+    def on_canvas_configure(self, event):
+        # A drag of the window border sends a stream of these; only the last size is rendered
+        size = (event.width, event.height)
+        if size == self.canvas_size:
+            return
+        self.canvas_size = size
+        if self.refit_job is not None:
+            self.master.after_cancel(self.refit_job)
+        self.refit_job = self.master.after(self.refit_delay_ms, self.refit)
+
+    @traced("refit")
+    def refit(self):
+        # Fit the current image to the new canvas size from the pixels already decoded, then
+        # recompute resize_ratio and redraw every box in one pass. The file is not read again.
+        self.refit_job = None
+        if self.decoded is None or not self.image_files:
+            return
+        canvas_size = self.canvas_size
+        zoomed = self.resize_ratio != self.fit_ratio
+        decoded = self.prefetcher.refit(self.decoded, canvas_size)
+        self.decoded = decoded
+        self.current_image = decoded.image
+        self.fit_ratio = decoded.resize_ratio
+        with tracer.span("photo_image"):
+            self.photo_image = ImageTk.PhotoImage(decoded.image)
+        self.canvas.itemconfig("image", image=self.photo_image)
+
+        if zoomed and self.resize_ratio > self.fit_ratio:
+            # Stay at the same zoom; more or fewer tiles are now visible
+            self.tile_layer.show(self.pyramid, self.resize_ratio, self.current_image, self.fit_ratio)
+        else:
+            self.resize_ratio = self.fit_ratio
+            self.tile_layer.clear()
+            self.canvas.itemconfig("image", state=tk.NORMAL)
+            self.canvas.config(scrollregion=(0, 0, decoded.image.width, decoded.image.height))
+            self.canvas.xview_moveto(0)
+            self.canvas.yview_moveto(0)
+            self.redraw_bounding_boxes()
+
+        # Neighbours are resampled from their cached renders when they are shown
+        self.prefetcher.prefetch(self.image_files, self.current_index, canvas_size)
+        self.schedule_quality_upgrade(decoded, canvas_size)
+
+    def schedule_quality_upgrade(self, decoded, canvas_size):
+        # Restart the idle timer; only the image the user stops on gets the full-quality render
+        if self.upgrade_job is not None:
+            self.master.after_cancel(self.upgrade_job)
+            self.upgrade_job = None
+        if decoded.quality != "full":
+            self.upgrade_job = self.master.after(
+                self.upgrade_delay_ms, self.start_quality_upgrade, decoded.path, canvas_size)
+
+    def start_quality_upgrade(self, image_path, canvas_size):
+        self.upgrade_job = None
+        future = self.prefetcher.executor.submit(self.prefetcher.upgrade, image_path, canvas_size)
+        self.master.after(20, self.finish_quality_upgrade, future, image_path)
+
+    def finish_quality_upgrade(self, future, image_path):
+        # Poll from the Tk thread; PhotoImage objects must be created there
+        if not future.done():
+            self.master.after(20, self.finish_quality_upgrade, future, image_path)
+            return
+        decoded = None if future.cancelled() or future.exception() else future.result()
+        if decoded is None or not self.image_files or self.image_files[self.current_index] != image_path:
+            return
+        if decoded.resize_ratio != self.fit_ratio:
+            return
+        # Same size and ratio as the fast render, so only the bitmap is swapped
+        self.decoded = decoded
+        self.current_image = decoded.image
+        self.photo_image = ImageTk.PhotoImage(decoded.image)
+        self.canvas.itemconfig("image", image=self.photo_image)
+
+    @traced("update_list")
     def update_bounding_box_list(self):
-        # Update the bounding box list in the listbox
-        self.bbox_listbox.delete(0, tk.END)
-        image_path = self.image_files[self.current_index]
-        if image_path in self.bounding_boxes:
-            for idx, bbox in enumerate(self.bounding_boxes[image_path]):
-                label = bbox["label"]
-                coords = bbox["coords"]
-                dimensions = f"({coords[0]}, {coords[1]}) to ({coords[2]}, {coords[3]})"
-                self.bbox_listbox.insert(tk.END, f"Bounding Box {idx + 1}: Label='{label}', Dimensions={dimensions}")
+        # Show the boxes of the current image in the side panel; only the visible rows are rendered
+        self.box_panel.show(self.image_files[self.current_index])
+
+    def go_to_image(self, index):
+        # A thumbnail of the filmstrip was clicked
+        if index != self.current_index:
+            self.current_index = index
+            self.load_image()
 
     def prev_image(self):
         if self.current_index > 0:
@@ -136,113 +499,126 @@ class ImageBoundingBoxApp:
             self.current_index += 1
             self.load_image()
 
+    @traced("draw_boxes")
     def redraw_bounding_boxes(self):
-        # Clear canvas of existing bounding boxes and labels
-        self.canvas.delete("bbox")
-        self.canvas.delete("bbox_label")
+        # Rebuild the canvas items of every bounding box of the current image.
+        # Only needed when the image or its scale changes; edits go through self.box_layer.
+        self.box_layer.clear()
 
         image_path = self.image_files[self.current_index]
-        if image_path in self.bounding_boxes:
-            for bbox in self.bounding_boxes[image_path]:
-                # Adjust bounding box coordinates according to the resized image
-                coords = bbox["coords"]
-                scaled_coords = (
-                    coords[0] * self.resize_ratio,
-                    coords[1] * self.resize_ratio,
-                    coords[2] * self.resize_ratio,
-                    coords[3] * self.resize_ratio
-                )
-                # Draw bounding box
-                self.canvas.create_rectangle(
-                    scaled_coords[0], scaled_coords[1], scaled_coords[2], scaled_coords[3],
-                    outline="red", tag="bbox")
-                # Display label near the bounding box
-                self.canvas.create_text(
-                    scaled_coords[0], scaled_coords[1] - 10,
-                    text=bbox["label"], fill="red",
-                    anchor=tk.SW, tag="bbox_label")
+        for box in self.store.rows(image_path):
+            self.box_layer.add(box, self.store.box_coords(box), self.store.label(box), self.resize_ratio)
+        if self.selected_bbox is not None:
+            self.box_layer.set_selected(self.selected_bbox)
+
+    def get_spatial_index(self, image_path):
+        # Build the index of an image the first time it is needed; edits keep it up to date
+        index = self.spatial_indexes.get(image_path)
+        if index is None:
+            index = GridIndex(self.current_image_size)
+            for box in self.store.rows(image_path):
+                index.insert(box, self.store.box_coords(box))
+            self.spatial_indexes[image_path] = index
+        return index
+
+    def canvas_point(self, event):
+        # Event position in canvas coordinates, i.e. original image pixels times resize_ratio
+        return self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
+
+    def on_wheel(self, event):
+        if not self.image_files or self.decoded is None or self.drawing:
+            return
+        if event.num == 4 or (event.num != 5 and event.delta > 0):
+            self.zoom(self.resize_ratio * self.zoom_step, event.x, event.y)
+        else:
+            self.zoom(self.resize_ratio / self.zoom_step, event.x, event.y)
+
+    @traced("zoom")
+    def zoom(self, scale, x, y):
+        # Zoom between fitting the canvas and max_zoom, keeping the image point under (x, y) in place
+        scale = max(self.fit_ratio, min(scale, self.max_zoom))
+        if scale == self.resize_ratio:
+            return
+        image_x = self.canvas.canvasx(x) / self.resize_ratio
+        image_y = self.canvas.canvasy(y) / self.resize_ratio
+        self.resize_ratio = scale
+        width, height = self.current_image_size
+        self.canvas.config(scrollregion=(0, 0, width * scale, height * scale))
+        self.canvas.xview_moveto((image_x * scale - x) / (width * scale))
+        self.canvas.yview_moveto((image_y * scale - y) / (height * scale))
+
+        if scale == self.fit_ratio:
+            # Back to the fitted bitmap
+            self.tile_layer.clear()
+            self.canvas.itemconfig("image", state=tk.NORMAL)
+        else:
+            self.canvas.itemconfig("image", state=tk.HIDDEN)
+            if self.pyramid is None:
+                self.pyramid = self.tile_source.pyramid(self.image_files[self.current_index], self.current_image_size)
+            self.tile_layer.show(self.pyramid, scale, self.current_image, self.fit_ratio)
+        self.redraw_bounding_boxes()
 
-    def on_mouse_down(self, event):
-        image_path = self.image_files[self.current_index]
+    def on_pan_start(self, event):
+        self.canvas.scan_mark(event.x, event.y)
 
-        # Clear all existing bounding boxes on mouse down
-        self.canvas.delete("bbox")
-        self.redraw_bounding_boxes()
+    def on_pan_drag(self, event):
+        self.pan_motion.push(event.x, event.y)
 
-        clicked_existing_bbox = False
-
-        # Check if the click is within an existing bounding box
-        for idx, bbox in enumerate(self.bounding_boxes.get(image_path, [])):
-            coords = bbox["coords"]
-            # Calculate scaled coordinates for existing bounding boxes
-            scaled_coords = (
-                coords[0] * self.resize_ratio,
-                coords[1] * self.resize_ratio,
-                coords[2] * self.resize_ratio,
-                coords[3] * self.resize_ratio
-            )
-            if scaled_coords[0] <= event.x <= scaled_coords[2] and scaled_coords[1] <= event.y <= scaled_coords[3]:
-                # Select the bounding box
-                self.selected_bbox = bbox
-                clicked_existing_bbox = True
-                # Change the color of the selected bounding box for visibility
-                self.canvas.create_rectangle(scaled_coords[0], scaled_coords[1], scaled_coords[2], scaled_coords[3],
-                                             outline="blue", tag="bbox")  # Highlight with blue
-                # Highlight the selected bounding box in the listbox
-                self.bbox_listbox.select_set(idx)
-                self.load_image()
-                break
-        self.load_image()
-        if not clicked_existing_bbox:
-            # If not within an existing bounding box, start drawing a new bounding box
+    def pan_to(self, x, y):
+        self.canvas.scan_dragto(x, y, gain=1)
+        self.tile_layer.request_update()
+
+    @traced("mouse_down")
+    def on_mouse_down(self, event):
+        if self.decoded is None:
+            # No image could be shown, so there is nothing to draw on
+            return
+        image_path = self.image_files[self.current_index]
+        x, y = self.canvas_point(event)
+
+        # Check if the click is within an existing bounding box. The index works in original
+        # image coordinates and picks the smallest box under the click (the topmost on ties).
+        box = self.get_spatial_index(image_path).pick(x / self.resize_ratio, y / self.resize_ratio)
+        if box is not None:
+            # Select the bounding box; only its canvas items and the previous selection are recoloured
+            self.select_bbox(box)
+        else:
+            # If not within an existing bounding box, clear the selection and start drawing a new bounding box
+            self.select_bbox(None)
             self.drawing = True
-            self.bbox_start = (event.x, event.y)
+            self.bbox_start = (x, y)
+
+    def select_bbox(self, box):
+        # Selection is a pure overlay change: recolour canvas items and keep the listbox in sync
+        self.selected_bbox = box
+        self.box_layer.set_selected(box)
+        self.box_panel.select(box)
 
     def on_mouse_drag(self, event):
-        # Update the current bounding box
+        # Only remember where the pointer is; the rubber band is moved once per frame
         if self.drawing:
-            self.canvas.delete("bbox")
-            # Redraw all bounding boxes and labels to avoid losing them
-            image_path = self.image_files[self.current_index]
-            if image_path in self.bounding_boxes:
-                for bbox in self.bounding_boxes[image_path]:
-                    # Draw bounding box
-                    self.canvas.create_rectangle(
-                        bbox["coords"][0] * self.resize_ratio,
-                        bbox["coords"][1] * self.resize_ratio,
-                        bbox["coords"][2] * self.resize_ratio,
-                        bbox["coords"][3] * self.resize_ratio,
-                        outline="red", tag="bbox")
-                    # Display label near the bounding box
-                    self.canvas.create_text(
-                        bbox["coords"][0] * self.resize_ratio,
-                        bbox["coords"][1] * self.resize_ratio - 10,
-                        text=bbox["label"],
-                        fill="red",
-                        anchor=tk.SW,
-                        tag="bbox_label")
-
-            # Draw the new bounding box being created
-            self.canvas.create_rectangle(
-                self.bbox_start[0],
-                self.bbox_start[1],
-                event.x,
-                event.y,
-                outline="red",
-                tag="bbox")
+            self.drag_motion.push(*self.canvas_point(event))
+
+    def draw_rubber_band(self, x, y):
+        # Move the rubber band of the new bounding box; existing boxes are left untouched
+        if self.drawing:
+            self.box_layer.move_rubber_band(self.bbox_start[0], self.bbox_start[1], x, y)
 
     def on_mouse_up(self, event):
         if self.drawing:
+            bbox_end = self.canvas_point(event)
+            self.drag_motion.push(*bbox_end)
+            self.drag_motion.flush()
             self.drawing = False
-            bbox_end = (event.x, event.y)
+            if tracer.enabled:
+                self.status_message.config(text=f"Drag: {self.drag_motion.readout()}")
 
             # Prompt user for label
             label = simpledialog.askstring("Label", "Enter label for bounding box:", parent=self.master)
 
             if label is None or label.strip() == "":
-                # If the user cancels the input or provides an empty label, remove the temporary bounding box and redraw existing ones
-                self.canvas.delete("bbox")
-                self.redraw_bounding_boxes()
+                # If the user cancels the input or provides an empty label, remove the temporary bounding box
+                self.box_layer.end_rubber_band()
                 return
 
             # Scale the coordinates back to the original image size
@@ -250,150 +626,110 @@ class ImageBoundingBoxApp:
             orig_bbox_end = (bbox_end[0] / self.resize_ratio, bbox_end[1] / self.resize_ratio)
 
             # Add bounding box and label if the user provided a label
-            image_path = self.image_files[self.current_index]
-            if image_path not in self.bounding_boxes:
-                self.bounding_boxes[image_path] = []
-
-            self.bounding_boxes[image_path].append({
-                "coords": (orig_bbox_start[0], orig_bbox_start[1], orig_bbox_end[0], orig_bbox_end[1]),
-                "label": label
-            })
-
-            # Clear the canvas of any temporary bounding boxes
-            self.canvas.delete("bbox")
-
-            # Redraw all existing bounding boxes on the canvas with scaled coordinates
-            self.redraw_bounding_boxes()
-
-            # Update the bounding box list in the listbox
-            self.update_bounding_box_list()
-
-    def on_bbox_listbox_select(self, event):
-        # Check if the selection was triggered by the user
-        if event.widget == self.bbox_listbox:
-            # Retrieve the index of the selected bounding box from the listbox
-            selection = self.bbox_listbox.curselection()
-            if selection:
-                index = selection[0]  # There should only be one item selected
-
-                # Get the image path
-                image_path = self.image_files[self.current_index]
-
-                # Select the corresponding bounding box
-                if image_path in self.bounding_boxes:
-                    # Retrieve the selected bounding box
-                    self.selected_bbox = self.bounding_boxes[image_path][index]
-
-                    # Highlight the selected bounding box on the canvas
-                    coords = self.selected_bbox["coords"]
-                    # Redraw all bounding boxes in red
-                    self.canvas.delete("bbox")
-                    self.canvas.delete("bbox_label")
-                    self.load_image()  # Redraw all bounding boxes
-
+            coords = (orig_bbox_start[0], orig_bbox_start[1], orig_bbox_end[0], orig_bbox_end[1])
+            self.add_bbox(label, coords)
 
+    @traced("add_box")
+    def add_bbox(self, label, coords):
+        # Store, index, journal and draw a new box; timed apart from the label dialog
+        image_path = self.image_files[self.current_index]
+        box = self.store.add(image_path, label, coords)
+        self.get_spatial_index(image_path).insert(box, coords)
+        if self.journal is not None:
+            self.journal.record_add(box, image_path, label, coords)
+            self.journal.maybe_compact(self.store)
+            self.check_journal()
+
+        # Replace the temporary rubber band with the items of the new bounding box
+        self.box_layer.end_rubber_band()
+        self.box_layer.add(box, coords, label, self.resize_ratio)
+
+        # Add its row to the side panel and update the badge of its thumbnail
+        self.box_panel.add(box)
+        self.filmstrip.refresh_badges({image_path})
+
+    def on_box_panel_select(self, box):
+        # A row of the side panel was clicked: highlight its bounding box on the canvas
+        self.selected_bbox = box
+        self.box_layer.set_selected(box)
 
     def delete_selected_bbox(self):
         # Delete the selected bounding box
-        if self.selected_bbox:
-            # Remove the selected bounding box from the dictionary
+        if self.selected_bbox is not None:
+            # Remove the selected bounding box from the store
             image_path = self.image_files[self.current_index]
-            if image_path in self.bounding_boxes:
-                self.bounding_boxes[image_path].remove(self.selected_bbox)
-                self.selected_bbox = None
-
-                # Clear all bounding boxes and labels from canvas
-                self.canvas.delete("bbox")
-                self.canvas.delete("bbox_label")
-
-                # Redraw all remaining bounding boxes
-                self.redraw_bounding_boxes()
-
-                # Load the current image to redraw remaining bounding boxes
-                self.load_image()
-
-                # Update the bounding box list in the listbox
-                self.update_bounding_box_list()
-
+            label = self.store.label(self.selected_bbox)
+            self.store.remove(self.selected_bbox)
+            self.get_spatial_index(image_path).remove(self.selected_bbox)
+            if self.journal is not None:
+                self.journal.record_remove(self.selected_bbox)
+                self.journal.maybe_compact(self.store)
+                self.check_journal()
+
+            # Remove only the canvas items and the panel row of the deleted bounding box
+            self.box_layer.remove(self.selected_bbox)
+            self.box_panel.remove(self.selected_bbox, label)
+            self.filmstrip.refresh_badges({image_path})
+            self.selected_bbox = None
+
+    @traced("on_done")
     def on_done(self):
         # Get the directory where the script is located
         script_directory = os.path.dirname(__file__)
 
-        # Create the dataset and labels folders in the script's directory
-        dataset_folder = os.path.join(script_directory, "dataset")
-        labels_folder = os.path.join(script_directory, "labels")
-        os.makedirs(dataset_folder, exist_ok=True)
-        os.makedirs(labels_folder, exist_ok=True)
-
-        # Initialize a set to store unique class names
-        class_names = set()
-
-        # Save images and bounding box data
-        for image_path in self.image_files:
-            if image_path in self.bounding_boxes:
-                for bbox in self.bounding_boxes[image_path]:
-                    class_names.add(bbox["label"])
-
-        # Create a mapping of class names to indices
-        class_names = sorted(class_names)  # Sort class names
-        label_to_index = {name: idx for idx, name in enumerate(class_names)}
-
-        # Save images and bounding box data with label indices
-        for image_path in self.image_files:
-            if image_path in self.bounding_boxes and self.bounding_boxes[image_path]:
-                filename = os.path.basename(image_path)
-                dataset_path = os.path.join(dataset_folder, filename)
-                current_image = Image.open(image_path)
-                current_image.save(dataset_path)
-                img_width, img_height = current_image.size
-
-                # Check if the current image has bounding boxes
-                label_path = os.path.join(labels_folder, os.path.splitext(filename)[0] + ".txt")
-                with open(label_path, "w") as f:
-                    for bbox in self.bounding_boxes[image_path]:
-                        label = bbox["label"]
-                        coords = bbox["coords"]
-                        class_index = label_to_index[label]
-                        # Convert bounding box coordinates to YOLO format
-                        x_center = (coords[0] + coords[2]) / 2 / img_width
-                        y_center = (coords[1] + coords[3]) / 2 / img_height
-                        width = abs(coords[2] - coords[0]) / img_width
-                        height = abs(coords[3] - coords[1]) / img_height
-                        # Write bounding box data to the file in YOLO format
-                        f.write(f"{class_index} {x_center} {y_center} {width} {height}\n")
-
-        # Create data.yaml file
-        data_yaml_path = os.path.join(script_directory, "data.yaml")
-        label_check_path = os.path.join(script_directory, "stored_label_check.py")
-
-        with open(data_yaml_path, "w") as yaml_file:
-            yaml_file.write("# Define the paths to the training, validation, and test data\n")
-            yaml_file.write("train: /path/to/train/images  # Path to training images\n")
-            yaml_file.write("val: /path/to/val/images      # Path to validation images\n")
-            yaml_file.write("test: /path/to/test/images    # Path to test images (optional)\n\n")
-            yaml_file.write("# Define the names and indices of the classes (labels)\n")
-            yaml_file.write("names:\n")
-            for idx, class_name in enumerate(class_names):
-                yaml_file.write(f"  {idx}: \"{class_name}\"\n")
-            yaml_file.write("\n# Define the number of classes\n")
-            yaml_file.write(f"nc: {len(class_names)}  # Number of classes (update this according to your dataset)\n")
-
-        with open(label_check_path) as file:
-            exec(file.read())
+        # Write dataset/, labels/ and data.yaml in the script's directory. Only images edited since
+        # the last export are rewritten; the export manifest there records what is already on disk.
+        with tracer.span("export"):
+            folder = self.image_index.folder if self.image_index is not None else None
+            export_stats = export_dataset(self.store, self.export_paths(), script_directory, sizes=self.image_index,
+                                          folder=folder)
+        print(export_stats.summary())
+        for image_path, error in export_stats.errors:
+            print(f"Failed to export {image_path}: {error}")
+
+        # Draw the exported labels on paged contact sheets in labelcheck/sheets/ for a visual check
+        with tracer.span("label_check"):
+            check_stats = render_label_checks(script_directory, mode="sheets")
+        print(check_stats.summary())
+        for filename, error in check_stats.errors:
+            print(f"Failed to render {filename}: {error}")
 
         self.status_message.config(text="Dataset and labels have been created.")
 
         # Print a message indicating that the task is complete
         print("DONE: Images and bounding box data saved successfully.")
 
-        # Quit the application
+        # Stop the background workers and quit the application
+        if self.journal is not None:
+            self.journal.close()
+        self.close_image_index()
+        self.prefetcher.close()
+        self.tile_source.close()
+        self.thumbnail_source.close()
         self.master.quit()
 
+    def export_paths(self):
+        # The folder's images plus frames labelled in a session that sampled videos with another stride
+        extra = [p for p in self.store.labelled_paths() if p not in self.image_file_set and os.path.exists(source_file(p))]
+        return self.image_files + extra
+
+    def on_close(self):
+        if self.journal is not None:
+            # The next session then starts from a snapshot instead of replaying this session's records
+            self.journal.compact(self.store)
+            self.journal.close()
+        self.close_image_index()
+        self.prefetcher.close()
+        self.tile_source.close()
+        self.thumbnail_source.close()
+        self.master.destroy()
+
 # Main function to run the application
-def main():
+def main(video_stride=1):
     root = tk.Tk()
-    app = ImageBoundingBoxApp(root)
+    app = ImageBoundingBoxApp(root, video_stride)
     root.mainloop()
+    save_trace_from_env()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,301 @@
+import tkinter as tk
+import tkinter.font as tkfont
+from bisect import bisect_right
+from collections import Counter
+from tkinter import ttk
+
+import numpy as np
+
+ALL_CLASSES = "All classes"
+
+
+class BoxListModel:
+    # The rows of the side panel for one image: the box ids that pass the class filter, in
+    # insertion order or grouped by class, plus the window of rows currently on screen.
+    # Adding or deleting a box edits the row list in place instead of rebuilding it.
+    def __init__(self, store):
+        self.store = store
+        self.path = None
+        self.rows = []  # Box ids shown, in display order
+        self.keys = []  # Sort key of every row while grouped by class
+        self.order = {}  # Box id -> insertion number within the image
+        self.next_order = 0
+        self.class_counts = Counter()  # Label -> boxes of the image with that label
+        self.class_filter = None  # Label to show, or None for every class
+        self.grouped = False
+        self.first = 0  # Row shown at the top of the list
+        self.visible = 20  # Rows that fit in the list
+
+    def show(self, path):
+        # Load the boxes of another image (or reload the current one)
+        self.path = path
+        boxes = list(self.store.rows(path)) if path is not None else []
+        self.order = {box: n for n, box in enumerate(boxes)}
+        self.next_order = len(boxes)
+        self.class_counts = Counter()
+        if boxes:
+            counts = np.bincount(self.store.class_ids[boxes], minlength=len(self.store.class_names))
+            for class_id in np.flatnonzero(counts).tolist():
+                self.class_counts[self.store.class_names[class_id]] = int(counts[class_id])
+        if self.class_filter not in self.class_counts:
+            self.class_filter = None
+        self.first = 0
+        self._rebuild(boxes)
+
+    def set_view(self, class_filter, grouped):
+        self.class_filter = class_filter
+        self.grouped = grouped
+        self.first = 0
+        self._rebuild(list(self.order))
+
+    def _rebuild(self, boxes):
+        label = self.store.label
+        if self.class_filter is not None:
+            boxes = [box for box in boxes if label(box) == self.class_filter]
+        if self.grouped:
+            keyed = sorted((self._key(box), box) for box in boxes)
+            self.keys = [key for key, _ in keyed]
+            self.rows = [box for _, box in keyed]
+        else:
+            self.keys = []
+            self.rows = sorted(boxes, key=self.order.__getitem__)
+
+    def _key(self, box):
+        return self.store.label(box), self.order[box]
+
+    def _matches(self, box):
+        return self.class_filter is None or self.store.label(box) == self.class_filter
+
+    def add(self, box):
+        # Returns the row index of the new box, or None if the filter hides it
+        self.order[box] = self.next_order
+        self.next_order += 1
+        self.class_counts[self.store.label(box)] += 1
+        if not self._matches(box):
+            return None
+        if self.grouped:
+            key = self._key(box)
+            index = bisect_right(self.keys, key)
+            self.keys.insert(index, key)
+            self.rows.insert(index, box)
+            return index
+        self.rows.append(box)
+        return len(self.rows) - 1
+
+    def remove(self, box, label):
+        # label is passed in because the store may already have dropped the box.
+        # Returns the row index the box had, or None if it was not shown.
+        if self.order.pop(box, None) is None:
+            return None
+        self.class_counts[label] -= 1
+        if self.class_counts[label] <= 0:
+            del self.class_counts[label]
+            if self.class_filter == label:
+                self.set_view(None, self.grouped)
+                return 0
+        try:
+            index = self.rows.index(box)
+        except ValueError:
+            return None
+        del self.rows[index]
+        if self.grouped:
+            del self.keys[index]
+        self.scroll_to(self.first)
+        return index
+
+    def index(self, box):
+        try:
+            return self.rows.index(box)
+        except ValueError:
+            return None
+
+    def scroll_to(self, first):
+        self.first = max(0, min(first, len(self.rows) - self.visible))
+        return self.first
+
+    def reveal(self, index):
+        # Scroll just enough for row index to be on screen; returns True if the window moved
+        if self.first <= index < self.first + self.visible:
+            return False
+        self.scroll_to(index - self.visible // 2)
+        return True
+
+    def in_window(self, index):
+        return index is not None and index < self.first + self.visible
+
+    def window(self):
+        return self.rows[self.first:self.first + self.visible]
+
+    def row_text(self, index):
+        box = self.rows[index]
+        x1, y1, x2, y2 = self.store.coords[box].tolist()
+        return f"{index + 1}. {self.store.label(box)}  ({x1:.0f}, {y1:.0f}) to ({x2:.0f}, {y2:.0f})"
+
+    def filter_choices(self):
+        return [f"{ALL_CLASSES} ({sum(self.class_counts.values())})"] + [
+            f"{label} ({count})" for label, count in sorted(self.class_counts.items())]
+
+
+class BoxListPanel:
+    # Side panel listing the bounding boxes of the current image. Only the rows that fit are
+    # inserted into the listbox; the scrollbar moves that window over the model's rows, so the
+    # cost of an update does not grow with the number of boxes on the image.
+    def __init__(self, parent, store, on_select):
+        self.model = BoxListModel(store)
+        self.on_select = on_select
+        self.selected = None
+
+        controls = tk.Frame(parent)
+        controls.pack(side=tk.TOP, fill=tk.X)
+        self.filter_var = tk.StringVar(value=ALL_CLASSES)
+        self.filter_box = ttk.Combobox(controls, textvariable=self.filter_var, state="readonly", values=[ALL_CLASSES])
+        self.filter_box.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.filter_box.bind("<<ComboboxSelected>>", self.on_view_change)
+        self.group_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(controls, text="Group by class", variable=self.group_var,
+                       command=self.on_view_change).pack(side=tk.RIGHT)
+
+        body = tk.Frame(parent)
+        body.pack(fill=tk.BOTH, expand=True)
+        self.scrollbar = tk.Scrollbar(body, orient=tk.VERTICAL, command=self.on_scroll)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox = tk.Listbox(body, exportselection=False, activestyle="none")
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.listbox.bind("<<ListboxSelect>>", self.on_listbox_select)
+        self.listbox.bind("<Configure>", self.on_resize)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.listbox.bind(sequence, self.on_wheel)
+        self.listbox.bind("<Up>", lambda event: self.step(-1))
+        self.listbox.bind("<Down>", lambda event: self.step(1))
+        self.listbox.bind("<Prior>", lambda event: self.step(-self.model.visible))
+        self.listbox.bind("<Next>", lambda event: self.step(self.model.visible))
+
+        # Height of one listbox line (font line spacing + 1, see tkListbox.c)
+        self.line_height = tkfont.Font(font=self.listbox.cget("font")).metrics("linespace") + 1
+
+    def show(self, path):
+        self.selected = None
+        self.model.show(path)
+        self.update_filter_choices()
+        self.render()
+
+    def add(self, box):
+        index = self.model.add(box)
+        self.update_filter_choices()
+        if self.model.in_window(index):
+            self.render()
+        else:
+            self.update_scrollbar()
+
+    def remove(self, box, label):
+        if box == self.selected:
+            self.selected = None
+        index = self.model.remove(box, label)
+        self.update_filter_choices()
+        if self.model.in_window(index):
+            self.render()
+        else:
+            self.update_scrollbar()
+
+    def select(self, box):
+        # Highlight box (or nothing) and scroll it into view; does not call on_select
+        self.selected = box
+        if box is not None and self.model.index(box) is None:
+            # Hidden by the class filter: show every class again
+            self.filter_var.set(ALL_CLASSES)
+            self.model.set_view(None, self.group_var.get())
+        index = self.model.index(box) if box is not None else None
+        if index is not None and self.model.reveal(index):
+            self.render()
+        else:
+            self.update_selection()
+
+    def render(self):
+        # Replace the listbox content with the rows of the current window
+        model = self.model
+        self.listbox.delete(0, tk.END)
+        end = min(model.first + model.visible, len(model.rows))
+        if end > model.first:
+            self.listbox.insert(tk.END, *(model.row_text(i) for i in range(model.first, end)))
+        self.update_selection()
+        self.update_scrollbar()
+
+    def update_selection(self):
+        self.listbox.selection_clear(0, tk.END)
+        index = self.model.index(self.selected) if self.selected is not None else None
+        if index is not None and self.model.first <= index < self.model.first + self.model.visible:
+            self.listbox.select_set(index - self.model.first)
+
+    def update_scrollbar(self):
+        total = len(self.model.rows)
+        if total <= self.model.visible:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.model.first / total, (self.model.first + self.model.visible) / total)
+
+    def update_filter_choices(self):
+        choices = self.model.filter_choices()
+        self.filter_box.config(values=choices)
+        # Keep the shown choice in sync with the counts
+        if self.model.class_filter is None:
+            self.filter_var.set(choices[0])
+        else:
+            self.filter_var.set(f"{self.model.class_filter} ({self.model.class_counts[self.model.class_filter]})")
+
+    def on_view_change(self, event=None):
+        choice = self.filter_box.current()
+        labels = sorted(self.model.class_counts)
+        class_filter = labels[choice - 1] if 0 < choice <= len(labels) else None
+        self.model.set_view(class_filter, self.group_var.get())
+        self.render()
+
+    def on_scroll(self, *args):
+        model = self.model
+        if args[0] == "moveto":
+            model.scroll_to(int(float(args[1]) * len(model.rows)))
+        elif args[0] == "scroll":
+            amount = int(args[1]) * (model.visible if args[2] == "pages" else 1)
+            model.scroll_to(model.first + amount)
+        self.render()
+
+    def on_wheel(self, event):
+        if event.num == 4:
+            amount = -3
+        elif event.num == 5:
+            amount = 3
+        else:
+            amount = -3 if event.delta > 0 else 3
+        self.model.scroll_to(self.model.first + amount)
+        self.render()
+        return "break"
+
+    def on_resize(self, event):
+        inset = int(self.listbox.cget("borderwidth")) + int(self.listbox.cget("highlightthickness"))
+        visible = max(1, (event.height - 2 * inset) // self.line_height)
+        if visible != self.model.visible:
+            self.model.visible = visible
+            self.model.scroll_to(self.model.first)
+            self.render()
+
+    def on_listbox_select(self, event):
+        selection = self.listbox.curselection()
+        if selection:
+            index = self.model.first + selection[0]
+            if index < len(self.model.rows):
+                self.selected = self.model.rows[index]
+                self.on_select(self.selected)
+
+    def step(self, amount):
+        # Keyboard navigation across the whole list, not just the rows on screen
+        model = self.model
+        if not model.rows:
+            return "break"
+        index = model.index(self.selected) if self.selected is not None else None
+        index = model.first if index is None else max(0, min(index + amount, len(model.rows) - 1))
+        self.selected = model.rows[index]
+        if model.reveal(index):
+            self.render()
+        else:
+            self.update_selection()
+        self.on_select(self.selected)
+        return "break"
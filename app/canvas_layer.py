@@ -0,0 +1,187 @@
+import tkinter as tk
+from PIL import Image, ImageTk
+
+
+class BoxLayer:
+    # Keeps one persistent rectangle and one label item per bounding box so that adding,
+    # deleting and selecting a box only touches that box's canvas items
+    def __init__(self, canvas, color="red", selected_color="blue", rubber_band_color="red"):
+        self.canvas = canvas
+        self.color = color
+        self.selected_color = selected_color
+        self.rubber_band_color = rubber_band_color
+        self.items = {}  # Box key -> (rectangle item id, label item id)
+        self.selected = None
+        self.rubber_band = None
+
+    def add(self, key, coords, label, scale):
+        # Draw one bounding box and its label; coords are in original image pixels
+        x1, y1, x2, y2 = (c * scale for c in coords)
+        color = self.selected_color if key == self.selected else self.color
+        rect = self.canvas.create_rectangle(x1, y1, x2, y2, outline=color, tag="bbox")
+        text = self.canvas.create_text(x1, y1 - 10, text=label, fill=color, anchor=tk.SW, tag="bbox_label")
+        self.items[key] = (rect, text)
+
+    def remove(self, key):
+        items = self.items.pop(key, None)
+        if items is not None:
+            self.canvas.delete(*items)
+        if key == self.selected:
+            self.selected = None
+
+    def clear(self):
+        # Drop every box item and the selection
+        self.canvas.delete("bbox")
+        self.canvas.delete("bbox_label")
+        self.canvas.delete("rubber_band")
+        self.items.clear()
+        self.selected = None
+        self.rubber_band = None
+
+    def set_selected(self, key):
+        # Recolour only the previously and the newly selected box
+        if self.selected == key:
+            return
+        self._recolor(self.selected, self.color)
+        self.selected = key
+        self._recolor(key, self.selected_color)
+
+    def _recolor(self, key, color):
+        items = self.items.get(key)
+        if items is not None:
+            self.canvas.itemconfig(items[0], outline=color)
+            self.canvas.itemconfig(items[1], fill=color)
+
+    def move_rubber_band(self, x0, y0, x1, y1):
+        # The box being drawn is a single item that is moved, never recreated
+        if self.rubber_band is None:
+            self.rubber_band = self.canvas.create_rectangle(
+                x0, y0, x1, y1, outline=self.rubber_band_color, tag="rubber_band")
+        else:
+            self.canvas.coords(self.rubber_band, x0, y0, x1, y1)
+
+    def end_rubber_band(self):
+        if self.rubber_band is not None:
+            self.canvas.delete(self.rubber_band)
+            self.rubber_band = None
+
+
+class TileLayer:
+    # Draws a zoomed-in image as the tiles of its pyramid that intersect the view. Canvas
+    # coordinates are original pixels times scale, so boxes and tiles share one space and
+    # panning only scrolls the canvas. A tile that is not loaded yet is stood in for by the
+    # matching part of the fitted overview, then swapped for the real tile when it arrives.
+    def __init__(self, canvas, source):
+        self.canvas = canvas
+        self.source = source
+        self.pyramid = None
+        self.scale = None
+        self.overview = None  # Image fitted to the canvas, used for placeholders
+        self.overview_ratio = None
+        self.items = {}  # (level, col, row) -> (canvas item, PhotoImage, final)
+        self.pending = {}  # (level, col, row) -> Future of the tile image
+        self.update_job = None
+        self.poll_job = None
+
+    def show(self, pyramid, scale, overview, overview_ratio):
+        if pyramid is not self.pyramid or scale != self.scale:
+            self.clear()
+            self.pyramid = pyramid
+            self.scale = scale
+        self.overview = overview
+        self.overview_ratio = overview_ratio
+        self.update()
+
+    def clear(self):
+        self.canvas.delete("tile")
+        self.items.clear()
+        self.pending.clear()
+        self.pyramid = None
+        self.scale = None
+        for job in (self.update_job, self.poll_job):
+            if job is not None:
+                self.canvas.after_cancel(job)
+        self.update_job = None
+        self.poll_job = None
+
+    def request_update(self):
+        # Several scroll steps in one burst of events lead to a single update
+        if self.pyramid is not None and self.update_job is None:
+            self.update_job = self.canvas.after_idle(self.update)
+
+    def visible_tiles(self):
+        pyramid = self.pyramid
+        level = pyramid.level_for_scale(self.scale)
+        # Screen pixels per level pixel
+        step = self.scale * 2 ** level * pyramid.tile_size
+        left, top = self.canvas.canvasx(0), self.canvas.canvasy(0)
+        right = left + self.canvas.winfo_width()
+        bottom = top + self.canvas.winfo_height()
+        cols, rows = pyramid.grid(level)
+        col0, col1 = max(0, int(left // step)), min(cols - 1, int(right // step))
+        row0, row1 = max(0, int(top // step)), min(rows - 1, int(bottom // step))
+        return [(level, col, row) for row in range(row0, row1 + 1) for col in range(col0, col1 + 1)]
+
+    def update(self):
+        self.update_job = None
+        if self.pyramid is None:
+            return
+        visible = self.visible_tiles()
+        wanted = set(visible)
+        for key in list(self.items):
+            if key not in wanted:
+                self.canvas.delete(self.items.pop(key)[0])
+        for key in list(self.pending):
+            if key not in wanted:
+                del self.pending[key]
+        path = self.pyramid.path
+        self.source.cancel({(path,) + key for key in wanted})
+
+        for key in visible:
+            item = self.items.get(key)
+            if item is not None and item[2]:
+                continue
+            image = self.source.cached(self.pyramid, *key)
+            if image is not None:
+                self.draw(key, image, True)
+                continue
+            if item is None:
+                self.draw(key, None, False)
+            if key not in self.pending:
+                self.pending[key] = self.source.request(self.pyramid, *key)
+        if self.pending and self.poll_job is None:
+            self.poll_job = self.canvas.after(15, self.poll)
+
+    def poll(self):
+        self.poll_job = None
+        for key, future in list(self.pending.items()):
+            if not future.done():
+                continue
+            del self.pending[key]
+            if not future.cancelled() and future.exception() is None:
+                self.draw(key, future.result(), True)
+        if self.pending:
+            self.poll_job = self.canvas.after(15, self.poll)
+
+    def draw(self, key, image, final):
+        # Place a tile (or its placeholder when image is None) at its on-screen size
+        x0, y0, x1, y1 = self.pyramid.original_box(*key)
+        left, top = round(x0 * self.scale), round(y0 * self.scale)
+        size = (max(1, round(x1 * self.scale) - left), max(1, round(y1 * self.scale) - top))
+        if image is None:
+            ratio = self.overview_ratio
+            box = (x0 * ratio, y0 * ratio, min(x1 * ratio, self.overview.width), min(y1 * ratio, self.overview.height))
+            image = self.overview.resize(size, Image.BILINEAR, box=box)
+        elif image.size != size:
+            # Show individual pixels when magnified so boxes can be placed on exact edges
+            resample = Image.NEAREST if size[0] >= 2 * image.width else Image.BILINEAR
+            image = image.resize(size, resample)
+        photo = ImageTk.PhotoImage(image)
+        old = self.items.get(key)
+        if old is not None:
+            self.canvas.itemconfig(old[0], image=photo)
+            self.items[key] = (old[0], photo, final)
+        else:
+            item = self.canvas.create_image(left, top, anchor=tk.NW, image=photo, tag="tile")
+            self.canvas.tag_lower(item)
+            self.items[key] = (item, photo, final)
@@ -0,0 +1,123 @@
+import math
+import threading
+import time
+
+from PIL import Image
+
+from .tracing import tracer
+from .video import open_image
+
+# Resampling filters from best to worst quality
+FILTERS = (Image.LANCZOS, Image.BICUBIC, Image.BILINEAR, Image.NEAREST)
+
+
+# A decoded image already fitted to the canvas, plus what the GUI needs to map
+# canvas coordinates back to the original image
+class DecodedImage:
+    def __init__(self, path, image, original_size, resize_ratio, quality):
+        self.path = path
+        self.image = image
+        self.original_size = original_size
+        self.resize_ratio = resize_ratio
+        self.quality = quality  # "fast" (reduced decode, budgeted filter) or "full"
+        self.nbytes = image.width * image.height * len(image.getbands())
+
+
+def fit_ratio(original_size, target_size):
+    # Scale factor that fits original_size within target_size while maintaining the aspect ratio
+    return min(target_size[0] / original_size[0], target_size[1] / original_size[1])
+
+
+def fitted_size(original_size, resize_ratio):
+    return max(1, int(original_size[0] * resize_ratio)), max(1, int(original_size[1] * resize_ratio))
+
+
+def open_reduced(path, target_size):
+    # Ask the decoder for the smallest scale that still covers the fitted size.
+    # Returns the (possibly reduced) image and the original pixel size.
+    image = open_image(path)
+    original_size = image.size
+    ratio = fit_ratio(original_size, target_size)
+    cover_size = (math.ceil(original_size[0] * ratio), math.ceil(original_size[1] * ratio))
+
+    if image.format == "JPEG":
+        # DCT scaling: the decoder produces 1/2, 1/4 or 1/8 scale output directly
+        image.draft(None, cover_size)
+    else:
+        factor = min(original_size[0] // cover_size[0], original_size[1] // cover_size[1])
+        if factor >= 2:
+            image = image.reduce(factor)
+    return image, original_size
+
+
+class ResampleBudget:
+    # Picks the best resampling filter whose predicted time fits the latency budget,
+    # learning the cost per source megapixel of each filter from measured resizes
+    def __init__(self, budget_ms=25):
+        self.budget_ms = budget_ms
+        self.seconds_per_megapixel = {
+            Image.LANCZOS: 0.012,
+            Image.BICUBIC: 0.008,
+            Image.BILINEAR: 0.005,
+            Image.NEAREST: 0.0005,
+        }
+        self._lock = threading.Lock()
+
+    def choose(self, source_size):
+        megapixels = source_size[0] * source_size[1] / 1e6
+        with self._lock:
+            for resample in FILTERS:
+                if self.seconds_per_megapixel[resample] * megapixels * 1000 <= self.budget_ms:
+                    return resample
+        return Image.NEAREST
+
+    def record(self, resample, source_size, seconds):
+        megapixels = source_size[0] * source_size[1] / 1e6
+        if megapixels <= 0:
+            return
+        with self._lock:
+            # Exponential moving average so the estimate follows the machine it runs on
+            previous = self.seconds_per_megapixel[resample]
+            self.seconds_per_megapixel[resample] = 0.8 * previous + 0.2 * (seconds / megapixels)
+
+
+def decode_fitted(path, target_size, budget=None):
+    # Fast display path: reduced-resolution decode and a filter chosen from the latency budget.
+    # Without a budget the image is fully decoded and resampled with LANCZOS.
+    if budget is None:
+        image = open_image(path)
+        original_size = image.size
+        resample = Image.LANCZOS
+        quality = "full"
+    else:
+        image, original_size = open_reduced(path, target_size)
+        resample = budget.choose(image.size)
+        quality = "fast"
+
+    # The ratio is always computed against the original pixel size so box coordinates stay exact
+    resize_ratio = fit_ratio(original_size, target_size)
+    new_size = fitted_size(original_size, resize_ratio)
+    with tracer.span("decode"):
+        image.load()
+    start = time.perf_counter()
+    with tracer.span("resize"):
+        resized_image = image.resize(new_size, resample) if image.size != new_size else image
+    if budget is not None:
+        budget.record(resample, image.size, time.perf_counter() - start)
+    return DecodedImage(path, resized_image, original_size, resize_ratio, quality)
+
+
+def refit_decoded(decoded, target_size, budget=None):
+    # Fit already decoded pixels to another target size without going back to the file
+    resize_ratio = fit_ratio(decoded.original_size, target_size)
+    new_size = fitted_size(decoded.original_size, resize_ratio)
+    source = decoded.image
+    resample = budget.choose(source.size) if budget is not None else Image.LANCZOS
+    start = time.perf_counter()
+    with tracer.span("resize"):
+        image = source.resize(new_size, resample) if source.size != new_size else source
+    if budget is not None:
+        budget.record(resample, source.size, time.perf_counter() - start)
+    # Enlarged pixels are only as sharp as the smaller render they came from
+    quality = decoded.quality if new_size[0] <= source.width else "fast"
+    return DecodedImage(decoded.path, image, decoded.original_size, resize_ratio, quality)
@@ -0,0 +1,317 @@
+import errno
+import hashlib
+import json
+import os
+import shutil
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .video import export_frame, export_name, is_frame_path, source_file
+from .yolo import ImageSizeCache, format_label_bodies, normalize
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+FICLONE = 0x40049409  # Linux ioctl that makes dst share src's extents (btrfs, XFS, ...)
+
+# Ways to put the original bytes at the destination, cheapest first
+DEFAULT_METHODS = ("hardlink", "reflink", "kernel_copy")
+
+MANIFEST_FILE = "export_manifest.json"
+# How export names are made (see video.export_name); exports made under another scheme are redone
+NAMING = "relative"
+
+
+def _hardlink(src, tmp):
+    os.link(src, tmp)
+
+
+def _reflink(src, tmp):
+    if fcntl is None:
+        raise OSError(errno.ENOTSUP, "reflink not supported")
+    with open(src, "rb") as fsrc, open(tmp, "wb") as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+
+def _kernel_copy(src, tmp):
+    # copy_file_range / sendfile keep the bytes in the kernel; plain buffered copy as a last resort
+    with open(src, "rb") as fsrc, open(tmp, "wb") as fdst:
+        remaining = os.fstat(fsrc.fileno()).st_size
+        in_fd, out_fd = fsrc.fileno(), fdst.fileno()
+        for copy in (getattr(os, "copy_file_range", None), getattr(os, "sendfile", None)):
+            if copy is None:
+                continue
+            try:
+                while remaining > 0:
+                    if copy is os.sendfile:
+                        sent = copy(out_fd, in_fd, None, min(remaining, 1 << 30))
+                    else:
+                        sent = copy(in_fd, out_fd, min(remaining, 1 << 30))
+                    if sent == 0:
+                        break
+                    remaining -= sent
+                if remaining == 0:
+                    return
+            except OSError as error:
+                if error.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.ENOTSUP, errno.EBADF):
+                    raise
+        shutil.copyfileobj(fsrc, fdst, 1 << 20)
+
+
+COPIERS = {"hardlink": _hardlink, "reflink": _reflink, "kernel_copy": _kernel_copy}
+
+
+def place_file(src, dst, methods=DEFAULT_METHODS):
+    # Put src's bytes at dst without decoding them. Returns (method used, bytes).
+    size = os.path.getsize(src)
+    try:
+        if os.path.samefile(src, dst):
+            return "unchanged", size
+    except OSError:
+        pass
+    tmp = dst + ".part"
+    for method in methods:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        try:
+            COPIERS[method](src, tmp)
+        except OSError:
+            continue
+        # Replace atomically so a failed export never leaves a half-written image
+        os.replace(tmp, dst)
+        return method, size
+    raise OSError(f"could not export {src} to {dst}")
+
+
+class ExportStats:
+    def __init__(self):
+        self.images = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.methods = Counter()
+        self.errors = []  # (source path, error message)
+        self.labels_written = 0
+        self.labels_unchanged = 0
+        self.removed = 0
+        self.class_names = []
+
+    @property
+    def images_per_second(self):
+        return self.images / self.seconds if self.seconds else 0.0
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+    def summary(self):
+        return (f"Exported {self.images} images ({self.bytes / 1e6:.1f} MB) in {self.seconds:.2f} s: "
+                f"{self.images_per_second:.0f} images/s, {self.bytes_per_second / 1e6:.1f} MB/s "
+                f"({', '.join(f'{m}={n}' for m, n in sorted(self.methods.items()))}); "
+                f"{self.labels_written} label files written, {self.labels_unchanged} unchanged, "
+                f"{self.removed} removed")
+
+
+def export_images(pairs, workers=8, methods=DEFAULT_METHODS):
+    # Copy (source, destination) pairs on a worker pool; the copies are I/O bound
+    # system calls that release the GIL, so threads scale across files. Video frames
+    # have no file of their own and are decoded and written as JPEGs.
+    stats = ExportStats()
+    start = time.perf_counter()
+
+    def run(pair):
+        try:
+            if is_frame_path(pair[0]):
+                return pair, export_frame(pair[0], pair[1]), None
+            return pair, place_file(pair[0], pair[1], methods), None
+        except OSError as error:
+            return pair, None, error
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export") as executor:
+        for (src, _), result, error in executor.map(run, pairs):
+            if error is not None:
+                stats.errors.append((src, str(error)))
+                continue
+            method, size = result
+            stats.images += 1
+            stats.bytes += size
+            stats.methods[method] += 1
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def load_manifest(path):
+    # Per source image: exported file names, source size and mtime, and a digest of the label body
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    manifest.setdefault("class_names", None)
+    manifest.setdefault("naming", None)
+    manifest.setdefault("images", {})
+    return manifest
+
+
+def save_manifest(path, manifest):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def write_data_yaml(data_yaml_path, class_names):
+    with open(data_yaml_path, "w") as yaml_file:
+        yaml_file.write("# Define the paths to the training, validation, and test data\n")
+        yaml_file.write("train: /path/to/train/images  # Path to training images\n")
+        yaml_file.write("val: /path/to/val/images      # Path to validation images\n")
+        yaml_file.write("test: /path/to/test/images    # Path to test images (optional)\n\n")
+        yaml_file.write("# Define the names and indices of the classes (labels)\n")
+        yaml_file.write("names:\n")
+        for idx, class_name in enumerate(class_names):
+            yaml_file.write(f"  {idx}: \"{class_name}\"\n")
+        yaml_file.write("\n# Define the number of classes\n")
+        yaml_file.write(f"nc: {len(class_names)}  # Number of classes (update this according to your dataset)\n")
+
+
+def _remove_quietly(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def export_dataset(store, image_paths, output_directory, workers=8, methods=DEFAULT_METHODS, sizes=None,
+                   folder=None):
+    # Write dataset/, labels/ and data.yaml for the labelled images among image_paths.
+    # Only images modified since the last export (store.dirty) are looked at, unless the class
+    # list changed; unchanged label files and images are left alone, and the outputs of images
+    # that lost all their boxes are deleted. sizes caches the header-probed image sizes.
+    # Files are named by their path relative to folder; two images that would still share a
+    # label file are reported in stats.errors and neither overwrites the other.
+    start = time.perf_counter()
+    dataset_folder = os.path.join(output_directory, "dataset")
+    labels_folder = os.path.join(output_directory, "labels")
+    os.makedirs(dataset_folder, exist_ok=True)
+    os.makedirs(labels_folder, exist_ok=True)
+    manifest_path = os.path.join(output_directory, MANIFEST_FILE)
+    manifest = load_manifest(manifest_path)
+    entries = manifest["images"]
+
+    # Sorted names of the classes that still have boxes, and a map from store class ids to their indices
+    class_names = store.used_class_names()
+    label_to_index = {name: idx for idx, name in enumerate(class_names)}
+    class_index_of = np.array([label_to_index.get(name, -1) for name in store.class_names], dtype=np.int32)
+
+    # Class indices are part of every label file, so a new class list touches every image;
+    # so does a change of naming scheme, which moves every file
+    if class_names != manifest["class_names"] or manifest["naming"] != NAMING:
+        candidates = image_paths
+    else:
+        wanted = set(store.dirty_paths())
+        candidates = [p for p in image_paths if p in wanted]
+
+    stats = ExportStats()
+    processed = []
+    labelled = []
+    row_blocks = []
+    for image_path in candidates:
+        rows = store.rows(image_path)
+        processed.append(image_path)
+        if len(rows):
+            labelled.append(image_path)
+            row_blocks.append(np.asarray(rows, dtype=np.int32))
+            continue
+        # The image lost all its boxes: drop what a previous export wrote for it
+        entry = entries.pop(image_path, None)
+        if entry is not None:
+            _remove_quietly(os.path.join(dataset_folder, entry["image"]))
+            _remove_quietly(os.path.join(labels_folder, entry["label"]))
+            stats.removed += 1
+
+    # Convert every box of every labelled image to YOLO format in one vectorised pass,
+    # using the true image sizes read from the file headers
+    if sizes is None:
+        sizes = ImageSizeCache(workers)
+    bodies = []
+    if labelled:
+        counts = np.array([len(block) for block in row_blocks])
+        rows = np.concatenate(row_blocks)
+        row_sizes = np.repeat(sizes.get_many(labelled), counts, axis=0)
+        boxes = normalize(store.coords[rows], row_sizes)
+        bodies = format_label_bodies(class_index_of[store.class_ids[rows]], boxes, counts)
+
+    filenames = [export_name(image_path, folder) for image_path in labelled]
+    for image_path, filename in zip(labelled, filenames):
+        entry = entries.get(image_path)
+        if entry is not None and entry["image"] != filename:
+            # Exported under another name by an earlier scheme: start over under the new one
+            _remove_quietly(os.path.join(dataset_folder, entry["image"]))
+            _remove_quietly(os.path.join(labels_folder, entry["label"]))
+            del entries[image_path]
+    # Image that owns each label file; x.jpg and x.png, or a/x.jpg and a file named a__x.jpg,
+    # would otherwise silently share one
+    owners = {entry["label"]: image_path for image_path, entry in entries.items()}
+    collided = set()
+
+    image_pairs = []
+    for image_path, filename, body in zip(labelled, filenames, bodies):
+        entry = entries.get(image_path)
+        label_filename = os.path.splitext(filename)[0] + ".txt"
+        owner = owners.setdefault(label_filename, image_path)
+        if owner != image_path:
+            if os.path.exists(source_file(owner)):
+                stats.errors.append((image_path, f"export name {label_filename} is already used by {owner}"))
+                collided.add(image_path)
+                continue
+            # The owner was deleted from the folder since its export
+            entries.pop(owner, None)
+            owners[label_filename] = image_path
+        label_path = os.path.join(labels_folder, label_filename)
+        dataset_path = os.path.join(dataset_folder, filename)
+        digest = hashlib.blake2b(body.encode("ascii"), digest_size=16).hexdigest()
+
+        if entry is None or entry["label_digest"] != digest or not os.path.exists(label_path):
+            with open(label_path, "w") as f:
+                f.write(body)
+            stats.labels_written += 1
+        else:
+            stats.labels_unchanged += 1
+
+        source_stat = os.stat(source_file(image_path))
+        if (entry is None or entry["size"] != source_stat.st_size or entry["mtime_ns"] != source_stat.st_mtime_ns
+                or not os.path.exists(dataset_path)):
+            image_pairs.append((image_path, dataset_path))
+        entries[image_path] = {
+            "image": filename,
+            "label": label_filename,
+            "size": source_stat.st_size,
+            "mtime_ns": source_stat.st_mtime_ns,
+            "label_digest": digest,
+        }
+
+    # Place the original image bytes in the dataset folder on a worker pool
+    copy_stats = export_images(image_pairs, workers, methods)
+    stats.images, stats.bytes, stats.methods = copy_stats.images, copy_stats.bytes, copy_stats.methods
+    stats.errors.extend(copy_stats.errors)
+    failed = {image_path for image_path, _ in copy_stats.errors}
+    for image_path in failed:
+        # Forget failed images so the next export retries them
+        entries.pop(image_path, None)
+    # Collided images stay dirty, so they are exported once renamed
+    failed.update(collided)
+
+    manifest["class_names"] = class_names
+    manifest["naming"] = NAMING
+    save_manifest(manifest_path, manifest)
+    store.mark_exported(p for p in processed if p not in failed)
+    write_data_yaml(os.path.join(output_directory, "data.yaml"), class_names)
+    stats.class_names = class_names
+    stats.seconds = time.perf_counter() - start
+    return stats
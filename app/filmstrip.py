@@ -0,0 +1,170 @@
+import tkinter as tk
+
+from PIL import ImageTk
+
+LABELLED_COLOR = "#66bb6a"
+UNLABELLED_COLOR = "#bdbdbd"
+CURRENT_COLOR = "blue"
+
+
+class Filmstrip:
+    # Horizontal strip of thumbnails of every image in the folder. The canvas scroll region
+    # spans all images, but only the cells in view (plus a small margin) have canvas items and
+    # PhotoImages; scrolling creates and destroys cells as they come and go. Thumbnails are
+    # requested from a ThumbnailSource and swapped in when they are ready.
+    #   get_paths():     the current list of image paths
+    #   box_count(path): number of boxes of an image, shown as a badge
+    #   on_select(i):    called with the index of a clicked thumbnail
+    def __init__(self, parent, source, get_paths, box_count, on_select, margin=4):
+        self.source = source
+        self.get_paths = get_paths
+        self.box_count = box_count
+        self.on_select = on_select
+        self.margin = margin  # Cells kept on each side of the view
+        self.thumb_width, self.thumb_height = source.size
+        self.cell_width = self.thumb_width + 8
+        self.cell_height = self.thumb_height + 8
+        self.count = 0
+        self.current = None
+        self.cells = {}  # Index -> (path, image item, badge item, PhotoImage or None)
+        self.pending = {}  # Index -> (path, Future)
+        self.update_job = None
+        self.poll_job = None
+
+        frame = tk.Frame(parent)
+        frame.pack(side=tk.BOTTOM, fill=tk.X)
+        self.canvas = tk.Canvas(frame, height=self.cell_height, bg="#303030", highlightthickness=0)
+        self.scrollbar = tk.Scrollbar(frame, orient=tk.HORIZONTAL, command=self.canvas.xview)
+        self.canvas.config(xscrollcommand=self.on_xscroll)
+        self.scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.canvas.pack(side=tk.TOP, fill=tk.X)
+        self.canvas.bind("<Button-1>", self.on_click)
+        self.canvas.bind("<Configure>", lambda event: self.request_update())
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.canvas.bind(sequence, self.on_wheel)
+
+        self.highlight = self.canvas.create_rectangle(0, 0, 0, 0, outline=CURRENT_COLOR, width=3, state=tk.HIDDEN)
+
+    def reset(self):
+        # The list of paths was replaced (new folder, or images removed from it)
+        for index in list(self.cells):
+            self.drop_cell(index)
+        self.pending.clear()
+        self.count = 0
+        self.current = None
+        self.canvas.itemconfig(self.highlight, state=tk.HIDDEN)
+        self.set_count(len(self.get_paths()))
+
+    def set_count(self, count):
+        # Images were appended to the list of paths
+        self.count = count
+        self.canvas.config(scrollregion=(0, 0, count * self.cell_width, self.cell_height))
+        self.request_update()
+
+    def show_current(self, index):
+        # Highlight the image shown in the main view and scroll it into view
+        self.current = index
+        x = index * self.cell_width
+        self.canvas.coords(self.highlight, x + 1, 1, x + self.cell_width - 1, self.cell_height - 1)
+        self.canvas.itemconfig(self.highlight, state=tk.NORMAL)
+        self.canvas.tag_raise(self.highlight)
+        left = self.canvas.canvasx(0)
+        width = self.canvas.winfo_width()
+        if self.count and not left <= x <= left + width - self.cell_width:
+            self.canvas.xview_moveto((x - (width - self.cell_width) / 2) / (self.count * self.cell_width))
+        self.request_update()
+
+    def refresh_badges(self, paths=None):
+        # Box counts changed for paths (or any image); only cells in view are redrawn
+        for path, _, badge, _ in self.cells.values():
+            if paths is None or path in paths:
+                self.draw_badge(badge, path)
+
+    def on_xscroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.request_update()
+
+    def on_wheel(self, event):
+        if event.num == 4 or (event.num != 5 and event.delta > 0):
+            self.canvas.xview_scroll(-3, "units")
+        else:
+            self.canvas.xview_scroll(3, "units")
+        return "break"
+
+    def on_click(self, event):
+        index = int(self.canvas.canvasx(event.x) // self.cell_width)
+        if 0 <= index < self.count:
+            self.on_select(index)
+
+    def request_update(self):
+        # Several scroll events in one burst lead to a single update
+        if self.update_job is None:
+            self.update_job = self.canvas.after_idle(self.update)
+
+    def visible_range(self):
+        left = self.canvas.canvasx(0)
+        first = max(0, int(left // self.cell_width) - self.margin)
+        last = min(self.count, int((left + self.canvas.winfo_width()) // self.cell_width) + 1 + self.margin)
+        return first, last
+
+    def update(self):
+        self.update_job = None
+        paths = self.get_paths()
+        first, last = self.visible_range()
+        for index in list(self.cells):
+            if not first <= index < min(last, len(paths)) or self.cells[index][0] != paths[index]:
+                self.drop_cell(index)
+        # Nearest to the middle of the view first
+        middle = (first + last) // 2
+        for index in sorted(range(first, last), key=lambda i: abs(i - middle)):
+            if index not in self.cells:
+                self.create_cell(index, paths[index])
+        self.source.cancel({path for path, _ in self.pending.values()})
+        if self.pending and self.poll_job is None:
+            self.poll_job = self.canvas.after(30, self.poll)
+
+    def create_cell(self, index, path):
+        x = index * self.cell_width + self.cell_width // 2
+        y = self.cell_height // 2
+        image = self.canvas.create_image(x, y, tag="thumbnail")
+        badge = self.canvas.create_text(index * self.cell_width + 8, 6, anchor=tk.NW, font=("Helvetica", 9, "bold"),
+                                        tag="badge")
+        self.cells[index] = (path, image, badge, None)
+        self.draw_badge(badge, path)
+        thumbnail = self.source.cached(path)
+        if thumbnail is not None:
+            self.set_thumbnail(index, thumbnail)
+        else:
+            self.pending[index] = (path, self.source.request(path))
+        self.canvas.tag_raise(self.highlight)
+
+    def drop_cell(self, index):
+        path, image, badge, _ = self.cells.pop(index)
+        self.canvas.delete(image, badge)
+        self.pending.pop(index, None)
+
+    def draw_badge(self, badge, path):
+        count = self.box_count(path)
+        if count:
+            self.canvas.itemconfig(badge, text=f"✔ {count}", fill=LABELLED_COLOR)
+        else:
+            self.canvas.itemconfig(badge, text="○", fill=UNLABELLED_COLOR)
+
+    def set_thumbnail(self, index, thumbnail):
+        path, image, badge, _ = self.cells[index]
+        photo = ImageTk.PhotoImage(thumbnail)
+        self.canvas.itemconfig(image, image=photo)
+        self.cells[index] = (path, image, badge, photo)
+
+    def poll(self):
+        self.poll_job = None
+        for index, (path, future) in list(self.pending.items()):
+            if not future.done():
+                continue
+            del self.pending[index]
+            cell = self.cells.get(index)
+            if cell is None or cell[0] != path or future.cancelled() or future.exception() is not None:
+                continue
+            self.set_thumbnail(index, future.result())
+        if self.pending:
+            self.poll_job = self.canvas.after(30, self.poll)
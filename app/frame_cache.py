@@ -0,0 +1,232 @@
+import hashlib
+import mmap
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+from PIL import Image
+
+from .display import DecodedImage, fit_ratio
+from .journal import JOURNAL_DIR
+from .video import source_file
+
+FRAME_DIR = "frames"
+FRAME_INDEX = "frames.sqlite"
+
+# Modes stored as they are; anything else is converted to RGB first
+RAW_MODES = ("RGB", "RGBA", "L")
+
+
+class DiskCache:
+    # Bookkeeping shared by the persistent caches: an SQLite table with one row per cached
+    # entry, holding its KEY columns, the file it is stored in, its size in bytes and when it
+    # was last used. The sizes are totalled and the least recently used entries are deleted once
+    # the total exceeds max_bytes. Subclasses set the class attributes below and store entries
+    # with _store(); directory holds nothing but the index and the entries' files.
+    TABLE = None
+    KEY = ()
+    SCHEMA = None
+    INDEX_FILE = None
+    SCHEMA_VERSION = 1
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._where = " AND ".join(f"{column} = ?" for column in self.KEY)
+        os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(directory, self.INDEX_FILE), check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != self.SCHEMA_VERSION:
+            self.connection.execute(f"DROP TABLE IF EXISTS {self.TABLE}")
+            self.connection.execute(f"PRAGMA user_version={self.SCHEMA_VERSION}")
+            # Files left by an older index would never be evicted
+            self._remove_unindexed()
+        self.connection.executescript(self.SCHEMA)
+        self.total_bytes = self.connection.execute(
+            f"SELECT COALESCE(SUM(nbytes), 0) FROM {self.TABLE}").fetchone()[0]
+        self._lock = threading.Lock()  # Worker threads and the GUI share the connection
+
+    def _remove_unindexed(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(self.INDEX_FILE):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path)
+                else:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+    def _touch(self, key):
+        # Mark an entry as just used; called with the lock held
+        self.connection.execute(f"UPDATE {self.TABLE} SET last_used = ? WHERE {self._where}", (time.time(), *key))
+        self.connection.commit()
+
+    def _store(self, key, row, nbytes):
+        # Insert or replace the row of key, whose file is already written, then evict down to max_bytes
+        with self._lock:
+            if self.connection is None:
+                return
+            old = self.connection.execute(f"SELECT nbytes FROM {self.TABLE} WHERE {self._where}", key).fetchone()
+            placeholders = ", ".join("?" * len(row))
+            self.connection.execute(f"INSERT OR REPLACE INTO {self.TABLE} VALUES ({placeholders})", row)
+            self.total_bytes += nbytes - (old[0] if old is not None else 0)
+            self._evict(key)
+            self.connection.commit()
+
+    def _evict(self, keep):
+        # Delete least recently used entries, never the one just stored. Called with the lock held.
+        while self.total_bytes > self.max_bytes:
+            victims = self.connection.execute(
+                f"SELECT {', '.join(self.KEY)}, file, nbytes FROM {self.TABLE} WHERE NOT ({self._where}) "
+                "ORDER BY last_used LIMIT 32", keep).fetchall()
+            if not victims:
+                break
+            for *key, file, nbytes in victims:
+                self.connection.execute(f"DELETE FROM {self.TABLE} WHERE {self._where}", key)
+                self._remove_file(file)
+                self.total_bytes -= nbytes
+                self.evictions += 1
+                if self.total_bytes <= self.max_bytes:
+                    break
+
+    def _delete(self, key):
+        with self._lock:
+            if self.connection is None:
+                return
+            row = self.connection.execute(
+                f"SELECT file, nbytes FROM {self.TABLE} WHERE {self._where}", key).fetchone()
+            if row is None:
+                return
+            self.connection.execute(f"DELETE FROM {self.TABLE} WHERE {self._where}", key)
+            self.connection.commit()
+            self.total_bytes -= row[1]
+        self._remove_file(row[0])
+
+    def _remove_file(self, file):
+        try:
+            os.remove(os.path.join(self.directory, file))
+        except OSError:
+            # Already gone, or still mapped on a platform that does not allow deleting it
+            pass
+
+    def close(self):
+        # Workers still running get misses from here on
+        with self._lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+
+class FrameCache(DiskCache):
+    # Persistent cache of display frames (decoded images fitted to a canvas size), keyed by
+    # (path, mtime, target size). Pixels are stored raw, one file per frame, and read back by
+    # memory-mapping the file, so revisiting an image after a restart costs a page-cache copy
+    # instead of a decode. The least recently used frames are deleted once the total exceeds
+    # max_bytes.
+    TABLE = "frames"
+    KEY = ("path", "target_width", "target_height")
+    INDEX_FILE = FRAME_INDEX
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS frames (
+        path TEXT NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        target_width INTEGER NOT NULL,
+        target_height INTEGER NOT NULL,
+        file TEXT NOT NULL,  -- raw pixel file in the frames directory
+        mode TEXT NOT NULL,
+        width INTEGER NOT NULL,
+        height INTEGER NOT NULL,
+        original_width INTEGER NOT NULL,
+        original_height INTEGER NOT NULL,
+        quality TEXT NOT NULL,
+        nbytes INTEGER NOT NULL,
+        last_used REAL NOT NULL,
+        PRIMARY KEY (path, target_width, target_height)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS frames_last_used ON frames (last_used);
+    """
+
+    def __init__(self, directory, max_bytes=1024 * 1024 * 1024):
+        super().__init__(directory, max_bytes)
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def for_folder(cls, folder_path, max_bytes=1024 * 1024 * 1024):
+        return cls(os.path.join(folder_path, JOURNAL_DIR, FRAME_DIR), max_bytes)
+
+    def get(self, path, target_size):
+        # DecodedImage backed by the mapped frame file, or None if the frame is missing or stale
+        try:
+            mtime_ns = os.stat(source_file(path)).st_mtime_ns
+        except OSError:
+            return None
+        target_width, target_height = target_size
+        with self._lock:
+            if self.connection is None:
+                return None
+            row = self.connection.execute(
+                "SELECT mtime_ns, file, mode, width, height, original_width, original_height, quality "
+                "FROM frames WHERE path = ? AND target_width = ? AND target_height = ?",
+                (path, target_width, target_height)).fetchone()
+            if row is None or row[0] != mtime_ns:
+                self.misses += 1
+                return None
+            self._touch((path, target_width, target_height))
+        _, file, mode, width, height, original_width, original_height, quality = row
+        try:
+            with open(os.path.join(self.directory, file), "rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            image = Image.frombuffer(mode, (width, height), buffer, "raw", mode, 0, 1)
+        except (OSError, ValueError):
+            # Deleted or truncated behind our back
+            self._delete((path, *target_size))
+            self.misses += 1
+            return None
+        self.hits += 1
+        original_size = (original_width, original_height)
+        return DecodedImage(path, image, original_size, fit_ratio(original_size, target_size), quality)
+
+    def put(self, decoded, target_size):
+        # Store a frame; a fast render never replaces a full-quality one of the same file version
+        try:
+            mtime_ns = os.stat(source_file(decoded.path)).st_mtime_ns
+        except OSError:
+            return
+        target_width, target_height = target_size
+        with self._lock:
+            if self.connection is None:
+                return
+            row = self.connection.execute(
+                "SELECT mtime_ns, quality FROM frames WHERE path = ? AND target_width = ? AND target_height = ?",
+                (decoded.path, target_width, target_height)).fetchone()
+        if row is not None and row == (mtime_ns, "full") and decoded.quality != "full":
+            return
+
+        image = decoded.image
+        if image.mode not in RAW_MODES:
+            image = image.convert("RGB")
+        key = f"{decoded.path}|{target_width}x{target_height}".encode("utf-8", "surrogateescape")
+        file = hashlib.blake2b(key, digest_size=16).hexdigest() + ".raw"
+        data = image.tobytes()
+        # Write next to the final name and rename, so a reader never maps a half-written frame
+        temporary = os.path.join(self.directory, f"{file}.{threading.get_ident()}.tmp")
+        try:
+            with open(temporary, "wb") as f:
+                f.write(data)
+            os.replace(temporary, os.path.join(self.directory, file))
+        except OSError:
+            return
+
+        self._store((decoded.path, target_width, target_height),
+                    (decoded.path, mtime_ns, target_width, target_height, file, image.mode, image.width,
+                     image.height, decoded.original_size[0], decoded.original_size[1], decoded.quality, len(data),
+                     time.time()),
+                    len(data))
@@ -0,0 +1,252 @@
+import hashlib
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from .journal import JOURNAL_DIR
+from .scanner import DEFAULT_EXCLUDE, DEFAULT_INCLUDE, walk_images
+from .video import DECODE_ERRORS, frame_paths, is_video, source_file, video_source
+from .yolo import probe_size
+
+INDEX_FILE = "index.sqlite"
+SCHEMA_VERSION = 1
+ORIENTATION_TAG = 0x0112  # EXIF orientation, 1 = upright
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    name TEXT PRIMARY KEY,  -- path relative to the folder
+    size INTEGER NOT NULL,  -- file size in bytes
+    mtime_ns INTEGER NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    orientation INTEGER NOT NULL,
+    hash TEXT,  -- blake2b of the file contents, NULL until content_hash() asks
+    labelled INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS images_labelled ON images (labelled, name);
+"""
+
+
+def probe_image(image_path):
+    # Worker task: (width, height, EXIF orientation) of one image.
+    # Only JPEGs carry EXIF in practice; everything else is sized from its header.
+    # Videos get their frame index built instead.
+    if is_video(image_path):
+        width, height = video_source(image_path).size
+        return width, height, 1
+    orientation = 1
+    if image_path.lower().endswith((".jpg", ".jpeg")):
+        with Image.open(image_path) as image:
+            width, height = image.size
+            orientation = image.getexif().get(ORIENTATION_TAG, 1)
+    else:
+        width, height = probe_size(image_path)
+    return width, height, orientation
+
+
+def file_hash(file_path):
+    # blake2b of a file's contents, read in 1 MiB chunks
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class ImageIndex:
+    # Per-folder SQLite database of the images in the folder: file size and mtime, pixel size,
+    # EXIF orientation, content hash and whether the image has boxes. Refreshing only probes
+    # files that are new or whose size or mtime changed, so reopening a large folder costs
+    # one directory walk and a stat per file. Probing reads headers only; content hashes need
+    # every byte read and are filled on demand by content_hash(). The GUI refreshes in the
+    # background with a FolderScanner calling probe_changed(); refresh() does the same
+    # synchronously.
+    # A video is one row; paths() lists every video_stride-th of its frames as images.
+    def __init__(self, folder_path, database=None, workers=8, video_stride=1):
+        self.folder = folder_path
+        self.video_stride = video_stride
+        if database is None:
+            os.makedirs(os.path.join(folder_path, JOURNAL_DIR), exist_ok=True)
+            database = os.path.join(folder_path, JOURNAL_DIR, INDEX_FILE)
+        self.database = database
+        self.workers = workers
+        self.connection = sqlite3.connect(database)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            self.connection.execute("DROP TABLE IF EXISTS images")
+            self.connection.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        self.connection.executescript(SCHEMA)
+
+    def name(self, image_path):
+        # Index name of an image, or of the video a frame belongs to
+        return os.path.relpath(source_file(image_path), self.folder)
+
+    def expand(self, names):
+        # Image paths of index names, each video replaced by its sampled frames
+        paths = []
+        for name in names:
+            path = os.path.join(self.folder, name)
+            if not is_video(name):
+                paths.append(path)
+                continue
+            try:
+                paths.extend(frame_paths(path, self.video_stride))
+            except OSError:
+                # Unreadable video, or PyAV is missing and the frame index was never built
+                continue
+        return paths
+
+    def known_files(self):
+        # Name -> (file size, mtime_ns) of every indexed image
+        return {name: (size, mtime_ns) for name, size, mtime_ns
+                in self.connection.execute("SELECT name, size, mtime_ns FROM images")}
+
+    def probe_changed(self, batch, known):
+        # Scanner-thread half of a refresh: probe the (name, size, mtime_ns) entries of batch
+        # that are not in known or differ from it. Returns (every name in batch, probed rows);
+        # the rows are written by apply() on the thread that owns the connection.
+        changed = [entry for entry in batch if known.get(entry[0]) != entry[1:]]
+        return [entry[0] for entry in batch], self._probe_rows(changed)
+
+    def refresh(self, include=DEFAULT_INCLUDE, exclude=DEFAULT_EXCLUDE):
+        # Bring the index in line with the folder. Returns (added or changed, removed) counts.
+        known = self.known_files()
+        seen, rows = self.probe_changed(list(walk_images(self.folder, include, exclude)), known)
+        self.apply(rows)
+        return len(rows), len(self.remove_missing(seen, known))
+
+    def remove_missing(self, seen, known):
+        # Drop the images of known that the last walk did not see; returns their paths
+        missing = set(known).difference(seen)
+        with self.connection:
+            self.connection.executemany("DELETE FROM images WHERE name = ?", ((name,) for name in missing))
+        return [os.path.join(self.folder, name) for name in missing]
+
+    def _probe_rows(self, files):
+        # Probe (name, size, mtime_ns) entries on a thread pool; unreadable files are skipped
+        def run(entry):
+            try:
+                return entry, probe_image(os.path.join(self.folder, entry[0]))
+            except DECODE_ERRORS + (SyntaxError, ValueError):
+                return entry, None
+
+        if not files:
+            return []
+        rows = []
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="index") as executor:
+            for (name, size, mtime_ns), probed in executor.map(run, files, chunksize=16):
+                if probed is not None:
+                    rows.append((name, size, mtime_ns) + probed)
+        return rows
+
+    def apply(self, rows):
+        with self.connection:
+            # Labelled status is kept across content changes; the annotation store owns it.
+            # The rows are of new or changed files, so any stored hash is out of date.
+            self.connection.executemany(
+                "INSERT INTO images (name, size, mtime_ns, width, height, orientation) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (name) DO UPDATE SET "
+                "size = excluded.size, mtime_ns = excluded.mtime_ns, width = excluded.width, "
+                "height = excluded.height, orientation = excluded.orientation, hash = NULL",
+                rows)
+        return len(rows)
+
+    def paths(self, labelled=None):
+        # Image paths in name order, optionally only the labelled or unlabelled ones
+        if labelled is None:
+            cursor = self.connection.execute("SELECT name FROM images ORDER BY name")
+        else:
+            cursor = self.connection.execute(
+                "SELECT name FROM images WHERE labelled = ? ORDER BY name", (int(labelled),))
+        return self.expand(name for (name,) in cursor)
+
+    def count(self, labelled=None):
+        if labelled is None:
+            return self.connection.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM images WHERE labelled = ?", (int(labelled),)).fetchone()[0]
+
+    def info(self, image_path):
+        # Row of one image as a dict, or None if it is not indexed
+        cursor = self.connection.execute("SELECT * FROM images WHERE name = ?", (self.name(image_path),))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip([column[0] for column in cursor.description], row))
+
+    def content_hash(self, image_path):
+        # Content hash of an indexed image, computed and stored on first use. None for videos
+        # and for images that are not indexed. The hash is only stored if the file did not
+        # change while it was read.
+        name = self.name(image_path)
+        if is_video(name):
+            return None
+        row = self.connection.execute(
+            "SELECT size, mtime_ns, hash FROM images WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        file_path = os.path.join(self.folder, name)
+        stat = os.stat(file_path)
+        if row[2] is not None and row[:2] == (stat.st_size, stat.st_mtime_ns):
+            return row[2]
+        digest = file_hash(file_path)
+        after = os.stat(file_path)
+        if (after.st_size, after.st_mtime_ns) == (stat.st_size, stat.st_mtime_ns) == row[:2]:
+            with self.connection:
+                self.connection.execute(
+                    "UPDATE images SET hash = ? WHERE name = ? AND size = ? AND mtime_ns = ?",
+                    (digest, name, stat.st_size, stat.st_mtime_ns))
+        return digest
+
+    def get_many(self, image_paths):
+        # (n, 2) array of pixel sizes, same interface as yolo.ImageSizeCache. Files modified
+        # since the last refresh are re-probed first.
+        image_paths = list(image_paths)
+        names = [self.name(p) for p in image_paths]
+        known = self._rows(set(names))
+        stale = {}  # Frames of one video share its row
+        for name, image_path in zip(names, image_paths):
+            if name in stale:
+                continue
+            stat = os.stat(source_file(image_path))
+            row = known.get(name)
+            if row is None or row[:2] != (stat.st_size, stat.st_mtime_ns):
+                stale[name] = (name, stat.st_size, stat.st_mtime_ns)
+        if stale:
+            self.apply(self._probe_rows(list(stale.values())))
+            known.update(self._rows(stale))
+        sizes = np.empty((len(names), 2), dtype=np.float64)
+        for i, name in enumerate(names):
+            row = known.get(name)
+            if row is None:
+                raise OSError(f"cannot read image size of {image_paths[i]}")
+            sizes[i] = row[2:]
+        return sizes
+
+    def _rows(self, names, chunk_size=500):
+        # Name -> (size, mtime_ns, width, height) of the indexed images among names, looked up in
+        # chunks that stay under SQLite's limit on query parameters
+        names = list(names)
+        rows = {}
+        for start in range(0, len(names), chunk_size):
+            chunk = names[start:start + chunk_size]
+            placeholders = ", ".join("?" * len(chunk))
+            for name, size, mtime_ns, width, height in self.connection.execute(
+                    f"SELECT name, size, mtime_ns, width, height FROM images WHERE name IN ({placeholders})", chunk):
+                rows[name] = (size, mtime_ns, width, height)
+        return rows
+
+    def set_labelled(self, labelled_paths):
+        # Record which images have boxes; every other image becomes unlabelled
+        with self.connection:
+            self.connection.execute("UPDATE images SET labelled = 0 WHERE labelled = 1")
+            self.connection.executemany("UPDATE images SET labelled = 1 WHERE name = ?",
+                                        ((self.name(p),) for p in labelled_paths))
+
+    def close(self):
+        self.connection.close()
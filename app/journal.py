@@ -0,0 +1,300 @@
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+
+# Every record is: op (u8), payload length (u32), payload, CRC32 of op + length + payload (u32)
+HEADER = struct.Struct("<BI")
+CRC = struct.Struct("<I")
+
+OP_PATH = 1  # Journal-local path id (u32) + UTF-8 path
+OP_CLASS = 2  # Journal-local class id (u32) + UTF-8 label
+OP_ADD = 3  # Box id, path id, class id (u32 each) + x1, y1, x2, y2 (f32 each)
+OP_REMOVE = 4  # Box id (u32)
+OP_EXTEND = 5  # First box id, count (u32 each) + count path ids, count class ids (u32) + count x (x1, y1, x2, y2) (f32)
+
+ID = struct.Struct("<I")
+ADD = struct.Struct("<IIIffff")
+EXTEND = struct.Struct("<II")
+
+JOURNAL_DIR = ".yolo_labeling"
+JOURNAL_FILE = "journal.bin"
+SNAPSHOT_FILE = "snapshot.npz"
+IMPORT_FILE = "import.pending"  # Present while labels/ is being imported into the session
+
+
+def encode_record(op, payload):
+    header = HEADER.pack(op, len(payload))
+    return header + payload + CRC.pack(zlib.crc32(payload, zlib.crc32(header)))
+
+
+def read_records(data):
+    # Yield (op, payload) for every intact record; stops at the first torn or corrupt one.
+    # The final offset reached is returned through StopIteration.value.
+    offset = 0
+    while offset + HEADER.size <= len(data):
+        op, length = HEADER.unpack_from(data, offset)
+        end = offset + HEADER.size + length + CRC.size
+        if end > len(data):
+            break
+        payload = data[offset + HEADER.size:end - CRC.size]
+        (crc,) = CRC.unpack_from(data, end - CRC.size)
+        if crc != zlib.crc32(payload, zlib.crc32(data[offset:offset + HEADER.size])):
+            break
+        yield op, payload
+        offset = end
+    return offset
+
+
+def save_snapshot(path, snapshot):
+    # Write atomically so a crash leaves either the old or the new snapshot
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            rows=snapshot["rows"],
+            image_ids=snapshot["image_ids"],
+            class_ids=snapshot["class_ids"],
+            coords=snapshot["coords"],
+            paths=np.frombuffer("\n".join(snapshot["paths"]).encode("utf-8"), dtype=np.uint8),
+            class_names=np.frombuffer("\n".join(snapshot["class_names"]).encode("utf-8"), dtype=np.uint8),
+        )
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path):
+    with np.load(path) as data:
+        paths = data["paths"].tobytes().decode("utf-8")
+        class_names = data["class_names"].tobytes().decode("utf-8")
+        return {
+            "rows": data["rows"],
+            "image_ids": data["image_ids"],
+            "class_ids": data["class_ids"],
+            "coords": data["coords"],
+            "paths": paths.split("\n") if paths else [],
+            "class_names": class_names.split("\n") if class_names else [],
+        }
+
+
+class Journal:
+    # Append-only write-ahead log of box additions and deletions for one image folder.
+    # The GUI thread only encodes records and queues them; a writer thread appends them
+    # to disk and fsyncs in batches. The log is periodically folded into a snapshot.
+    # An import of exported labels is journaled chunk by chunk and bracketed by an import
+    # marker file, so a session that ends mid-import resumes the import when it is reopened.
+    def __init__(self, folder_path, sync_interval=0.5, compact_every=5000):
+        self.directory = os.path.join(folder_path, JOURNAL_DIR)
+        self.journal_path = os.path.join(self.directory, JOURNAL_FILE)
+        self.snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+        self.import_path = os.path.join(self.directory, IMPORT_FILE)
+        self.sync_interval = sync_interval
+        self.compact_every = compact_every
+        self.records_since_compaction = 0
+        self.path_ids = {}  # Journal-local interning, reset with every new journal file
+        self.class_ids = {}
+        self.error = None  # Last I/O error of the writer thread
+        self._queue = queue.Queue()
+        self._file = None
+        self._thread = None
+
+    def has_session(self):
+        # A snapshot, or edits journaled since the last one (or since the journal was created)
+        if os.path.exists(self.snapshot_path):
+            return True
+        return os.path.exists(self.journal_path) and os.path.getsize(self.journal_path) > 0
+
+    def replay(self, store):
+        # Rebuild the store from the snapshot and the journal written after it.
+        # Returns the number of journal records applied.
+        store.clear()
+        if os.path.exists(self.snapshot_path):
+            store.restore(load_snapshot(self.snapshot_path))
+
+        data = b""
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "rb") as f:
+                data = f.read()
+        paths = {}
+        classes = {}
+        applied = 0
+        records = read_records(data)
+        while True:
+            try:
+                op, payload = next(records)
+            except StopIteration as stop:
+                valid_length = stop.value
+                break
+            if op == OP_PATH:
+                paths[ID.unpack_from(payload)[0]] = payload[ID.size:].decode("utf-8")
+            elif op == OP_CLASS:
+                classes[ID.unpack_from(payload)[0]] = payload[ID.size:].decode("utf-8")
+            elif op == OP_ADD:
+                box, path_id, class_id, x1, y1, x2, y2 = ADD.unpack(payload)
+                store.put(box, paths[path_id], classes[class_id], (x1, y1, x2, y2))
+            elif op == OP_REMOVE:
+                store.remove(ID.unpack(payload)[0])
+            elif op == OP_EXTEND:
+                start, count = EXTEND.unpack_from(payload)
+                path_ids = np.frombuffer(payload, dtype="<u4", count=count, offset=EXTEND.size)
+                class_ids = np.frombuffer(payload, dtype="<u4", count=count, offset=EXTEND.size + 4 * count)
+                coords = np.frombuffer(payload, dtype="<f4", offset=EXTEND.size + 8 * count).reshape(count, 4)
+                store.extend([paths[i] for i in path_ids.tolist()], [classes[i] for i in class_ids.tolist()],
+                             coords, start=start)
+            applied += 1
+        store.rebuild_free_rows()
+
+        if valid_length < len(data):
+            # Drop the torn tail left by a crash mid-write
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(valid_length)
+
+        # Box ids are replayed exactly, so new records simply continue this journal
+        self.path_ids = {path: path_id for path_id, path in paths.items()}
+        self.class_ids = {label: class_id for class_id, label in classes.items()}
+        self.records_since_compaction = applied
+        return applied
+
+    def start(self):
+        # Open the journal for appending and start the writer thread
+        os.makedirs(self.directory, exist_ok=True)
+        self._file = open(self.journal_path, "ab")
+        self._thread = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+        self._thread.start()
+
+    def _intern(self, ids, op, value, records):
+        # Journal-local id of a path or label, queuing its record the first time it is used
+        value_id = ids.get(value)
+        if value_id is None:
+            value_id = ids[value] = len(ids)
+            records.append(encode_record(op, ID.pack(value_id) + value.encode("utf-8")))
+        return value_id
+
+    def record_add(self, box, path, label, coords):
+        records = []
+        path_id = self._intern(self.path_ids, OP_PATH, path, records)
+        class_id = self._intern(self.class_ids, OP_CLASS, label, records)
+        records.append(encode_record(OP_ADD, ADD.pack(box, path_id, class_id, *coords)))
+        self._queue.put(b"".join(records))
+        self.records_since_compaction += 1
+
+    def record_extend(self, store, start, stop):
+        # Boxes start..stop-1, appended in one store.extend() call (imported labels), as one
+        # record of arrays. It replays in one call too, so it counts as one record towards compaction.
+        if stop <= start:
+            return
+        records = []
+        image_ids, image_index = np.unique(store.image_ids[start:stop], return_inverse=True)
+        path_ids = np.array([self._intern(self.path_ids, OP_PATH, store.paths[i], records)
+                             for i in image_ids.tolist()], dtype="<u4")[image_index]
+        class_ids, class_index = np.unique(store.class_ids[start:stop], return_inverse=True)
+        label_ids = np.array([self._intern(self.class_ids, OP_CLASS, store.class_names[i], records)
+                              for i in class_ids.tolist()], dtype="<u4")[class_index]
+        payload = (EXTEND.pack(start, stop - start) + path_ids.tobytes() + label_ids.tobytes()
+                   + store.coords[start:stop].astype("<f4").tobytes())
+        records.append(encode_record(OP_EXTEND, payload))
+        self._queue.put(b"".join(records))
+        self.records_since_compaction += 1
+
+    def record_remove(self, box):
+        self._queue.put(encode_record(OP_REMOVE, ID.pack(box)))
+        self.records_since_compaction += 1
+
+    def maybe_compact(self, store):
+        if self.records_since_compaction >= self.compact_every:
+            self.compact(store)
+
+    def begin_import(self):
+        # Mark the session as importing before the first imported record is queued
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.import_path, "wb") as f:
+            os.fsync(f.fileno())
+
+    def import_pending(self):
+        # True if a previous session stopped before its import was finished
+        return os.path.exists(self.import_path)
+
+    def end_import(self, store):
+        # Fold the import into a snapshot; the marker is removed once that snapshot is on disk
+        self.compact(store)
+        self._queue.put(("end_import",))
+
+    def compact(self, store):
+        # The snapshot is copied here so it matches exactly the records queued before it;
+        # writing it and truncating the journal happen on the writer thread
+        self._queue.put(("compact", store.snapshot()))
+        self.records_since_compaction = 0
+        self.path_ids = {}
+        self.class_ids = {}
+
+    def flush(self):
+        # Block until everything queued so far is on disk
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        done.wait()
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        last_sync = time.monotonic()
+        dirty = False
+        while True:
+            try:
+                item = self._queue.get(timeout=self.sync_interval)
+            except queue.Empty:
+                item = ()
+            # Drain everything queued in the meantime into one write
+            batch = [item]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for item in batch:
+                try:
+                    if item is None:
+                        self._sync()
+                        self._file.close()
+                        return
+                    if isinstance(item, bytes):
+                        self._file.write(item)
+                        dirty = True
+                    elif item and item[0] == "compact":
+                        self._sync()
+                        save_snapshot(self.snapshot_path, item[1])
+                        self._file.seek(0)
+                        self._file.truncate()
+                        self._sync()
+                        dirty = False
+                    elif item and item[0] == "end_import":
+                        if os.path.exists(self.import_path):
+                            os.remove(self.import_path)
+                    elif item and item[0] == "flush":
+                        self._sync()
+                        dirty = False
+                        item[1].set()
+                except OSError as error:
+                    self.error = error
+                    if item and not isinstance(item, bytes) and item[0] == "flush":
+                        item[1].set()
+            if dirty and time.monotonic() - last_sync >= self.sync_interval:
+                try:
+                    self._sync()
+                except OSError as error:
+                    self.error = error
+                dirty = False
+                last_sync = time.monotonic()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
@@ -0,0 +1,161 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .export import MANIFEST_FILE, load_manifest
+from .video import export_name, source_file
+from .yolo import denormalize, parse_label_text, probe_size, read_class_names
+
+
+def label_stem(image_path, folder=None):
+    # Name of the label file of an image in labels/, without .txt; the same rule as the export
+    return os.path.splitext(export_name(image_path, folder))[0]
+
+
+def exported_labels(labels_folder, folder):
+    # Image path -> label file name, from the manifest the export wrote next to labels_folder,
+    # for the images inside folder. Labels exported from other folders are left out even if
+    # their names match. None if there is no manifest (labels written by hand or by an older
+    # version), in which case label files can only be matched by name.
+    manifest = load_manifest(os.path.join(os.path.dirname(labels_folder), MANIFEST_FILE))
+    if not manifest["images"]:
+        return None
+    labels = {}
+    root = os.path.abspath(folder) if folder is not None else None
+    for image_path, entry in manifest["images"].items():
+        if root is None:
+            labels[image_path] = entry["label"]
+            continue
+        try:
+            source = os.path.relpath(os.path.abspath(source_file(image_path)), root)
+        except ValueError:
+            # Another drive
+            continue
+        if source == os.pardir or source.startswith(os.pardir + os.sep):
+            continue
+        relative = os.path.relpath(os.path.abspath(image_path), root)
+        # Spelled the way the image index spells the folder's images
+        labels[os.path.join(folder, relative)] = entry["label"]
+    return labels
+
+
+def read_labels(items, labels_folder):
+    # Worker task: parse the label files of a chunk of (image path, label file name) pairs and
+    # probe the image sizes. Returns (paths, YOLO rows, per-row image sizes) for the images that
+    # have labels.
+    paths = []
+    row_blocks = []
+    size_blocks = []
+    for image_path, label_name in items:
+        label_path = os.path.join(labels_folder, label_name)
+        try:
+            with open(label_path, encoding="utf-8") as f:
+                rows = parse_label_text(f.read())
+            if not len(rows):
+                continue
+            size = probe_size(image_path)
+        except OSError:
+            continue
+        paths.extend([image_path] * len(rows))
+        row_blocks.append(rows)
+        size_blocks.append(np.broadcast_to(np.array(size, dtype=np.float64), (len(rows), 2)))
+    if not row_blocks:
+        return [], np.empty((0, 5)), np.empty((0, 2))
+    return paths, np.concatenate(row_blocks), np.concatenate(size_blocks)
+
+
+class LabelImporter:
+    # Loads the YOLO label files written by a previous export back into the annotation store.
+    # Files are parsed on a thread pool; results are applied to the store by the caller's
+    # thread through apply_ready(), so the GUI can show the first image while the rest loads.
+    # folder is the image folder being labelled: the export manifest says which label files
+    # belong to its images, and without a manifest label files are matched by the image paths
+    # relative to it. Images in skip (already in a resumed session) are not imported again.
+    def __init__(self, labels_folder, data_yaml_path, workers=8, chunk_size=256, folder=None, skip=()):
+        self.labels_folder = labels_folder
+        self.folder = folder
+        self.skip = frozenset(skip)
+        self.class_names = read_class_names(data_yaml_path) if os.path.exists(data_yaml_path) else []
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="label-import")
+        self.chunk_size = chunk_size
+        self.futures = []
+        self.loaded_boxes = 0
+        # Only images whose label file exists are worth submitting; each is taken out once submitted
+        self.labels = None
+        self.label_stems = set()
+        if os.path.isdir(labels_folder):
+            self.labels = exported_labels(labels_folder, folder)
+            if self.labels is None:
+                self.label_stems = {os.path.splitext(name)[0] for name in os.listdir(labels_folder)
+                                    if name.endswith(".txt")}
+
+    def empty(self):
+        # True if no label file is left to import
+        return not self.labels and not self.label_stems
+
+    def load_now(self, store, image_paths):
+        # Synchronous load, used for the image that is about to be displayed
+        paths, rows, sizes = read_labels(self._with_labels(image_paths), self.labels_folder)
+        return self._apply(store, paths, rows, sizes)
+
+    def submit(self, image_paths):
+        # Queue images for background loading
+        items = self._with_labels(image_paths)
+        for start in range(0, len(items), self.chunk_size):
+            self.futures.append(self.executor.submit(
+                read_labels, items[start:start + self.chunk_size], self.labels_folder))
+
+    def _with_labels(self, image_paths):
+        # (image path, label file name) of the images with a label file still to import
+        items = []
+        for image_path in image_paths:
+            if image_path in self.skip:
+                continue
+            if self.labels is not None:
+                label_name = self.labels.pop(image_path, None)
+                if label_name is not None:
+                    items.append((image_path, label_name))
+                continue
+            stem = label_stem(image_path, self.folder)
+            if stem in self.label_stems:
+                self.label_stems.discard(stem)
+                items.append((image_path, stem + ".txt"))
+        return items
+
+    def apply_ready(self, store, max_boxes=50000):
+        # Move finished chunks into the store, denormalising them in one pass.
+        # Returns the set of image paths that received boxes.
+        ready = []
+        remaining = []
+        count = 0
+        for future in self.futures:
+            if future.done() and count < max_boxes:
+                ready.append(future.result())
+                count += len(ready[-1][0])
+            else:
+                remaining.append(future)
+        self.futures = remaining
+        if not ready:
+            return set()
+        paths = [p for chunk in ready for p in chunk[0]]
+        rows = np.concatenate([chunk[1] for chunk in ready])
+        sizes = np.concatenate([chunk[2] for chunk in ready])
+        return self._apply(store, paths, rows, sizes)
+
+    def _apply(self, store, paths, rows, sizes):
+        if not paths:
+            return set()
+        coords = denormalize(rows, sizes)
+        class_indices = rows[:, 0].astype(np.int64)
+        names = self.class_names
+        labels = [names[i] if 0 <= i < len(names) else str(i) for i in class_indices.tolist()]
+        store.extend(paths, labels, coords)
+        self.loaded_boxes += len(paths)
+        return set(paths)
+
+    def done(self):
+        return not self.futures
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,57 @@
+import time
+
+from .tracing import RateMeter, tracer
+
+
+class MotionCoalescer:
+    # <B1-Motion> fires far more often than the screen refreshes. push() only records the latest
+    # pointer position; draw(x, y) runs at most once per frame, from after_idle once Tk has drained
+    # its event queue (or from a timer when the previous frame was less than frame_ms ago), so
+    # intermediate positions are dropped. While the tracer is on, event and frame rates are measured.
+    def __init__(self, widget, draw, frame_ms=16):
+        self.widget = widget
+        self.draw = draw
+        self.frame_ms = frame_ms
+        self.position = None
+        self.job = None
+        self.last_frame = 0.0
+        self.events = RateMeter()
+        self.frames = RateMeter()
+
+    def push(self, x, y):
+        self.position = (x, y)
+        if tracer.enabled:
+            self.events.tick()
+        if self.job is None:
+            wait_ms = int(self.frame_ms - (time.perf_counter() - self.last_frame) * 1000)
+            if wait_ms > 0:
+                self.job = self.widget.after(wait_ms, self._frame)
+            else:
+                self.job = self.widget.after_idle(self._frame)
+
+    def flush(self):
+        # Draw the latest position now, e.g. on button release
+        if self.job is not None:
+            self.widget.after_cancel(self.job)
+            self._frame()
+
+    def cancel(self):
+        if self.job is not None:
+            self.widget.after_cancel(self.job)
+            self.job = None
+        self.position = None
+
+    def _frame(self):
+        self.job = None
+        self.last_frame = time.perf_counter()
+        if self.position is None:
+            return
+        if tracer.enabled:
+            self.frames.tick()
+            with tracer.span("drag_frame"):
+                self.draw(*self.position)
+        else:
+            self.draw(*self.position)
+
+    def readout(self):
+        return f"{self.events.rate():.0f} events/s, {self.frames.rate():.0f} fps"
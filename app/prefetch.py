@@ -0,0 +1,252 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .display import ResampleBudget, decode_fitted, refit_decoded
+from .video import DECODE_ERRORS
+
+
+def sharpness(entry):
+    # Orders renders of one image: full quality first, then the largest
+    return entry.quality == "full", entry.image.width
+
+
+class DecodedImageCache:
+    # LRU cache of decoded images bounded by the number of pixel bytes it holds
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def peek(self, key):
+        # Look up an entry without touching the LRU order or the hit counters
+        with self._lock:
+            return self._entries.get(key)
+
+    def find(self, path):
+        # Best entry for path at any target size: full quality first, then the largest render
+        with self._lock:
+            entries = [entry for entry in self._entries.values() if entry.path == path]
+        if not entries:
+            return None
+        return max(entries, key=sharpness)
+
+    def put(self, key, entry):
+        with self._lock:
+            old = self._entries.get(key)
+            if old is not None and old.quality == "full" and entry.quality != "full":
+                # A late fast decode must not replace a finished full-quality render
+                return
+            if old is not None:
+                del self._entries[key]
+                self.current_bytes -= old.nbytes
+            self._entries[key] = entry
+            self.current_bytes += entry.nbytes
+            # Evict least recently used entries, but always keep the newest one
+            while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+
+class PendingTasks:
+    # Futures of work queued on an executor, by key. Submitting a key that is already queued
+    # shares its future, finished work forgets itself, and queued work that is no longer
+    # wanted can be cancelled; work already running is left to finish.
+    def __init__(self, executor):
+        self.executor = executor
+        self._futures = {}
+        # Reentrant: cancelling a future, or one finishing before add_done_callback, runs
+        # _forget at once on the same thread
+        self._lock = threading.RLock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._futures
+
+    def get(self, key):
+        with self._lock:
+            return self._futures.get(key)
+
+    def submit(self, key, fn, *args):
+        # Future of fn(*args), shared with the work already queued under key
+        with self._lock:
+            future = self._futures.get(key)
+            if future is None:
+                future = self.executor.submit(fn, *args)
+                self._futures[key] = future
+                future.add_done_callback(lambda f, key=key: self._forget(key, f))
+        return future
+
+    def cancel(self, keep=()):
+        # Drop queued work whose key is not in keep
+        with self._lock:
+            for key, future in list(self._futures.items()):
+                if key not in keep and future.cancel():
+                    self._futures.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            for future in list(self._futures.values()):
+                future.cancel()
+            self._futures.clear()
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
+
+
+class ImagePrefetcher:
+    # Decodes the images around the current index on a worker pool so that
+    # navigating to them only has to hand a ready bitmap to the canvas
+    def __init__(self, radius=3, max_bytes=256 * 1024 * 1024, workers=2, budget_ms=25):
+        self.radius = radius
+        self.budget = ResampleBudget(budget_ms)
+        self.cache = DecodedImageCache(max_bytes)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self.decode_times = deque(maxlen=512)  # Seconds spent in each decode
+        self.frames = None  # Optional persistent FrameCache underneath the in-memory one
+        self._pending = PendingTasks(self.executor)  # Cache key -> Future of an in-flight decode
+
+    def get(self, path, target_size):
+        # Return the decoded image for path, decoding it now if it was not prefetched
+        key = (path, tuple(target_size))
+        entry = self.cache.get(key)
+        if entry is not None:
+            return entry
+        future = self._pending.get(key)
+        if future is not None and not future.cancelled():
+            entry = future.result()
+            if entry is not None:
+                return entry
+        # Decoded for another canvas size (before a window resize): resample instead of decoding
+        source = self.cache.find(path)
+        if source is not None:
+            return self.refit(source, target_size)
+        return self._decode(key)
+
+    def refit(self, decoded, target_size):
+        # Fit the pixels of decoded to target_size and cache the result
+        key = (decoded.path, tuple(target_size))
+        entry = self.cache.peek(key)
+        if entry is not None:
+            return entry
+        source = self.cache.find(decoded.path)
+        if source is None or sharpness(source) < sharpness(decoded):
+            source = decoded
+        entry = refit_decoded(source, target_size, self.budget)
+        self.cache.put(key, entry)
+        return entry
+
+    def prefetch(self, image_files, index, target_size):
+        # Schedule the neighbours of index, nearest first and alternating ahead and behind
+        target_size = tuple(target_size)
+        wanted = []
+        for distance in range(1, self.radius + 1):
+            for neighbour in (index + distance, index - distance):
+                if 0 <= neighbour < len(image_files):
+                    wanted.append((image_files[neighbour], target_size))
+
+        # Drop queued work that fell out of the window
+        self._pending.cancel(set(wanted))
+        for key in wanted:
+            if key in self.cache:
+                continue
+            if self.cache.find(key[0]) is not None:
+                # Cached at another size; get() resamples it without touching the disk
+                continue
+            self._pending.submit(key, self._decode, key)
+
+    def upgrade(self, path, target_size):
+        # Full-quality render of an image the user stopped on; replaces the fast entry in the cache
+        key = (path, tuple(target_size))
+        entry = self.cache.peek(key)
+        if entry is not None and entry.quality == "full":
+            return entry
+        return self._decode(key, full=True)
+
+    def set_frame_cache(self, frames):
+        # Use frames (or None) for the renders of the next images; the previous one is closed
+        if self.frames is not None:
+            self.frames.close()
+        self.frames = frames
+
+    def _decode(self, key, full=False):
+        path, target_size = key
+        frames = self.frames
+        if frames is not None:
+            # Rendered in an earlier session: map the stored pixels instead of decoding
+            entry = frames.get(path, target_size)
+            if entry is not None and (entry.quality == "full" or not full):
+                self.cache.put(key, entry)
+                return entry
+        start = time.perf_counter()
+        try:
+            entry = decode_fitted(path, target_size, None if full else self.budget)
+        except DECODE_ERRORS:
+            # Unreadable files are reported when the GUI asks for them directly
+            if threading.current_thread() is threading.main_thread():
+                raise
+            return None
+        if not full:
+            self.decode_times.append(time.perf_counter() - start)
+        self.cache.put(key, entry)
+        if frames is not None:
+            frames.put(entry, target_size)
+        return entry
+
+    def stats(self):
+        # Counters for tuning the prefetch radius and the cache budget
+        lookups = self.cache.hits + self.cache.misses
+        times = sorted(self.decode_times)
+        return {
+            "hits": self.cache.hits,
+            "misses": self.cache.misses,
+            "hit_rate": self.cache.hits / lookups if lookups else 0.0,
+            "evictions": self.cache.evictions,
+            "entries": len(self.cache),
+            "cached_bytes": self.cache.current_bytes,
+            "max_bytes": self.cache.max_bytes,
+            "decodes": len(times),
+            "decode_ms_mean": 1000 * sum(times) / len(times) if times else 0.0,
+            "decode_ms_p95": 1000 * times[int(0.95 * (len(times) - 1))] if times else 0.0,
+            "frame_cache_hits": self.frames.hits if self.frames is not None else 0,
+            "frame_cache_misses": self.frames.misses if self.frames is not None else 0,
+        }
+
+    def clear(self):
+        self._pending.clear()
+        self.cache.clear()
+
+    def close(self):
+        self.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.set_frame_cache(None)
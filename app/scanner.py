@@ -0,0 +1,118 @@
+import os
+import queue
+import threading
+import time
+from fnmatch import fnmatch
+
+from .video import VIDEO_PATTERNS
+
+# Patterns are matched case-insensitively, so .JPG and .Png count too. Videos are labelled frame by frame.
+DEFAULT_INCLUDE = ("*.jpg", "*.jpeg", "*.png") + VIDEO_PATTERNS
+# Hidden directories, which include the .yolo_labeling session folder
+DEFAULT_EXCLUDE = (".*",)
+
+
+def _matches(name, relative_path, patterns):
+    name = name.lower()
+    relative_path = relative_path.lower()
+    return any(fnmatch(name, p) or fnmatch(relative_path, p) for p in patterns)
+
+
+def walk_images(root, include=DEFAULT_INCLUDE, exclude=DEFAULT_EXCLUDE, cancelled=None):
+    # Yield (path relative to root, file size, mtime_ns) for every matching file below root,
+    # depth first with os.scandir. Symlinked directories are not followed.
+    include = tuple(p.lower() for p in include)
+    exclude = tuple(p.lower() for p in exclude)
+    pending = [""]
+    while pending:
+        if cancelled is not None and cancelled.is_set():
+            return
+        relative_dir = pending.pop()
+        try:
+            entries = os.scandir(os.path.join(root, relative_dir))
+        except OSError:
+            # Unreadable directories are skipped, not fatal
+            continue
+        subdirs = []
+        with entries:
+            for entry in entries:
+                relative_path = os.path.join(relative_dir, entry.name) if relative_dir else entry.name
+                if _matches(entry.name, relative_path, exclude):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(relative_path)
+                    elif _matches(entry.name, relative_path, include) and entry.is_file():
+                        stat = entry.stat()
+                        yield relative_path, stat.st_size, stat.st_mtime_ns
+                except OSError:
+                    continue
+        # Visit subdirectories in name order
+        pending.extend(sorted(subdirs, reverse=True))
+
+
+class FolderScanner:
+    # Walks a folder on a background thread and hands the files found to the GUI thread in
+    # batches through poll(). process, if given, runs on the scanner thread for every batch
+    # (e.g. to probe new files) and its result is what poll() returns. The first file is
+    # delivered on its own so the GUI can show an image before the walk finishes.
+    def __init__(self, root, include=DEFAULT_INCLUDE, exclude=DEFAULT_EXCLUDE, batch_size=512,
+                 batch_seconds=0.25, process=None):
+        self.root = root
+        self.include = include
+        self.exclude = exclude
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self.process = process
+        self.found = 0  # Files seen so far, read by the GUI for progress
+        self.error = None
+        self._queue = queue.Queue()
+        self._cancelled = threading.Event()
+        self._finished = False
+        self._thread = threading.Thread(target=self._run, name="folder-scanner", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _emit(self, batch):
+        self._queue.put(self.process(batch) if self.process is not None else batch)
+
+    def _run(self):
+        batch = []
+        last_emit = time.monotonic()
+        try:
+            for entry in walk_images(self.root, self.include, self.exclude, self._cancelled):
+                batch.append(entry)
+                self.found += 1
+                if (self.found == 1 or len(batch) >= self.batch_size
+                        or time.monotonic() - last_emit >= self.batch_seconds):
+                    self._emit(batch)
+                    batch = []
+                    last_emit = time.monotonic()
+            if batch:
+                self._emit(batch)
+        except Exception as error:
+            self.error = error
+        finally:
+            self._queue.put(None)
+
+    def poll(self):
+        # Batches completed since the last call; never blocks
+        batches = []
+        while True:
+            try:
+                batch = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if batch is None:
+                self._finished = True
+            else:
+                batches.append(batch)
+        return batches
+
+    def done(self):
+        # True once poll() has returned the last batch
+        return self._finished
+
+    def cancel(self):
+        self._cancelled.set()
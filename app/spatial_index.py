@@ -0,0 +1,105 @@
+import math
+
+
+class GridIndex:
+    # Uniform grid over one image in original-image coordinates.
+    # Each box is registered in every cell it overlaps, so point and rectangle
+    # queries only look at the boxes in the cells they touch.
+    def __init__(self, image_size, cells_per_side=64, max_cells_per_box=256):
+        width, height = image_size
+        self.cell_size = max(1.0, max(width, height) / cells_per_side)
+        self.max_cells_per_box = max_cells_per_box
+        self.cells = {}  # (column, row) -> set of box keys
+        self.oversized = set()  # Boxes too large to register cell by cell, checked on every query
+        self.boxes = {}  # Box key -> ((x1, y1, x2, y2), insertion order)
+        self._order = 0
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def __contains__(self, key):
+        return key in self.boxes
+
+    def _cell_range(self, x1, y1, x2, y2):
+        size = self.cell_size
+        return (math.floor(x1 / size), math.floor(y1 / size),
+                math.floor(x2 / size), math.floor(y2 / size))
+
+    def insert(self, key, coords):
+        # Boxes may be stored with their corners in any order
+        x1, y1, x2, y2 = coords
+        x1, x2 = min(x1, x2), max(x1, x2)
+        y1, y2 = min(y1, y2), max(y1, y2)
+        if key in self.boxes:
+            self.remove(key)
+        self._order += 1
+        self.boxes[key] = ((x1, y1, x2, y2), self._order)
+
+        c1, r1, c2, r2 = self._cell_range(x1, y1, x2, y2)
+        if (c2 - c1 + 1) * (r2 - r1 + 1) > self.max_cells_per_box:
+            self.oversized.add(key)
+            return
+        for column in range(c1, c2 + 1):
+            for row in range(r1, r2 + 1):
+                self.cells.setdefault((column, row), set()).add(key)
+
+    def remove(self, key):
+        entry = self.boxes.pop(key, None)
+        if entry is None:
+            return
+        if key in self.oversized:
+            self.oversized.discard(key)
+            return
+        c1, r1, c2, r2 = self._cell_range(*entry[0])
+        for column in range(c1, c2 + 1):
+            for row in range(r1, r2 + 1):
+                cell = self.cells.get((column, row))
+                if cell is not None:
+                    cell.discard(key)
+                    if not cell:
+                        del self.cells[(column, row)]
+
+    def query_point(self, x, y):
+        # All boxes containing the point (edges included)
+        candidates = set(self.oversized)
+        candidates.update(self.cells.get(self._cell_range(x, y, x, y)[:2], ()))
+        hits = []
+        for key in candidates:
+            x1, y1, x2, y2 = self.boxes[key][0]
+            if x1 <= x <= x2 and y1 <= y <= y2:
+                hits.append(key)
+        return hits
+
+    def query_rect(self, x1, y1, x2, y2):
+        # All boxes intersecting the rectangle (edges included)
+        x1, x2 = min(x1, x2), max(x1, x2)
+        y1, y2 = min(y1, y2), max(y1, y2)
+        c1, r1, c2, r2 = self._cell_range(x1, y1, x2, y2)
+        candidates = set(self.oversized)
+        if (c2 - c1 + 1) * (r2 - r1 + 1) > len(self.cells):
+            # Faster to walk the occupied cells than every cell of a huge query
+            for (column, row), cell in self.cells.items():
+                if c1 <= column <= c2 and r1 <= row <= r2:
+                    candidates.update(cell)
+        else:
+            for column in range(c1, c2 + 1):
+                for row in range(r1, r2 + 1):
+                    candidates.update(self.cells.get((column, row), ()))
+        hits = []
+        for key in candidates:
+            bx1, by1, bx2, by2 = self.boxes[key][0]
+            if bx1 <= x2 and x1 <= bx2 and by1 <= y2 and y1 <= by2:
+                hits.append(key)
+        return hits
+
+    def pick(self, x, y):
+        # The box to select at a point: the smallest box containing it,
+        # and among equally sized boxes the most recently added (topmost) one
+        best_key = None
+        best_rank = None
+        for key in self.query_point(x, y):
+            (x1, y1, x2, y2), order = self.boxes[key]
+            rank = ((x2 - x1) * (y2 - y1), -order)
+            if best_rank is None or rank < best_rank:
+                best_key, best_rank = key, rank
+        return best_key
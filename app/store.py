@@ -0,0 +1,216 @@
+from array import array
+
+import numpy as np
+
+
+class AnnotationStore:
+    # Bounding boxes of a labeling session kept in contiguous NumPy columns
+    # (image id, class id, x1, y1, x2, y2) with interned path and class tables.
+    # A box id is its row number and stays valid until the box is deleted;
+    # rows of deleted boxes are recycled by later appends.
+    def __init__(self, capacity=1024):
+        self.image_ids = np.zeros(capacity, dtype=np.int32)
+        self.class_ids = np.zeros(capacity, dtype=np.int32)
+        self.coords = np.zeros((capacity, 4), dtype=np.float32)  # x1, y1, x2, y2 in original image pixels
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.rows_used = 0  # Rows ever handed out, alive or free
+        self.free_rows = array("i")
+
+        self.paths = []  # Image id -> image path
+        self.path_ids = {}
+        self.class_names = []  # Class id -> label
+        self.class_name_ids = {}
+        self.image_rows = {}  # Image id -> box ids of that image in insertion order
+        self.dirty = set()  # Image ids modified since the last export
+
+    def __len__(self):
+        return self.rows_used - len(self.free_rows)
+
+    def intern_path(self, path):
+        image_id = self.path_ids.get(path)
+        if image_id is None:
+            image_id = len(self.paths)
+            self.paths.append(path)
+            self.path_ids[path] = image_id
+        return image_id
+
+    def intern_class(self, label):
+        class_id = self.class_name_ids.get(label)
+        if class_id is None:
+            class_id = len(self.class_names)
+            self.class_names.append(label)
+            self.class_name_ids[label] = class_id
+        return class_id
+
+    def _grow(self, needed):
+        capacity = len(self.alive)
+        if needed <= capacity:
+            return
+        # Doubling keeps appends amortised O(1)
+        new_capacity = max(needed, 2 * capacity)
+        for name in ("image_ids", "class_ids", "coords", "alive"):
+            old = getattr(self, name)
+            new = np.zeros((new_capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:capacity] = old
+            setattr(self, name, new)
+
+    def add(self, path, label, coords):
+        # Append one box and return its box id
+        image_id = self.intern_path(path)
+        if self.free_rows:
+            row = self.free_rows.pop()
+        else:
+            self._grow(self.rows_used + 1)
+            row = self.rows_used
+            self.rows_used += 1
+        self.image_ids[row] = image_id
+        self.class_ids[row] = self.intern_class(label)
+        self.coords[row] = coords
+        self.alive[row] = True
+        self.image_rows.setdefault(image_id, array("i")).append(row)
+        self.dirty.add(image_id)
+        return row
+
+    def extend(self, paths, labels, coords, start=None):
+        # Bulk append; paths and labels are sequences, coords an (n, 4) array. Returns the new box ids.
+        # start places the boxes at box ids start.. instead, like put(); used when replaying a journal.
+        coords = np.asarray(coords, dtype=np.float32).reshape(-1, 4)
+        count = len(coords)
+        if start is None:
+            start = self.rows_used
+        self._grow(start + count)
+        rows = np.arange(start, start + count, dtype=np.int32)
+        image_ids = np.fromiter((self.intern_path(p) for p in paths), dtype=np.int32, count=count)
+        self.image_ids[start:start + count] = image_ids
+        self.class_ids[start:start + count] = np.fromiter(
+            (self.intern_class(label) for label in labels), dtype=np.int32, count=count)
+        self.coords[start:start + count] = coords
+        self.alive[start:start + count] = True
+        self.rows_used = max(self.rows_used, start + count)
+        self.dirty.update(np.unique(image_ids).tolist())
+        # Group the new rows per image with one stable sort instead of a Python loop per box
+        order = np.argsort(image_ids, kind="stable")
+        sorted_ids = image_ids[order]
+        boundaries = np.flatnonzero(np.diff(sorted_ids)) + 1
+        for group in np.split(order, boundaries):
+            if len(group):
+                image_id = int(image_ids[group[0]])
+                self.image_rows.setdefault(image_id, array("i")).frombytes(rows[group].tobytes())
+        return rows
+
+    def put(self, box, path, label, coords):
+        # Place a box at a known box id; used when replaying a journal.
+        # Call rebuild_free_rows() once all boxes are in place.
+        self._grow(box + 1)
+        if self.alive[box]:
+            self.image_rows[int(self.image_ids[box])].remove(box)
+        image_id = self.intern_path(path)
+        self.image_ids[box] = image_id
+        self.class_ids[box] = self.intern_class(label)
+        self.coords[box] = coords
+        self.alive[box] = True
+        self.rows_used = max(self.rows_used, box + 1)
+        self.image_rows.setdefault(image_id, array("i")).append(box)
+        self.dirty.add(image_id)
+
+    def rebuild_free_rows(self):
+        dead = np.flatnonzero(~self.alive[:self.rows_used]).astype(np.int32)
+        # Lowest rows are handed out first
+        self.free_rows = array("i", dead[::-1].tobytes())
+
+    def snapshot(self):
+        # Copy of every live box and the lookup tables, keyed by box id
+        rows = self.live_rows()
+        return {
+            "rows": rows.astype(np.int32),
+            "image_ids": self.image_ids[rows].copy(),
+            "class_ids": self.class_ids[rows].copy(),
+            "coords": self.coords[rows].copy(),
+            "paths": list(self.paths),
+            "class_names": list(self.class_names),
+        }
+
+    def restore(self, snapshot):
+        # Load a snapshot into an empty store, keeping every box id
+        self.clear()
+        for path in snapshot["paths"]:
+            self.intern_path(path)
+        for label in snapshot["class_names"]:
+            self.intern_class(label)
+        rows = np.asarray(snapshot["rows"], dtype=np.int32)
+        if not len(rows):
+            return
+        self._grow(int(rows.max()) + 1)
+        self.image_ids[rows] = snapshot["image_ids"]
+        self.class_ids[rows] = snapshot["class_ids"]
+        self.coords[rows] = snapshot["coords"]
+        self.alive[rows] = True
+        self.rows_used = int(rows.max()) + 1
+        image_ids = np.asarray(snapshot["image_ids"], dtype=np.int32)
+        # Nothing is known about previous exports; the export manifest sorts out what really changed
+        self.dirty.update(np.unique(image_ids).tolist())
+        order = np.argsort(image_ids, kind="stable")
+        boundaries = np.flatnonzero(np.diff(image_ids[order])) + 1
+        for group in np.split(order, boundaries):
+            if len(group):
+                self.image_rows[int(image_ids[group[0]])] = array("i", rows[group].tobytes())
+        self.rebuild_free_rows()
+
+    def remove(self, box):
+        if not self.alive[box]:
+            return
+        self.alive[box] = False
+        image_id = int(self.image_ids[box])
+        self.image_rows[image_id].remove(box)
+        self.free_rows.append(box)
+        self.dirty.add(image_id)
+
+    def rows(self, path):
+        # Box ids of one image in insertion order
+        image_id = self.path_ids.get(path)
+        if image_id is None:
+            return ()
+        return self.image_rows.get(image_id, ())
+
+    def count(self, path):
+        return len(self.rows(path))
+
+    def box_coords(self, box):
+        return tuple(float(c) for c in self.coords[box])
+
+    def label(self, box):
+        return self.class_names[self.class_ids[box]]
+
+    def path(self, box):
+        return self.paths[self.image_ids[box]]
+
+    def dirty_paths(self):
+        return [self.paths[image_id] for image_id in self.dirty]
+
+    def mark_exported(self, paths):
+        for path in paths:
+            self.dirty.discard(self.path_ids.get(path))
+
+    def labelled_paths(self):
+        # Paths of the images that have at least one box
+        return [self.paths[image_id] for image_id, rows in self.image_rows.items() if rows]
+
+    def live_rows(self):
+        return np.flatnonzero(self.alive[:self.rows_used])
+
+    def columns(self):
+        # Vectorised view of every live box: (box ids, image ids, class ids, coords)
+        rows = self.live_rows()
+        return rows, self.image_ids[rows], self.class_ids[rows], self.coords[rows]
+
+    def used_class_names(self):
+        # Labels that still have at least one box, sorted
+        counts = np.bincount(self.class_ids[self.live_rows()], minlength=len(self.class_names))
+        return sorted(self.class_names[i] for i in np.flatnonzero(counts))
+
+    def nbytes(self):
+        return (self.image_ids.nbytes + self.class_ids.nbytes + self.coords.nbytes + self.alive.nbytes
+                + sum(rows.itemsize * len(rows) for rows in self.image_rows.values()))
+
+    def clear(self):
+        self.__init__()
@@ -1,58 +1,282 @@
+import argparse
+import html
+import json
+import multiprocessing
 import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 from PIL import Image, ImageDraw, ImageFont
 
-# Define the path to the dataset, labels, and labelcheck folders
-script_directory = os.path.dirname(__file__)
-dataset_folder = os.path.join(script_directory, "dataset")
-labels_folder = os.path.join(script_directory, "labels")
-labelcheck_folder = os.path.join(script_directory, "labelcheck")
+if not __package__:
+    # Allow running as a plain script (python app/stored_label_check.py) as well as python -m
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = "app"
+
+from .display import fit_ratio, fitted_size, open_reduced
+from .yolo import denormalize, parse_label_text
+
+MANIFEST_FILE = "labelcheck_manifest.json"
+MODES = ("full", "previews", "sheets")
+# Output folder of each mode inside labelcheck/
+MODE_FOLDERS = {"full": "", "previews": "previews", "sheets": "sheets"}
+CAPTION_HEIGHT = 16
+
+_fonts = {}  # Per worker process: font path -> loaded font
+
+
+def _font(font_path):
+    if font_path not in _fonts:
+        _fonts[font_path] = ImageFont.truetype(font_path, size=16) if os.path.exists(font_path) else None
+    return _fonts[font_path]
+
+
+def _save_atomically(image, output_path, **params):
+    # Write next to the destination and rename, so an interrupted run leaves no partial file
+    root, extension = os.path.splitext(output_path)
+    tmp_path = root + ".part" + extension
+    image.save(tmp_path, **params)
+    os.replace(tmp_path, output_path)
+
+
+def render_label_check(image_path, label_path, output_path, font_path=None):
+    # Draw the boxes of one YOLO label file on its image and save the result to output_path
+    with open(label_path, "r") as file:
+        rows = parse_label_text(file.read())
+    with Image.open(image_path) as image:
+        image.load()
+        img_width, img_height = image.size
+        coords = denormalize(rows, [(img_width, img_height)] * len(rows))
+        font = _font(font_path) if font_path else None
+        draw = ImageDraw.Draw(image)
+        for class_index, (xmin, ymin, xmax, ymax) in zip(rows[:, 0].astype(int).tolist(), coords.tolist()):
+            # Draw the bounding box and the label above it
+            draw.rectangle([(xmin, ymin), (xmax, ymax)], outline="red", width=2)
+            draw.text((xmin, ymin - 20), str(class_index), fill="red", font=font)
+        _save_atomically(image, output_path)
+
+
+def render_preview(image_path, label_path, max_size, font_path=None):
+    # Downscaled copy of an image, at most max_size, with its boxes drawn at the preview's scale.
+    # JPEGs are decoded at a reduced DCT scale, so the full-resolution pixels are never produced.
+    with open(label_path, "r") as file:
+        rows = parse_label_text(file.read())
+    image, original_size = open_reduced(image_path, max_size)
+    with image:
+        ratio = fit_ratio(original_size, max_size)
+        preview = image.convert("RGB").resize(fitted_size(original_size, ratio), Image.BILINEAR)
+    # Normalised coordinates map straight to the preview's own pixel size
+    coords = denormalize(rows, [preview.size] * len(rows))
+    font = _font(font_path) if font_path else None
+    draw = ImageDraw.Draw(preview)
+    for class_index, (xmin, ymin, xmax, ymax) in zip(rows[:, 0].astype(int).tolist(), coords.tolist()):
+        draw.rectangle([(xmin, ymin), (xmax, ymax)], outline="red", width=1)
+        draw.text((xmin + 2, ymin + 1), str(class_index), fill="red", font=font)
+    return preview
+
+
+def render_preview_file(image_path, label_path, output_path, max_size, font_path=None):
+    _save_atomically(render_preview(image_path, label_path, max_size, font_path), output_path, quality=85)
+
+
+def render_contact_sheet(items, output_path, tile_size=(256, 256), columns=6, font_path=None):
+    # Page of previews laid out in a grid, each captioned with its file name.
+    # items is a list of (file name, image path, label path).
+    tile_width, tile_height = tile_size
+    rows = max(1, -(-len(items) // columns))
+    sheet = Image.new("RGB", (columns * tile_width, rows * (tile_height + CAPTION_HEIGHT)), "white")
+    draw = ImageDraw.Draw(sheet)
+    font = _font(font_path) if font_path else None
+    for position, (filename, image_path, label_path) in enumerate(items):
+        left = (position % columns) * tile_width
+        top = (position // columns) * (tile_height + CAPTION_HEIGHT)
+        try:
+            preview = render_preview(image_path, label_path, tile_size, font_path)
+            # Center the preview in its tile
+            sheet.paste(preview, (left + (tile_width - preview.width) // 2, top + (tile_height - preview.height) // 2))
+        except Exception as error:
+            draw.text((left + 4, top + 4), f"{type(error).__name__}", fill="red", font=font)
+        draw.text((left + 2, top + tile_height + 1), filename, fill="black", font=font)
+    _save_atomically(sheet, output_path, quality=85)
+
+
+def _render_task(task):
+    # Worker entry point; errors are returned rather than raised so one bad image does not stop the run
+    key, render, args = task
+    try:
+        render(*args)
+        return key, None
+    except Exception as error:
+        return key, f"{type(error).__name__}: {error}"
+
 
-# Create the labelcheck folder if it doesn't exist
-os.makedirs(labelcheck_folder, exist_ok=True)
+def _signature(image_path, label_path):
+    image_stat = os.stat(image_path)
+    label_stat = os.stat(label_path)
+    return [image_stat.st_size, image_stat.st_mtime_ns, label_stat.st_size, label_stat.st_mtime_ns]
 
-# Load the font for displaying labels (optional, customize the font path as needed)
-font_path = os.path.join(script_directory, "arial.ttf")  # Specify the path to a font file
-font = ImageFont.truetype(font_path, size=16) if os.path.exists(font_path) else None
 
-# Process each image in the dataset folder
-for filename in os.listdir(dataset_folder):
-    # Only process image files
-    if filename.endswith(('jpg', 'jpeg', 'png')):
-        # Load the image
+class LabelCheckStats:
+    def __init__(self):
+        self.mode = "full"
+        self.rendered = 0
+        self.unchanged = 0
+        self.removed = 0
+        self.errors = []  # (file name, error message)
+        self.seconds = 0.0
+
+    @property
+    def images_per_second(self):
+        return self.rendered / self.seconds if self.seconds else 0.0
+
+    def summary(self):
+        what = {"full": "label check images", "previews": "previews", "sheets": "contact sheets"}[self.mode]
+        return (f"Rendered {self.rendered} {what} in {self.seconds:.2f} s "
+                f"({self.images_per_second:.0f} images/s); {self.unchanged} unchanged, "
+                f"{self.removed} removed, {len(self.errors)} failed")
+
+
+def _labelled_images(directory):
+    # (file name, image path, label path, signature) of every exported image with a label file, by name
+    dataset_folder = os.path.join(directory, "dataset")
+    labels_folder = os.path.join(directory, "labels")
+    images = []
+    filenames = os.listdir(dataset_folder) if os.path.isdir(dataset_folder) else []
+    for filename in sorted(filenames):
+        if not filename.lower().endswith(('jpg', 'jpeg', 'png')):
+            continue
         image_path = os.path.join(dataset_folder, filename)
-        image = Image.open(image_path)
-
-        # Load the label file
-        label_file = os.path.join(labels_folder, os.path.splitext(filename)[0] + ".txt")
-        if os.path.exists(label_file):
-            with open(label_file, "r") as file:
-                # Read the bounding box data
-                draw = ImageDraw.Draw(image)
-                for line in file:
-                    # Parse the label and bounding box data
-                    parts = line.strip().split()
-                    label = parts[0]
-                    x_center = float(parts[1])
-                    y_center = float(parts[2])
-                    width = float(parts[3])
-                    height = float(parts[4])
-
-                    # Calculate the coordinates of the bounding box
-                    img_width, img_height = image.size
-                    xmin = (x_center - width / 2) * img_width
-                    ymin = (y_center - height / 2) * img_height
-                    xmax = (x_center + width / 2) * img_width
-                    ymax = (y_center + height / 2) * img_height
-
-                    # Draw the bounding box
-                    draw.rectangle([(xmin, ymin), (xmax, ymax)], outline="red", width=2)
-
-                    # Draw the label above the bounding box
-                    label_position = (xmin, ymin - 20)  # Adjust the position as needed
-                    draw.text(label_position, label, fill="red", font=font)
-
-            # Save the image with bounding boxes and labels in the labelcheck folder
-            output_path = os.path.join(labelcheck_folder, filename)
-            image.save(output_path)
-
-print("DONE: Processed images saved to 'labelcheck' folder.")
+        label_path = os.path.join(labels_folder, os.path.splitext(filename)[0] + ".txt")
+        try:
+            signature = _signature(image_path, label_path)
+        except OSError:
+            continue
+        images.append((filename, image_path, label_path, signature))
+    return images
+
+
+def _write_sheet_index(output_folder, pages):
+    # One HTML page listing every sheet, lazily loaded, so a browser pages through them quickly
+    with open(os.path.join(output_folder, "index.html"), "w", encoding="utf-8") as f:
+        f.write("<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Label check</title></head><body>\n")
+        for page, names in pages:
+            f.write(f"<h3 id=\"{page}\">{page}: {html.escape(names[0])} &ndash; {html.escape(names[-1])}</h3>\n")
+            f.write(f"<img src=\"{page}\" loading=\"lazy\">\n")
+        f.write("</body></html>\n")
+
+
+def render_label_checks(directory, workers=None, force=False, font_path=None, mode="full",
+                        preview_size=(256, 256), columns=6, rows=5):
+    # Render label overlays from dataset/ and labels/ in directory on a process pool.
+    #   full:     full-resolution copies in labelcheck/
+    #   previews: JPEG previews of at most preview_size in labelcheck/previews/
+    #   sheets:   pages of columns x rows captioned previews in labelcheck/sheets/, with an index.html
+    # Outputs whose inputs have the same size and mtime as at the last render are skipped unless
+    # force is set; outputs of images no longer in the dataset are deleted.
+    start = time.perf_counter()
+    output_folder = os.path.join(directory, "labelcheck", MODE_FOLDERS[mode])
+    os.makedirs(output_folder, exist_ok=True)
+    if font_path is None:
+        font_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "arial.ttf")
+
+    manifest_path = os.path.join(output_folder, MANIFEST_FILE)
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    # One job per output file: (output name, signature of its inputs, render function, arguments)
+    images = _labelled_images(directory)
+    jobs = []
+    if mode == "full":
+        for filename, image_path, label_path, signature in images:
+            jobs.append((filename, signature, render_label_check,
+                         (image_path, label_path, os.path.join(output_folder, filename), font_path)))
+    elif mode == "previews":
+        for filename, image_path, label_path, signature in images:
+            output_name = os.path.splitext(filename)[0] + ".jpg"
+            jobs.append((output_name, signature, render_preview_file,
+                         (image_path, label_path, os.path.join(output_folder, output_name), preview_size, font_path)))
+    elif mode == "sheets":
+        per_page = columns * rows
+        pages = []
+        for number, first in enumerate(range(0, len(images), per_page), 1):
+            page_images = images[first:first + per_page]
+            page = f"sheet_{number:05d}.jpg"
+            pages.append((page, [image[0] for image in page_images]))
+            items = [image[:3] for image in page_images]
+            signature = [[image[0]] + image[3] for image in page_images]
+            jobs.append((page, signature, render_contact_sheet,
+                         (items, os.path.join(output_folder, page), preview_size, columns, font_path)))
+        _write_sheet_index(output_folder, pages)
+    else:
+        raise ValueError(f"unknown label check mode {mode!r}, expected one of {MODES}")
+
+    stats = LabelCheckStats()
+    stats.mode = mode
+    tasks = []
+    signatures = {}
+    for output_name, signature, render, args in jobs:
+        signatures[output_name] = signature
+        if not force and manifest.get(output_name) == signature and os.path.exists(os.path.join(output_folder, output_name)):
+            stats.unchanged += 1
+            continue
+        tasks.append((output_name, render, args))
+
+    if tasks:
+        # Decoding, drawing and re-encoding are CPU bound, so use processes rather than threads.
+        # Spawned rather than forked: the GUI process has journal and decoder threads running.
+        workers = min(workers or os.cpu_count() or 1, len(tasks))
+        chunksize = max(1, min(64, len(tasks) // (workers * 4)))
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            for output_name, error in executor.map(_render_task, tasks, chunksize=chunksize):
+                if error is None:
+                    stats.rendered += 1
+                else:
+                    stats.errors.append((output_name, error))
+                    signatures.pop(output_name, None)
+
+    for output_name in set(manifest).difference(signatures):
+        # The image left the dataset (or failed): drop its stale output
+        try:
+            os.unlink(os.path.join(output_folder, output_name))
+            stats.removed += 1
+        except FileNotFoundError:
+            pass
+
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(signatures, f)
+    os.replace(tmp_path, manifest_path)
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Draw the YOLO labels of an exported dataset on its images.")
+    parser.add_argument("directory", nargs="?", default=os.path.dirname(os.path.abspath(__file__)),
+                        help="folder containing dataset/ and labels/ (default: the app folder)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="re-render every image, even unchanged ones")
+    parser.add_argument("--font", default=None, help="TrueType font for the labels (default: arial.ttf next to this script)")
+    parser.add_argument("--mode", choices=MODES, default="full",
+                        help="full-resolution copies, downscaled previews, or paged contact sheets")
+    parser.add_argument("--preview-size", type=int, default=256, help="longest side of a preview in pixels")
+    parser.add_argument("--columns", type=int, default=6, help="previews per row of a contact sheet")
+    parser.add_argument("--rows", type=int, default=5, help="rows per contact sheet")
+    args = parser.parse_args(argv)
+
+    stats = render_label_checks(args.directory, args.workers, args.force, args.font, args.mode,
+                                (args.preview_size, args.preview_size), args.columns, args.rows)
+    print(stats.summary())
+    for filename, error in stats.errors:
+        print(f"Failed to render {filename}: {error}")
+    print(f"DONE: Processed images saved to '{os.path.join('labelcheck', MODE_FOLDERS[args.mode])}' folder.")
+    return 1 if stats.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,17 @@ import tkinter as tk
 from tkinter import filedialog, simpledialog, ttk
 from PIL import Image, ImageTk
 import os
+import sys
+
+# Make the app package importable when run as a plain script (python app/test.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.display import fit_ratio, fitted_size
+from app.motion import MotionCoalescer
+from app.tracing import save_trace_from_env, traced, tracer
+
+# Stages of load_image shown in the status bar
+LOAD_STAGES = ("open", "resize", "photo_image", "canvas_image", "draw_boxes", "update_list")
 
 
 class ImageBoundingBoxApp:
@@ -32,6 +43,14 @@ class ImageBoundingBoxApp:
         self.canvas = tk.Canvas(self.frame, bg="white")
         self.canvas.pack(fill=tk.BOTH, expand=True)
 
+        # Images are fitted to the canvas and re-fitted from the decoded pixels when the window
+        # is resized; the re-fit waits until the window has stopped changing size
+        self.canvas_size = (1, 1)
+        self.scale = 1.0  # Canvas pixels per image pixel; boxes are stored in image pixels
+        self.refit_delay_ms = 120
+        self.refit_job = None
+        self.canvas.bind("<Configure>", self.on_canvas_configure)
+
         # Create a scrollable listbox in the side panel
         self.bbox_listbox = tk.Listbox(self.side_panel)
         self.scrollbar = tk.Scrollbar(self.side_panel, orient=tk.VERTICAL)
@@ -63,6 +82,17 @@ class ImageBoundingBoxApp:
         self.status_bar = tk.Label(self.master, text="Ready", bd=1, relief=tk.SUNKEN, anchor=tk.W)
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
 
+        # Time every stage for the latency readout in the status bar (a few microseconds per span)
+        tracer.enabled = True
+
+        # Preview rectangle updates are coalesced to one per frame however fast motion events arrive
+        self.drag_motion = MotionCoalescer(self.master, self.draw_preview)
+
+    def show_status(self, text, span=None, stages=()):
+        # Status text followed by the latency of the last span and its stages
+        readout = tracer.readout(span, stages) if span else ""
+        self.status_bar.config(text=f"{text}  |  {readout}" if readout else text)
+
     def add_toolbar_buttons(self):
         buttons = [
             ("Open Folder", self.select_folder, "Open a folder containing images."),
@@ -104,31 +134,57 @@ class ImageBoundingBoxApp:
             self.status_bar.config(text="Folder loaded")
 
     def load_image(self):
-        # Clear existing bounding boxes from the canvas
-        self.canvas.delete("bbox")
-
         if self.image_files:
             image_path = self.image_files[self.current_index]
-            self.current_image = Image.open(image_path)
-            self.photo_image = ImageTk.PhotoImage(self.current_image)
-            self.canvas.create_image(0, 0, anchor=tk.NW, image=self.photo_image)
-
-            # Draw existing bounding boxes and labels for the current image
-            if image_path in self.bounding_boxes:
-                for bbox in self.bounding_boxes[image_path]:
-                    # Draw bounding box
-                    self.canvas.create_rectangle(bbox["coords"][0], bbox["coords"][1], bbox["coords"][2],
-                                                 bbox["coords"][3], outline="red", tag="bbox")
-                    # Display label near the bounding box
-                    self.canvas.create_text(bbox["coords"][0], bbox["coords"][1] - 10, text=bbox["label"], fill="red",
-                                            anchor=tk.SW, tag="bbox_label")
-
-            # Update the bounding box list in the listbox
-            self.update_bounding_box_list()
+            self.show_image(image_path)
 
             # Update the status bar
-            self.status_bar.config(text=f"Viewing: {image_path}")
+            self.show_status(f"Viewing: {image_path}", "load_image", LOAD_STAGES)
 
+    @traced("load_image")
+    def show_image(self, image_path):
+        with tracer.span("open"):
+            self.current_image = Image.open(image_path)
+            self.current_image.load()
+        self.fit_image()
+
+        # Update the bounding box list in the listbox
+        self.update_bounding_box_list()
+
+    def fit_image(self):
+        # Show the decoded image fitted to the canvas and redraw the boxes at the new scale
+        self.canvas.delete("image", "bbox", "bbox_label", "highlight")
+        self.scale = fit_ratio(self.current_image.size, self.canvas_size)
+        with tracer.span("resize"):
+            fitted = self.current_image.resize(fitted_size(self.current_image.size, self.scale), Image.BILINEAR)
+        with tracer.span("photo_image"):
+            self.photo_image = ImageTk.PhotoImage(fitted)
+        with tracer.span("canvas_image"):
+            self.canvas.create_image(0, 0, anchor=tk.NW, image=self.photo_image, tag="image")
+            self.canvas.tag_lower("image")
+
+        # Draw existing bounding boxes and labels for the current image
+        self.redraw_bounding_boxes()
+
+    def on_canvas_configure(self, event):
+        size = (event.width, event.height)
+        if size == self.canvas_size:
+            return
+        self.canvas_size = size
+        if self.refit_job is not None:
+            self.master.after_cancel(self.refit_job)
+        self.refit_job = self.master.after(self.refit_delay_ms, self.refit)
+
+    @traced("refit")
+    def refit(self):
+        # Re-fit from the pixels already in memory; the file is not read again
+        self.refit_job = None
+        if self.current_image is not None:
+            self.fit_image()
+            self.show_status(f"Canvas {self.canvas_size[0]}x{self.canvas_size[1]}", "refit",
+                             ("resize", "photo_image", "draw_boxes"))
+
+    @traced("update_list")
     def update_bounding_box_list(self):
         # Method for updating the bounding box list in the listbox
         self.bbox_listbox.delete(0, tk.END)
@@ -137,7 +193,7 @@ class ImageBoundingBoxApp:
             for idx, bbox in enumerate(self.bounding_boxes[image_path]):
                 label = bbox["label"]
                 coords = bbox["coords"]
-                dimensions = f"({coords[0]}, {coords[1]}) to ({coords[2]}, {coords[3]})"
+                dimensions = f"({coords[0]:.0f}, {coords[1]:.0f}) to ({coords[2]:.0f}, {coords[3]:.0f})"
                 self.bbox_listbox.insert(tk.END, f"Bounding Box {idx + 1}: Label='{label}', Dimensions={dimensions}")
 
     def prev_image(self):
@@ -145,46 +201,48 @@ class ImageBoundingBoxApp:
         if self.current_index > 0:
             self.current_index -= 1
             self.load_image()
-            self.status_bar.config(text=f"Viewing: {self.image_files[self.current_index]}")
 
     def next_image(self):
         # Method for navigating to the next image
         if self.current_index < len(self.image_files) - 1:
             self.current_index += 1
             self.load_image()
-            self.status_bar.config(text=f"Viewing: {self.image_files[self.current_index]}")
 
+    @traced("draw_boxes")
     def redraw_bounding_boxes(self):
         # Method for redrawing bounding boxes
         image_path = self.image_files[self.current_index]
         if image_path in self.bounding_boxes:
             for bbox in self.bounding_boxes[image_path]:
+                x1, y1, x2, y2 = (c * self.scale for c in bbox["coords"])
                 # Draw bounding box
                 self.canvas.create_rectangle(
-                    bbox["coords"][0],
-                    bbox["coords"][1],
-                    bbox["coords"][2],
-                    bbox["coords"][3],
+                    x1,
+                    y1,
+                    x2,
+                    y2,
                     outline="red",
                     tag="bbox"
                 )
                 # Display label near the bounding box
                 self.canvas.create_text(
-                    bbox["coords"][0],
-                    bbox["coords"][1] - 10,
+                    x1,
+                    y1 - 10,
                     text=bbox["label"],
                     fill="red",
                     anchor=tk.SW,
                     tag="bbox_label"
                 )
 
+    @traced("mouse_down")
     def on_mouse_down(self, event):
         # Method to handle mouse down event
         image_path = self.image_files[self.current_index]
-        # Check if the click is within an existing bounding box
+        # Check if the click is within an existing bounding box (coordinates in image pixels)
+        x, y = event.x / self.scale, event.y / self.scale
         for idx, bbox in enumerate(self.bounding_boxes.get(image_path, [])):
             x1, y1, x2, y2 = bbox["coords"]
-            if x1 <= event.x <= x2 and y1 <= event.y <= y2:
+            if x1 <= x <= x2 and y1 <= y <= y2:
                 self.selected_bbox = idx
                 break
         else:
@@ -195,19 +253,26 @@ class ImageBoundingBoxApp:
     def on_mouse_drag(self, event):
         # Method to handle mouse drag event
         if self.drawing:
-            # Clear previous preview rectangle
-            self.canvas.delete("preview")
-
-            # Draw preview rectangle
-            self.canvas.create_rectangle(
-                self.bbox_start[0], self.bbox_start[1],
-                event.x, event.y,
-                outline="blue", tag="preview"
-            )
+            self.drag_motion.push(event.x, event.y)
+
+    def draw_preview(self, x, y):
+        if not self.drawing:
+            return
+        # Clear previous preview rectangle
+        self.canvas.delete("preview")
+
+        # Draw preview rectangle
+        self.canvas.create_rectangle(
+            self.bbox_start[0], self.bbox_start[1],
+            x, y,
+            outline="blue", tag="preview"
+        )
+        self.show_status(f"Drawing: {self.drag_motion.readout()}", "drag_frame")
 
     def on_mouse_up(self, event):
         # Method to handle mouse up event
         if self.drawing:
+            self.drag_motion.cancel()
             self.drawing = False
             self.canvas.delete("preview")
 
@@ -216,8 +281,9 @@ class ImageBoundingBoxApp:
             if image_path not in self.bounding_boxes:
                 self.bounding_boxes[image_path] = []
 
-            x1, y1 = self.bbox_start
-            x2, y2 = event.x, event.y
+            # Store the box in image pixels so it survives re-fits
+            x1, y1 = self.bbox_start[0] / self.scale, self.bbox_start[1] / self.scale
+            x2, y2 = event.x / self.scale, event.y / self.scale
 
             # Ask for a label for the new bounding box
             label = simpledialog.askstring("Label", "Enter label for bounding box:")
@@ -226,16 +292,21 @@ class ImageBoundingBoxApp:
                     "coords": (x1, y1, x2, y2),
                     "label": label
                 }
-                self.bounding_boxes[image_path].append(bbox)
+                self.add_bbox(image_path, bbox)
 
-                # Redraw all bounding boxes
-                self.redraw_bounding_boxes()
+                # Update the status bar
+                self.show_status("Bounding box added", "add_box", ("draw_boxes", "update_list"))
 
-                # Update the bounding box list
-                self.update_bounding_box_list()
+    @traced("add_box")
+    def add_bbox(self, image_path, bbox):
+        # Timed apart from the label dialog
+        self.bounding_boxes[image_path].append(bbox)
 
-                # Update the status bar
-                self.status_bar.config(text="Bounding box added")
+        # Redraw all bounding boxes
+        self.redraw_bounding_boxes()
+
+        # Update the bounding box list
+        self.update_bounding_box_list()
 
     def delete_selected_bbox(self):
         # Method for deleting the selected bounding box
@@ -275,16 +346,23 @@ class ImageBoundingBoxApp:
             image_path = self.image_files[self.current_index]
             if image_path in self.bounding_boxes:
                 bbox = self.bounding_boxes[image_path][self.selected_bbox]
+                x1, y1, x2, y2 = (c * self.scale for c in bbox["coords"])
                 self.canvas.create_rectangle(
-                    bbox["coords"][0],
-                    bbox["coords"][1],
-                    bbox["coords"][2],
-                    bbox["coords"][3],
+                    x1,
+                    y1,
+                    x2,
+                    y2,
                     outline="green",
                     tag="highlight"
                 )
 
     def on_done(self):
+        self.save_data()
+        # Print a message indicating that the task is complete
+        self.show_status("DONE: Images and bounding box data saved successfully.", "on_done")
+
+    @traced("on_done")
+    def save_data(self):
         # Get the directory where the script is located
         script_directory = os.path.dirname(__file__)
 
@@ -319,11 +397,9 @@ class ImageBoundingBoxApp:
                         # Write bounding box data to the file in YOLO format
                         f.write(f"{label} {x_center} {y_center} {width} {height}\n")
 
-        # Print a message indicating that the task is complete
-        self.status_bar.config(text="DONE: Images and bounding box data saved successfully.")
-
 
 if __name__ == "__main__":
     root = tk.Tk()
     app = ImageBoundingBoxApp(root)
     root.mainloop()
+    save_trace_from_env()
@@ -0,0 +1,71 @@
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from .display import ResampleBudget, decode_fitted
+from .frame_cache import FrameCache
+from .journal import JOURNAL_DIR
+from .prefetch import DecodedImageCache, PendingTasks
+
+THUMBNAIL_DIR = "thumbnails"
+THUMBNAIL_SIZE = (96, 72)
+
+
+class ThumbnailSource:
+    # Thumbnails for the filmstrip, made on a worker pool from reduced-size decodes. Made
+    # thumbnails are kept in memory (LRU, bounded by bytes) and in a per-folder FrameCache, so
+    # a folder that was browsed before shows its thumbnails without decoding anything.
+    def __init__(self, size=THUMBNAIL_SIZE, workers=2, max_bytes=32 * 1024 * 1024, max_disk_bytes=512 * 1024 * 1024):
+        self.size = size
+        self.max_disk_bytes = max_disk_bytes
+        self.budget = ResampleBudget(budget_ms=5)
+        self.cache = DecodedImageCache(max_bytes)
+        self.frames = None
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnails")
+        self._pending = PendingTasks(self.executor)  # Path -> Future
+
+    def set_folder(self, folder_path):
+        self.clear()
+        if self.frames is not None:
+            self.frames.close()
+        try:
+            self.frames = FrameCache(os.path.join(folder_path, JOURNAL_DIR, THUMBNAIL_DIR), self.max_disk_bytes)
+        except (OSError, sqlite3.Error):
+            # Read-only folder: thumbnails are only kept in memory
+            self.frames = None
+
+    def cached(self, path):
+        entry = self.cache.get(path)
+        return entry.image if entry is not None else None
+
+    def request(self, path):
+        # Future of the thumbnail of path, shared with a request already queued for it
+        return self._pending.submit(path, self.thumbnail, path)
+
+    def cancel(self, keep):
+        # Drop queued requests for thumbnails that scrolled out of view
+        self._pending.cancel(keep)
+
+    def thumbnail(self, path):
+        entry = self.cache.peek(path)
+        if entry is not None:
+            return entry.image
+        frames = self.frames
+        entry = frames.get(path, self.size) if frames is not None else None
+        if entry is None:
+            entry = decode_fitted(path, self.size, self.budget)
+            if frames is not None:
+                frames.put(entry, self.size)
+        self.cache.put(path, entry)
+        return entry.image
+
+    def clear(self):
+        self._pending.clear()
+        self.cache.clear()
+
+    def close(self):
+        self.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.frames is not None:
+            self.frames.close()
+            self.frames = None
@@ -0,0 +1,283 @@
+import glob
+import hashlib
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from .display import DecodedImage
+from .frame_cache import DiskCache
+from .journal import JOURNAL_DIR
+from .prefetch import DecodedImageCache, PendingTasks
+from .video import open_image, source_file
+
+TILE_SIZE = 256
+TILE_DIR = "tiles"
+TILE_INDEX = "tiles.sqlite"
+
+
+class TilePyramid:
+    # Multi-resolution view of one image: level k is the image reduced by 2**k and cut into
+    # tile_size squares. The first request for a level decodes it and saves all its tiles under
+    # cache_dir, so each level of an image is decoded once.
+    def __init__(self, path, original_size, cache_dir, tile_size=TILE_SIZE):
+        self.path = path
+        self.original_size = original_size
+        self.cache_dir = cache_dir
+        self.tile_size = tile_size
+        # Coarsest level: the whole image fits in one tile
+        longest = max(original_size)
+        self.max_level = max(0, math.ceil(math.log2(longest / tile_size))) if longest > tile_size else 0
+
+    def level_size(self, level):
+        factor = 2 ** level
+        return math.ceil(self.original_size[0] / factor), math.ceil(self.original_size[1] / factor)
+
+    def grid(self, level):
+        # Columns and rows of tiles at level
+        width, height = self.level_size(level)
+        return math.ceil(width / self.tile_size), math.ceil(height / self.tile_size)
+
+    def level_for_scale(self, scale):
+        # Coarsest level that still has at least one pixel per screen pixel
+        if scale >= 1:
+            return 0
+        return min(self.max_level, int(math.floor(math.log2(1 / scale))))
+
+    def tile_box(self, level, col, row):
+        # Pixel box of a tile within its level
+        width, height = self.level_size(level)
+        x0, y0 = col * self.tile_size, row * self.tile_size
+        return x0, y0, min(x0 + self.tile_size, width), min(y0 + self.tile_size, height)
+
+    def original_box(self, level, col, row):
+        # The same tile in original image pixels
+        factor = 2 ** level
+        x0, y0, x1, y1 = self.tile_box(level, col, row)
+        width, height = self.original_size
+        return x0 * factor, y0 * factor, min(x1 * factor, width), min(y1 * factor, height)
+
+    def tile_file(self, level, col, row):
+        return os.path.join(self.cache_dir, f"{level}_{col}_{row}.jpg")
+
+    def decode_level(self, level):
+        # Decode the whole image at the resolution of level. JPEG levels 1-3 come straight out
+        # of the decoder's DCT scaling; only level 0 needs the full-resolution bitmap.
+        image = open_image(self.path)
+        size = self.level_size(level)
+        if level > 0:
+            if image.format == "JPEG":
+                image.draft(None, size)
+            else:
+                image = image.reduce(2 ** level)
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        if image.size != size:
+            image = image.resize(size, Image.BOX)
+        image.load()
+        return image
+
+
+def pyramid_cache_dir(root, path):
+    # One directory per version of the file, so an edited image never shows stale tiles
+    stat = os.stat(source_file(path))
+    key = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}".encode("utf-8", "surrogateescape")
+    return os.path.join(root, hashlib.blake2b(key, digest_size=12).hexdigest())
+
+
+def _read_tile(tile_file):
+    try:
+        with Image.open(tile_file) as cached:
+            return cached.copy()
+    except OSError:
+        return None
+
+
+class TileCache(DiskCache):
+    # Index of the tiles on disk, so they stay under max_bytes like the frame cache. A level of a
+    # pyramid is cut and saved in one go, so it is also the unit that is looked up and evicted.
+    TABLE = "levels"
+    KEY = ("pyramid", "level")
+    INDEX_FILE = TILE_INDEX
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS levels (
+        pyramid TEXT NOT NULL,  -- directory of the pyramid in the tile root
+        level INTEGER NOT NULL,
+        file TEXT NOT NULL,  -- the level's tiles are <file>_<col>_<row>.jpg
+        nbytes INTEGER NOT NULL,
+        last_used REAL NOT NULL,
+        PRIMARY KEY (pyramid, level)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS levels_last_used ON levels (last_used);
+    """
+
+    def __init__(self, directory, max_bytes=1024 * 1024 * 1024):
+        super().__init__(directory, max_bytes)
+
+    def has_level(self, pyramid, level):
+        # True if the tiles of level are saved, which then count as just used
+        key = (os.path.basename(pyramid.cache_dir), level)
+        with self._lock:
+            if self.connection is None:
+                return False
+            if self.connection.execute(
+                    "SELECT 1 FROM levels WHERE pyramid = ? AND level = ?", key).fetchone() is None:
+                return False
+            self._touch(key)
+        return True
+
+    def add_level(self, pyramid, level, nbytes):
+        # Record the tiles of level, already written, evicting other levels if over max_bytes
+        name = os.path.basename(pyramid.cache_dir)
+        self._store((name, level), (name, level, os.path.join(name, str(level)), nbytes, time.time()), nbytes)
+
+    def _remove_file(self, file):
+        # Every tile of the level, then the pyramid's directory once its last level is gone
+        prefix = os.path.join(self.directory, file)
+        for tile_file in glob.glob(glob.escape(prefix) + "_*.jpg"):
+            try:
+                os.remove(tile_file)
+            except OSError:
+                pass
+        try:
+            os.rmdir(os.path.dirname(prefix))
+        except OSError:
+            # Other levels are still there
+            pass
+
+
+class TileSource:
+    # Loads tiles for the GUI on a worker pool. Tiles are read from the on-disk cache of their
+    # pyramid and kept in a byte-bounded LRU cache. A level missing from disk is decoded whole
+    # and every one of its tiles is saved before the level is released; only when the disk
+    # cache cannot be written are whole levels kept in memory instead. The disk cache is capped
+    # at max_disk_bytes, least recently used levels first.
+    def __init__(self, workers=2, max_level_bytes=512 * 1024 * 1024, max_tile_bytes=96 * 1024 * 1024,
+                 max_disk_bytes=1024 * 1024 * 1024, tile_size=TILE_SIZE):
+        self.tile_size = tile_size
+        self.max_disk_bytes = max_disk_bytes
+        self.cache_root = os.path.join(tempfile.gettempdir(), "yolo_labeling_tiles")
+        self.disk = self._open_disk(self.cache_root)
+        self.levels = DecodedImageCache(max_level_bytes)
+        self.tiles = DecodedImageCache(max_tile_bytes)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tiles")
+        self._pending = PendingTasks(self.executor)  # Tile key -> Future
+        self._level_locks = {}  # (path, level) -> Lock, so a level is decoded and cut once
+        self._lock = threading.Lock()
+
+    def set_folder(self, folder_path):
+        # Keep the tiles next to the folder's other caches; fall back to the temp dir if read-only
+        root = os.path.join(folder_path, JOURNAL_DIR, TILE_DIR)
+        disk = self._open_disk(root)
+        if disk is None:
+            root = os.path.join(tempfile.gettempdir(), "yolo_labeling_tiles")
+            disk = self._open_disk(root)
+        if self.disk is not None:
+            self.disk.close()
+        self.cache_root = root
+        self.disk = disk
+
+    def _open_disk(self, root):
+        try:
+            return TileCache(root, self.max_disk_bytes)
+        except (OSError, sqlite3.Error):
+            # Tiles are then cut from levels kept in memory
+            return None
+
+    def pyramid(self, path, original_size):
+        return TilePyramid(path, original_size, pyramid_cache_dir(self.cache_root, path), self.tile_size)
+
+    def cached(self, pyramid, level, col, row):
+        entry = self.tiles.get((pyramid.path, level, col, row))
+        return entry.image if entry is not None else None
+
+    def request(self, pyramid, level, col, row):
+        # Future of the tile image, shared with any request for the same tile already queued
+        return self._pending.submit((pyramid.path, level, col, row), self.tile, pyramid, level, col, row)
+
+    def cancel(self, keep):
+        # Drop queued requests for tiles that scrolled out of view; keep holds (path, level, col, row)
+        self._pending.cancel(keep)
+
+    def tile(self, pyramid, level, col, row):
+        key = (pyramid.path, level, col, row)
+        entry = self.tiles.peek(key)
+        if entry is not None:
+            return entry.image
+        image = self._read_saved(pyramid, level, col, row)
+        if image is None:
+            image = self._cut_level(pyramid, level, col, row)
+        self.tiles.put(key, DecodedImage(pyramid.path, image, pyramid.original_size, 2.0 ** -level, "full"))
+        return image
+
+    def _cut_level(self, pyramid, level, col, row):
+        # Cut every tile of level while it is decoded, so panning to any other tile of it later
+        # reads that tile from disk instead of decoding the whole image again. Returns the tile.
+        with self._lock:
+            lock = self._level_locks.setdefault((pyramid.path, level), threading.Lock())
+        with lock:
+            # Another worker may have cut the level while this one was waiting
+            image = self._read_saved(pyramid, level, col, row)
+            if image is not None:
+                return image
+            key = (pyramid.path, "level", level)
+            entry = self.levels.get(key)
+            if entry is not None:
+                return entry.image.crop(pyramid.tile_box(level, col, row))
+            level_image = pyramid.decode_level(level)
+            saved = self._save_tiles(pyramid, level, level_image)
+            if not saved:
+                # Read-only or full disk: keep the level so its other tiles can still be cut
+                self.levels.put(key, DecodedImage(pyramid.path, level_image, pyramid.original_size, 2.0 ** -level,
+                                                  "full"))
+            return level_image.crop(pyramid.tile_box(level, col, row))
+
+    def _read_saved(self, pyramid, level, col, row):
+        # Only tiles of levels in the disk index are used; anything else may be left over from an
+        # interrupted save or an evicted level
+        disk = self.disk
+        if disk is None or not disk.has_level(pyramid, level):
+            return None
+        return _read_tile(pyramid.tile_file(level, col, row))
+
+    def _save_tiles(self, pyramid, level, level_image):
+        # Returns False if the tiles could not be written
+        disk = self.disk
+        if disk is None:
+            return False
+        nbytes = 0
+        try:
+            os.makedirs(pyramid.cache_dir, exist_ok=True)
+            columns, rows = pyramid.grid(level)
+            for col in range(columns):
+                for row in range(rows):
+                    tile_file = pyramid.tile_file(level, col, row)
+                    # Written next to the final name and renamed, so no reader sees half a tile
+                    temporary = f"{tile_file}.{threading.get_ident()}.tmp"
+                    tile = level_image.crop(pyramid.tile_box(level, col, row))
+                    tile.save(temporary, "JPEG", quality=90, subsampling=0)
+                    nbytes += os.path.getsize(temporary)
+                    os.replace(temporary, tile_file)
+        except OSError:
+            return False
+        disk.add_level(pyramid, level, nbytes)
+        return True
+
+    def clear(self):
+        self._pending.clear()
+        with self._lock:
+            self._level_locks.clear()
+        self.levels.clear()
+        self.tiles.clear()
+
+    def close(self):
+        self.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.disk is not None:
+            self.disk.close()
+            self.disk = None
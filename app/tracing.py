@@ -0,0 +1,155 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Set YOLO_TRACE to a file name to record every span and write a Chrome trace there on exit
+TRACE_ENV = "YOLO_TRACE"
+
+
+class _NullSpan:
+    # Returned while timing is off, so a disabled span costs one attribute check and a call
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "start")
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer._finish(self.name, self.start, time.perf_counter_ns())
+        return False
+
+
+class SpanStats:
+    def __init__(self):
+        self.count = 0
+        self.last_ms = 0.0
+        self.mean_ms = 0.0  # Exponential moving average of recent calls
+        self.max_ms = 0.0
+
+
+class Tracer:
+    # Named timing spans around the stages of the GUI's hot paths.
+    #   enabled: spans are timed and per-name statistics kept for a live readout
+    #   record:  every span is also kept (up to max_events) for a Chrome trace / Perfetto dump
+    def __init__(self, enabled=False, record=False, max_events=200000):
+        self.enabled = enabled or record
+        self.record = record
+        self.stats = {}  # Span name -> SpanStats
+        self.events = deque(maxlen=max_events)  # (name, start ns, end ns, thread id)
+        self.origin = time.perf_counter_ns()
+        self._lock = threading.Lock()
+
+    def span(self, name):
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name)
+
+    def _finish(self, name, start, end):
+        ms = (end - start) / 1e6
+        with self._lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = SpanStats()
+                stats.mean_ms = ms
+            stats.count += 1
+            stats.last_ms = ms
+            stats.mean_ms = 0.8 * stats.mean_ms + 0.2 * ms
+            stats.max_ms = max(stats.max_ms, ms)
+            if self.record:
+                self.events.append((name, start, end, threading.get_ident()))
+
+    def last_ms(self, name):
+        stats = self.stats.get(name)
+        return stats.last_ms if stats is not None else None
+
+    def readout(self, total, stages):
+        # One-line latency summary of the last total span and its stages, for a status bar
+        total_ms = self.last_ms(total)
+        if total_ms is None:
+            return ""
+        parts = []
+        for stage in stages:
+            ms = self.last_ms(stage)
+            if ms is not None:
+                parts.append(f"{stage} {ms:.1f}")
+        return f"{total} {total_ms:.1f} ms" + (f" ({', '.join(parts)})" if parts else "")
+
+    def chrome_trace(self):
+        # Trace Event Format, loadable in chrome://tracing and ui.perfetto.dev
+        pid = os.getpid()
+        with self._lock:
+            events = list(self.events)
+        thread_names = {t.ident: t.name for t in threading.enumerate()}
+        trace = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread_names.get(tid, str(tid))}}
+                 for tid in {event[3] for event in events}]
+        for name, start, end, tid in events:
+            trace.append({"name": name, "cat": "app", "ph": "X", "pid": pid, "tid": tid,
+                          "ts": (start - self.origin) / 1000, "dur": (end - start) / 1000})
+        return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+    def save_chrome_trace(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+        return len(self.events)
+
+
+# Shared by the GUI and the modules it calls; the GUI turns timing on for its status readout
+tracer = Tracer(record=bool(os.environ.get(TRACE_ENV)))
+
+
+def save_trace_from_env():
+    # Write the recorded spans to the file named by YOLO_TRACE, if set
+    path = os.environ.get(TRACE_ENV)
+    if path and tracer.record:
+        count = tracer.save_chrome_trace(path)
+        print(f"Wrote {count} trace events to {path}")
+
+
+def traced(name):
+    # Decorator form of tracer.span for whole functions and event handlers
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return function(*args, **kwargs)
+            with _Span(tracer, name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class RateMeter:
+    # Occurrences per second over the last window seconds, e.g. input events or redraws
+    def __init__(self, window=1.0):
+        self.window = window
+        self.times = deque()
+
+    def tick(self):
+        now = time.perf_counter()
+        self.times.append(now)
+        while now - self.times[0] > self.window:
+            self.times.popleft()
+
+    def rate(self):
+        if len(self.times) < 2:
+            return 0.0
+        span = self.times[-1] - self.times[0]
+        return (len(self.times) - 1) / span if span > 0 else 0.0
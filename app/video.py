@@ -0,0 +1,257 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+from .journal import JOURNAL_DIR
+
+try:
+    import av
+except ImportError:  # Videos are optional; folders of images work without PyAV
+    av = None
+
+VIDEO_PATTERNS = ("*.mp4", "*.mov", "*.avi", "*.mkv", "*.webm", "*.m4v")
+VIDEO_EXTENSIONS = tuple(pattern[1:] for pattern in VIDEO_PATTERNS)
+VIDEO_INDEX_DIR = "videos"
+INDEX_VERSION = 1
+
+# A frame of a video is addressed as "<video path>#frame=<n>", n counting frames in
+# presentation order from 0. Everything keyed by image path (store, journal, caches,
+# export) handles these virtual paths; only opening the pixels goes through the decoder.
+FRAME_MARK = "#frame="
+
+# Stands for a directory level in the names of exported images and labels
+NAME_SEPARATOR = "__"
+
+# Pillow refuses images over twice MAX_IMAGE_PIXELS (about 179 megapixels by default) to guard
+# against decompression bombs. The files here are the user's own, and large scans and aerial
+# photos are what the tile pyramid is for, so the limit is raised to 2**31 pixels (errors above
+# 4.3 gigapixels). Whatever still trips it fails like an unreadable file: catch DECODE_ERRORS.
+Image.MAX_IMAGE_PIXELS = 1 << 31
+DECODE_ERRORS = (OSError, Image.DecompressionBombError)
+
+
+def is_video(path):
+    return path.lower().endswith(VIDEO_EXTENSIONS)
+
+
+def is_frame_path(path):
+    return FRAME_MARK in path
+
+
+def frame_path(video_path, index):
+    return f"{video_path}{FRAME_MARK}{index:06d}"
+
+
+def split_frame_path(path):
+    video_path, _, index = path.rpartition(FRAME_MARK)
+    return video_path, int(index)
+
+
+def source_file(path):
+    # The file on disk behind path: the video of a frame, or path itself
+    return path.rpartition(FRAME_MARK)[0] if FRAME_MARK in path else path
+
+
+def export_name(path, folder=None):
+    # File name of an image in dataset/: its path relative to folder with the directories joined
+    # by "__" (a/x.jpg -> a__x.jpg), so images of different subfolders never share a name.
+    # Frames become <video>_<extension>_frame<n>.jpg, keeping clip.mp4 and clip.mov apart.
+    relative = os.path.relpath(source_file(path), folder) if folder is not None else None
+    if relative is None or relative.split(os.sep)[0] == os.pardir:
+        # No folder given, or outside it: base name only
+        relative = os.path.basename(source_file(path))
+    name = relative.replace(os.sep, NAME_SEPARATOR)
+    if FRAME_MARK not in path:
+        return name
+    stem, extension = os.path.splitext(name)
+    return f"{stem}_{extension[1:].lower()}_frame{split_frame_path(path)[1]:06d}.jpg"
+
+
+class FrameIndex:
+    # Presentation timestamp of every frame of a video's first video stream and whether it is
+    # a keyframe, read once by demuxing the packets (nothing is decoded) and saved as .npz
+    # under .yolo_labeling/videos/ next to the video, keyed by its path, size and mtime.
+    def __init__(self, pts, keyframes, width, height, time_base):
+        self.pts = pts  # int64, sorted
+        self.keyframes = keyframes  # bool, same order as pts
+        self.width = width
+        self.height = height
+        self.time_base = time_base  # (numerator, denominator) of the pts unit
+        # Position of the keyframe each frame is decoded from
+        positions = np.where(keyframes, np.arange(len(pts)), 0)
+        self.keyframe_of = np.maximum.accumulate(positions) if len(pts) else positions
+
+    def __len__(self):
+        return len(self.pts)
+
+    @classmethod
+    def build(cls, video_path):
+        with _open_container(video_path) as container:
+            stream = container.streams.video[0]
+            pts = []
+            keyframes = []
+            for packet in container.demux(stream):
+                if packet.pts is None:
+                    # Flush packet at the end of the stream
+                    continue
+                pts.append(packet.pts)
+                keyframes.append(packet.is_keyframe)
+            width, height = stream.codec_context.width, stream.codec_context.height
+            time_base = (stream.time_base.numerator, stream.time_base.denominator)
+        # Packets come in decode order; frames are numbered in presentation order
+        order = np.argsort(np.array(pts, dtype=np.int64), kind="stable")
+        return cls(np.array(pts, dtype=np.int64)[order], np.array(keyframes, dtype=bool)[order],
+                   width, height, time_base)
+
+    @classmethod
+    def load(cls, video_path):
+        # Saved index if the video is unchanged, otherwise build and save a new one
+        cache_file = _index_file(video_path)
+        try:
+            with np.load(cache_file) as data:
+                if int(data["version"]) == INDEX_VERSION:
+                    return cls(data["pts"], data["keyframes"], int(data["width"]), int(data["height"]),
+                               tuple(data["time_base"].tolist()))
+        except (OSError, KeyError, ValueError):
+            pass
+        index = cls.build(video_path)
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            tmp_file = cache_file + ".tmp.npz"
+            np.savez(tmp_file, version=INDEX_VERSION, pts=index.pts, keyframes=index.keyframes,
+                     width=index.width, height=index.height, time_base=np.array(index.time_base))
+            os.replace(tmp_file, cache_file)
+        except OSError:
+            # Read-only folder: the index is rebuilt next session
+            pass
+        return index
+
+
+def _index_file(video_path):
+    stat = os.stat(video_path)
+    key = f"{os.path.abspath(video_path)}|{stat.st_size}|{stat.st_mtime_ns}".encode("utf-8", "surrogateescape")
+    name = f"{os.path.splitext(os.path.basename(video_path))[0]}-{hashlib.blake2b(key, digest_size=8).hexdigest()}.npz"
+    return os.path.join(os.path.dirname(video_path), JOURNAL_DIR, VIDEO_INDEX_DIR, name)
+
+
+def _open_container(video_path):
+    if av is None:
+        raise OSError(f"cannot open {video_path}: reading videos needs PyAV (pip install av)")
+    try:
+        return av.open(video_path)
+    except av.error.FFmpegError as error:
+        raise OSError(f"cannot open {video_path}: {error}") from error
+
+
+class VideoSource:
+    # Decodes single frames of one video on demand. A request seeks to the keyframe of the
+    # frame and decodes forward to it, unless the decoder is already inside that GOP before the
+    # frame, in which case it just keeps decoding; so stepping or prefetching forward through
+    # nearby frames never seeks. PyAV containers are not thread-safe, hence the lock.
+    def __init__(self, video_path):
+        self.path = video_path
+        self.index = FrameIndex.load(video_path)
+        self.container = None
+        self.stream = None
+        self.frames = None  # Decode iterator positioned after position
+        self.position = -1  # Frame number of the last decoded frame
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def size(self):
+        return self.index.width, self.index.height
+
+    def frame_paths(self, stride=1):
+        return [frame_path(self.path, i) for i in range(0, len(self.index), max(1, stride))]
+
+    def decode(self, number):
+        # PIL image of frame number
+        if not 0 <= number < len(self.index):
+            raise OSError(f"{self.path} has no frame {number}")
+        target = int(self.index.pts[number])
+        with self._lock:
+            if self.container is None:
+                self.container = _open_container(self.path)
+                self.stream = self.container.streams.video[0]
+                self.stream.thread_type = "AUTO"
+            keyframe = int(self.index.keyframe_of[number])
+            if self.frames is None or not keyframe <= self.position < number:
+                seek_pts = int(self.index.pts[keyframe])
+                self.container.seek(seek_pts, stream=self.stream, backward=True, any_frame=False)
+                self.frames = self.container.decode(self.stream)
+                self.position = -1
+            try:
+                for frame in self.frames:
+                    if frame.pts is None or frame.pts < target:
+                        continue
+                    self.position = int(np.searchsorted(self.index.pts, frame.pts))
+                    if frame.pts == target:
+                        return frame.to_image()
+                    break
+            except av.error.FFmpegError as error:
+                self.frames = None
+                raise OSError(f"cannot decode frame {number} of {self.path}: {error}") from error
+            # Ran past the frame (or off the end): start over from its keyframe next time
+            self.frames = None
+            raise OSError(f"cannot decode frame {number} of {self.path}")
+
+    def close(self):
+        with self._lock:
+            if self.container is not None:
+                self.container.close()
+            self.container = None
+            self.frames = None
+
+
+_sources = OrderedDict()  # Video path -> VideoSource, most recently used last
+_sources_lock = threading.Lock()
+MAX_OPEN_VIDEOS = 8
+
+
+def video_source(video_path):
+    # Shared VideoSource of a video; only the most recently used few keep their file open
+    with _sources_lock:
+        source = _sources.get(video_path)
+        if source is not None:
+            _sources.move_to_end(video_path)
+            return source
+    source = VideoSource(video_path)
+    with _sources_lock:
+        source = _sources.setdefault(video_path, source)
+        _sources.move_to_end(video_path)
+        while len(_sources) > MAX_OPEN_VIDEOS:
+            _, evicted = _sources.popitem(last=False)
+            evicted.close()
+    return source
+
+
+def frame_paths(video_path, stride=1):
+    return video_source(video_path).frame_paths(stride)
+
+
+def frame_size(path):
+    return video_source(source_file(path)).size
+
+
+def open_image(path):
+    # Image.open for image files and video frames alike; frames come back already decoded
+    if FRAME_MARK not in path:
+        return Image.open(path)
+    video_path, number = split_frame_path(path)
+    return video_source(video_path).decode(number)
+
+
+def export_frame(path, destination):
+    # Write a frame to dataset/ as a JPEG, atomically like place_file. Returns (method, bytes).
+    tmp = destination + ".part"
+    image = open_image(path)
+    image.save(tmp, "JPEG", quality=95)
+    os.replace(tmp, destination)
+    return "encoded", os.path.getsize(destination)
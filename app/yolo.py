@@ -0,0 +1,234 @@
+import os
+import re
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from .video import frame_size, is_frame_path, source_file
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# JPEG start-of-frame markers; C4 (DHT), C8 (JPG) and CC (DAC) share the range but carry no size
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _jpeg_size(f):
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        while marker[1] == 0xFF:
+            # Fill bytes before the marker code
+            marker = marker[1:] + f.read(1)
+        code = marker[1]
+        if code in (0xD8, 0x01) or 0xD0 <= code <= 0xD7:
+            continue
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        (length,) = struct.unpack(">H", length_bytes)
+        if code in SOF_MARKERS:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack(">HH", data[1:5])
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def probe_size(image_path):
+    # Pixel size of an image read from its header only. PNG and JPEG headers are parsed
+    # directly; other formats go through PIL, which also stops before decoding pixels.
+    # Video frames have the size of their video, from its frame index.
+    if is_frame_path(image_path):
+        return frame_size(image_path)
+    with open(image_path, "rb") as f:
+        head = f.read(24)
+        if head.startswith(PNG_SIGNATURE) and head[12:16] == b"IHDR":
+            return struct.unpack(">II", head[16:24])
+        if head[:2] == b"\xff\xd8":
+            size = _jpeg_size(f)
+            if size is not None:
+                return size
+    with Image.open(image_path) as image:
+        return image.size
+
+
+class ImageSizeCache:
+    # Header-probed image sizes, validated against the file's mtime and size
+    def __init__(self, workers=8):
+        self.workers = workers
+        self.sizes = {}  # Path -> (mtime_ns, file size, width, height)
+        self._lock = threading.Lock()
+
+    def get(self, image_path):
+        stat = os.stat(source_file(image_path))
+        with self._lock:
+            cached = self.sizes.get(image_path)
+        if cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2], cached[3]
+        width, height = probe_size(image_path)
+        with self._lock:
+            self.sizes[image_path] = (stat.st_mtime_ns, stat.st_size, width, height)
+        return width, height
+
+    def get_many(self, image_paths):
+        # (n, 2) array of sizes, probing the files that are not cached on a thread pool
+        image_paths = list(image_paths)
+        if len(image_paths) < 64:
+            return np.array([self.get(p) for p in image_paths], dtype=np.float64).reshape(-1, 2)
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="probe") as executor:
+            return np.array(list(executor.map(self.get, image_paths, chunksize=64)),
+                            dtype=np.float64).reshape(-1, 2)
+
+
+def read_class_names(data_yaml_path):
+    # Class names from a data.yaml, either the "names:" mapping written by on_done
+    # or a flow list such as names: ["object"]
+    names = {}
+    in_names = False
+    with open(data_yaml_path, encoding="utf-8") as f:
+        for line in f:
+            stripped = line.split("#", 1)[0].rstrip()
+            if not stripped:
+                continue
+            if stripped.startswith("names:"):
+                rest = stripped[len("names:"):].strip()
+                if rest.startswith("["):
+                    items = re.findall(r"""["']([^"']*)["']|([^,\[\]\s][^,\[\]]*)""", rest)
+                    return [quoted or bare.strip() for quoted, bare in items]
+                in_names = True
+                continue
+            if in_names:
+                match = re.match(r"""\s+(\d+)\s*:\s*["']?(.*?)["']?\s*$""", stripped)
+                if match:
+                    names[int(match.group(1))] = match.group(2)
+                    continue
+                match = re.match(r"""\s+-\s*["']?(.*?)["']?\s*$""", stripped)
+                if match:
+                    names[len(names)] = match.group(1)
+                    continue
+                in_names = False
+    return [names.get(i, str(i)) for i in range(max(names) + 1)] if names else []
+
+
+def parse_label_text(text):
+    # Rows of "class x_center y_center width height" as an (n, 5) float array.
+    # Malformed lines are skipped.
+    values = text.split()
+    if len(values) % 5 == 0:
+        try:
+            return np.array(values, dtype=np.float64).reshape(-1, 5)
+        except ValueError:
+            pass
+    rows = []
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) >= 5:
+            try:
+                rows.append([float(p) for p in parts[:5]])
+            except ValueError:
+                continue
+    return np.array(rows, dtype=np.float64).reshape(-1, 5)
+
+
+def denormalize(rows, sizes):
+    # YOLO rows and per-row (width, height) to x1, y1, x2, y2 in pixels, in one vectorised pass
+    sizes = np.asarray(sizes, dtype=np.float64).reshape(-1, 2)
+    half_w = rows[:, 3] / 2
+    half_h = rows[:, 4] / 2
+    coords = np.empty((len(rows), 4), dtype=np.float64)
+    coords[:, 0] = (rows[:, 1] - half_w) * sizes[:, 0]
+    coords[:, 1] = (rows[:, 2] - half_h) * sizes[:, 1]
+    coords[:, 2] = (rows[:, 1] + half_w) * sizes[:, 0]
+    coords[:, 3] = (rows[:, 2] + half_h) * sizes[:, 1]
+    return coords
+
+
+def normalize(coords, sizes):
+    # Pixel x1, y1, x2, y2 and per-row (width, height) to YOLO center/size in one vectorised pass.
+    # Inverted corners are swapped and boxes are clamped to the image, so every value is in [0, 1].
+    coords = np.asarray(coords, dtype=np.float64)
+    sizes = np.asarray(sizes, dtype=np.float64).reshape(-1, 2)
+    x1 = np.minimum(coords[:, 0], coords[:, 2])
+    x2 = np.maximum(coords[:, 0], coords[:, 2])
+    y1 = np.minimum(coords[:, 1], coords[:, 3])
+    y2 = np.maximum(coords[:, 1], coords[:, 3])
+    x1 = np.clip(x1 / sizes[:, 0], 0.0, 1.0)
+    x2 = np.clip(x2 / sizes[:, 0], 0.0, 1.0)
+    y1 = np.clip(y1 / sizes[:, 1], 0.0, 1.0)
+    y2 = np.clip(y2 / sizes[:, 1], 0.0, 1.0)
+    return np.column_stack(((x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1))
+
+
+# " 0." / " 1." and the six decimals of a value in [0, 1] as fixed-width byte strings
+FIELD = np.dtype([("lead", "V3"), ("decimals", "V6")])
+LEADS = np.frombuffer(b" 0. 1.", dtype="V3")
+_decimals_table = None
+
+
+def _decimals():
+    # Table of "000000" to "999999" (6 MB), built on first use
+    global _decimals_table
+    if _decimals_table is None:
+        values = np.arange(1000000, dtype=np.int32)
+        table = np.empty((1000000, 6), dtype=np.uint8)
+        for position in range(6):
+            table[:, 5 - position] = ord("0") + values % 10
+            values //= 10
+        _decimals_table = table.view("V6").ravel()
+    return _decimals_table
+
+
+def _label_bytes(class_indices, boxes):
+    # ASCII matrix of "class x y w h" lines with 6 decimals, built with array lookups.
+    # Class indices are left-aligned in a fixed-width column padded with NUL bytes, which are
+    # dropped when the matrix is flattened. Returns the flat bytes and the length of every line.
+    classes = np.asarray(class_indices, dtype=np.int64)
+    count = len(classes)
+    max_class = int(classes.max()) if count else 0
+    class_width = len(str(max_class))
+    class_table = np.zeros((max_class + 1, class_width), dtype=np.uint8)
+    for value in range(max_class + 1):
+        text = str(value).encode("ascii")
+        class_table[value, :len(text)] = np.frombuffer(text, dtype=np.uint8)
+    class_lengths = np.array([len(str(value)) for value in range(max_class + 1)], dtype=np.int64)
+
+    # Values are in [0, 1], so every field is " d.dddddd": 9 bytes
+    fixed = np.rint(np.asarray(boxes, dtype=np.float64) * 1e6).astype(np.int32)
+    fields = np.empty((count, 4), dtype=FIELD)
+    fields["lead"] = LEADS[fixed // 1000000]
+    fields["decimals"] = _decimals()[fixed % 1000000]
+
+    lines = np.empty((count, class_width + 37), dtype=np.uint8)
+    lines[:, :class_width] = class_table[classes]
+    lines[:, class_width:class_width + 36] = fields.view(np.uint8).reshape(count, 36)
+    lines[:, -1] = ord("\n")
+    line_lengths = class_lengths[classes] + 37
+    if class_width == 1:
+        return lines.tobytes(), line_lengths
+    flat = lines.ravel()
+    return flat[flat != 0].tobytes(), line_lengths
+
+
+def format_labels(class_indices, boxes):
+    # Label file body for many rows at once
+    data, _ = _label_bytes(class_indices, boxes)
+    return data.decode("ascii")
+
+
+def format_label_bodies(class_indices, boxes, counts):
+    # One label file body per image; counts is the number of consecutive rows of each image
+    data, line_lengths = _label_bytes(class_indices, boxes)
+    row_ends = np.cumsum(counts)
+    byte_ends = np.concatenate(([0], np.cumsum(line_lengths)))[row_ends].tolist()
+    text = data.decode("ascii")
+    bodies = []
+    start = 0
+    for end in byte_ends:
+        bodies.append(text[start:end])
+        start = end
+    return bodies
@@ -339,16 +339,20 @@ class ImageBoundingBoxApp:
         for image_path in self.image_files:
             filename = os.path.basename(image_path)
             dataset_path = os.path.join(dataset_folder, filename)
-            shutil.copy(image_path, dataset_path)
 
-            if image_path in self.bounding_boxes:
+            if image_path in self.bounding_boxes and self.bounding_boxes[image_path]:
+                # Only labelled images belong in the dataset; copy their bytes without re-encoding
+                shutil.copyfile(image_path, dataset_path)
+                # Use this image's own size (read from its header), not the one on the canvas
+                with Image.open(image_path) as image:
+                    img_width, img_height = image.size
+
                 label_path = os.path.join(labels_folder, os.path.splitext(filename)[0] + ".txt")
                 with open(label_path, "w") as f:
                     for bbox in self.bounding_boxes[image_path]:
                         label = bbox["label"]
                         coords = bbox["coords"]
                         class_index = label_to_index[label]
-                        img_width, img_height = self.current_image.size
                         x_center = (coords[0] + coords[2]) / 2 / img_width
                         y_center = (coords[1] + coords[3]) / 2 / img_height
                         width = abs(coords[2] - coords[0]) / img_width
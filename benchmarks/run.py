@@ -0,0 +1,365 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import PIL
+
+if not __package__:
+    # Allow running as a plain script (python benchmarks/run.py) as well as python -m benchmarks.run
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = "benchmarks"
+
+from app.canvas_layer import BoxLayer
+from app.export import export_dataset
+from app.image_index import ImageIndex
+from app.frame_cache import FrameCache
+from app.prefetch import ImagePrefetcher
+from app.scanner import walk_images
+from app.spatial_index import GridIndex
+from app.store import AnnotationStore
+from app.stored_label_check import render_label_checks
+
+from .synthetic import box_counts, fill_store, make_boxes, make_folder
+
+BENCHMARKS = ("scan", "load_image", "drag", "hit_test", "export", "label_check")
+CANVAS_SIZE = (800, 600)
+
+
+def timings(samples):
+    # Summary of a list of durations in seconds, reported in milliseconds
+    samples = np.sort(np.asarray(samples, dtype=np.float64)) * 1000
+    if not len(samples):
+        return {"count": 0}
+    return {
+        "count": int(len(samples)),
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "max_ms": float(samples[-1]),
+    }
+
+
+class RecordingCanvas:
+    # Stand-in for tk.Canvas when there is no display: it hands out item ids and counts calls,
+    # so the drag benchmark still measures the Python side and the number of canvas operations
+    def __init__(self):
+        self.next_id = 1
+        self.calls = 0
+
+    def _create(self, *args, **kwargs):
+        self.calls += 1
+        self.next_id += 1
+        return self.next_id - 1
+
+    create_rectangle = create_text = _create
+
+    def coords(self, *args):
+        self.calls += 1
+
+    def itemconfig(self, *args, **kwargs):
+        self.calls += 1
+
+    def delete(self, *args):
+        self.calls += 1
+
+
+def make_canvas():
+    # Real Tk canvas when a display is available (also under xvfb-run), otherwise a RecordingCanvas
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception:
+        return RecordingCanvas(), None, "recording"
+    root.withdraw()
+    canvas = tk.Canvas(root, width=CANVAS_SIZE[0], height=CANVAS_SIZE[1])
+    canvas.pack()
+    return canvas, root, "tk"
+
+
+def bench_scan(context):
+    folder = context["folder"]
+    start = time.perf_counter()
+    found = sum(1 for _ in walk_images(folder))
+    walk_seconds = time.perf_counter() - start
+
+    database = os.path.join(context["workdir"], "index.sqlite")
+    if os.path.exists(database):
+        os.unlink(database)
+    index = ImageIndex(folder, database=database, workers=context["workers"])
+    start = time.perf_counter()
+    index.refresh()
+    cold_seconds = time.perf_counter() - start
+    index.close()
+    # Reopen, as a new session would
+    start = time.perf_counter()
+    index = ImageIndex(folder, database=database, workers=context["workers"])
+    index.refresh()
+    paths = index.paths()
+    warm_seconds = time.perf_counter() - start
+    index.close()
+    return {
+        "files": found,
+        "walk_seconds": walk_seconds,
+        "walk_files_per_second": found / walk_seconds if walk_seconds else 0.0,
+        "index_cold_seconds": cold_seconds,
+        "index_cold_files_per_second": found / cold_seconds if cold_seconds else 0.0,
+        "index_warm_seconds": warm_seconds,
+        "index_warm_files_per_second": len(paths) / warm_seconds if warm_seconds else 0.0,
+    }
+
+
+def bench_load_image(context, samples=64):
+    # What load_image waits for: a cold fast decode, a prefetched hit, and the full-quality upgrade
+    paths = context["paths"][:samples]
+    prefetcher = ImagePrefetcher(workers=2)
+    cold = []
+    for path in paths:
+        start = time.perf_counter()
+        prefetcher.get(path, CANVAS_SIZE)
+        cold.append(time.perf_counter() - start)
+    warm = []
+    for path in paths:
+        start = time.perf_counter()
+        prefetcher.get(path, CANVAS_SIZE)
+        warm.append(time.perf_counter() - start)
+    upgrade = []
+    for path in paths:
+        start = time.perf_counter()
+        prefetcher.upgrade(path, CANVAS_SIZE)
+        upgrade.append(time.perf_counter() - start)
+    # Sequential navigation with the prefetch window running ahead, like pressing Next
+    prefetcher.clear()
+    navigation = []
+    for index, path in enumerate(paths):
+        start = time.perf_counter()
+        prefetcher.get(path, CANVAS_SIZE)
+        prefetcher.prefetch(paths, index, CANVAS_SIZE)
+        navigation.append(time.perf_counter() - start)
+        time.sleep(0.05)  # Time the user spends looking at the image
+    stats = prefetcher.stats()
+    prefetcher.close()
+
+    # A later session: the renders stored by the first one are mapped from the frame cache
+    frame_directory = os.path.join(context["workdir"], "frames")
+    prefetcher = ImagePrefetcher(workers=2)
+    prefetcher.set_frame_cache(FrameCache(frame_directory))
+    for path in paths:
+        prefetcher.upgrade(path, CANVAS_SIZE)
+    prefetcher.close()
+    prefetcher = ImagePrefetcher(workers=2)
+    prefetcher.set_frame_cache(FrameCache(frame_directory))
+    restart = []
+    for path in paths:
+        start = time.perf_counter()
+        prefetcher.get(path, CANVAS_SIZE)
+        restart.append(time.perf_counter() - start)
+    frame_hits = prefetcher.stats()["frame_cache_hits"]
+    prefetcher.close()
+    return {
+        "cold_decode": timings(cold),
+        "cached": timings(warm),
+        "full_quality_upgrade": timings(upgrade),
+        "navigation_with_prefetch": timings(navigation),
+        "prefetch_hit_rate": stats["hit_rate"],
+        "restart_with_frame_cache": timings(restart),
+        "frame_cache_hits": frame_hits,
+    }
+
+
+def bench_drag(context, box_counts_on_canvas=(0, 100, 1000), events=2000):
+    canvas, root, kind = make_canvas()
+    rng = np.random.default_rng(0)
+    results = {"canvas": kind}
+    try:
+        for count in box_counts_on_canvas:
+            layer = BoxLayer(canvas)
+            _, labels, coords = make_boxes(np.array([CANVAS_SIZE], dtype=np.float64), np.array([count]))
+            start = time.perf_counter()
+            for key, (box, label) in enumerate(zip(coords.tolist(), labels)):
+                layer.add(key, box, label, 1.0)
+            if root is not None:
+                root.update_idletasks()
+            redraw_seconds = time.perf_counter() - start
+
+            points = rng.uniform(0, 1, (events, 2)) * CANVAS_SIZE
+            calls_before = getattr(canvas, "calls", 0)
+            start = time.perf_counter()
+            for x, y in points.tolist():
+                layer.move_rubber_band(10, 10, x, y)
+                if root is not None:
+                    root.update_idletasks()
+            drag_seconds = time.perf_counter() - start
+            calls = getattr(canvas, "calls", 0) - calls_before
+            layer.end_rubber_band()
+            layer.clear()
+            results[f"boxes_{count}"] = {
+                "redraw_ms": redraw_seconds * 1000,
+                "drag_event_us": drag_seconds / events * 1e6,
+                "drag_events_per_second": events / drag_seconds if drag_seconds else 0.0,
+                "canvas_calls_per_event": calls / events if kind == "recording" else None,
+            }
+    finally:
+        if root is not None:
+            root.destroy()
+    return results
+
+
+def bench_hit_test(context, box_count=None, queries=20000):
+    # Clicks on an image holding max_boxes boxes
+    box_count = box_count or max(1, context["max_boxes"])
+    image_size = np.array([[4000, 3000]], dtype=np.float64)
+    _, _, coords = make_boxes(image_size, np.array([box_count]))
+    start = time.perf_counter()
+    index = GridIndex((4000, 3000))
+    for key, box in enumerate(coords.tolist()):
+        index.insert(key, box)
+    build_seconds = time.perf_counter() - start
+    points = np.random.default_rng(1).uniform(0, 1, (queries, 2)) * (4000, 3000)
+    start = time.perf_counter()
+    hits = sum(index.pick(x, y) is not None for x, y in points.tolist())
+    pick_seconds = time.perf_counter() - start
+    return {
+        "boxes": box_count,
+        "build_ms": build_seconds * 1000,
+        "pick_us": pick_seconds / queries * 1e6,
+        "picks_per_second": queries / pick_seconds if pick_seconds else 0.0,
+        "hit_fraction": hits / queries,
+    }
+
+
+def bench_export(context):
+    store = AnnotationStore()
+    boxes = fill_store(store, context["paths"], context["sizes"], context["counts"])
+    output = os.path.join(context["workdir"], "export")
+    shutil.rmtree(output, ignore_errors=True)
+    index = ImageIndex(context["folder"], database=":memory:", workers=context["workers"])
+    index.refresh()
+    start = time.perf_counter()
+    stats = export_dataset(store, context["paths"], output, context["workers"], sizes=index,
+                           folder=context["folder"])
+    seconds = time.perf_counter() - start
+    # Nothing changed: the incremental export should find nothing to do
+    store.dirty.update(range(len(store.paths)))
+    start = time.perf_counter()
+    again = export_dataset(store, context["paths"], output, context["workers"], sizes=index,
+                           folder=context["folder"])
+    incremental_seconds = time.perf_counter() - start
+    index.close()
+    labelled = len(store.labelled_paths())
+    return {
+        "images": labelled,
+        "boxes": boxes,
+        "seconds": seconds,
+        "images_per_second": labelled / seconds if seconds else 0.0,
+        "boxes_per_second": boxes / seconds if seconds else 0.0,
+        "copy_methods": dict(stats.methods),
+        "unchanged_rerun_seconds": incremental_seconds,
+        "unchanged_rerun_labels_written": again.labels_written,
+    }
+
+
+def bench_label_check(context):
+    # Full-resolution mode is slow on big images, so it only runs when asked for
+    output = os.path.join(context["workdir"], "export")
+    if not os.path.isdir(os.path.join(output, "dataset")):
+        bench_export(context)
+    images = len(os.listdir(os.path.join(output, "dataset")))
+    results = {}
+    for mode in context["label_check_modes"]:
+        stats = render_label_checks(output, context["workers"], force=True, mode=mode)
+        results[mode] = {
+            "images": images,
+            "outputs": stats.rendered,
+            "seconds": stats.seconds,
+            "images_per_second": images / stats.seconds if stats.seconds else 0.0,
+        }
+    return results
+
+
+RUNNERS = {
+    "scan": bench_scan,
+    "load_image": bench_load_image,
+    "drag": bench_drag,
+    "hit_test": bench_hit_test,
+    "export": bench_export,
+    "label_check": bench_label_check,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the labeling app's hot paths on synthetic data.")
+    parser.add_argument("--images", type=int, default=1000, help="images in the synthetic folder (1k-100k)")
+    parser.add_argument("--max-boxes", type=int, default=1000, help="most boxes on one image (0-1000)")
+    parser.add_argument("--subdirs", type=int, default=0, help="spread the images over this many subfolders")
+    parser.add_argument("--only", default=",".join(BENCHMARKS),
+                        help=f"comma-separated benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--workers", type=int, default=8, help="worker threads and processes")
+    parser.add_argument("--label-check-modes", default="sheets,previews",
+                        help="label check modes to time (sheets, previews, full)")
+    parser.add_argument("--workdir", default=None, help="where to generate data (default: a temporary folder)")
+    parser.add_argument("--keep", action="store_true", help="keep the generated data")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file for the results")
+    args = parser.parse_args(argv)
+
+    selected = [name.strip() for name in args.only.split(",") if name.strip()]
+    unknown = set(selected).difference(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="yolo-bench-")
+    try:
+        start = time.perf_counter()
+        folder = os.path.join(workdir, "images")
+        paths, sizes = make_folder(folder, args.images, args.subdirs)
+        counts = box_counts(args.images, args.max_boxes)
+        context = {
+            "workdir": workdir,
+            "folder": folder,
+            "paths": paths,
+            "sizes": sizes,
+            "counts": counts,
+            "max_boxes": args.max_boxes,
+            "workers": args.workers,
+            "label_check_modes": [m.strip() for m in args.label_check_modes.split(",") if m.strip()],
+        }
+        print(f"Generated {args.images} images ({int(counts.sum())} boxes) in {time.perf_counter() - start:.1f} s")
+
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "numpy": np.__version__,
+                "pillow": PIL.__version__,
+                "images": args.images,
+                "max_boxes": args.max_boxes,
+                "boxes": int(counts.sum()),
+                "subdirs": args.subdirs,
+                "workers": args.workers,
+            },
+            "results": {},
+        }
+        for name in selected:
+            start = time.perf_counter()
+            report["results"][name] = RUNNERS[name](context)
+            print(f"{name}: {time.perf_counter() - start:.1f} s")
+            print(json.dumps(report["results"][name], indent=2))
+    finally:
+        if not args.keep and args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import os
+import shutil
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+# (width, height) of the generated images; a folder mixes all of them
+IMAGE_SIZES = ((640, 480), (1280, 720), (1920, 1080), (4000, 3000))
+FORMATS = ("jpg", "png")
+CLASS_NAMES = ("car", "person", "bicycle", "dog", "traffic light")
+
+
+def make_image(size, seed):
+    # Smooth, photo-like content: upscaled noise with a few shapes, so JPEG and PNG sizes are realistic
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 255, (max(1, size[1] // 32), max(1, size[0] // 32), 3), dtype=np.uint8)
+    image = Image.fromarray(small).resize(size, Image.BICUBIC).filter(ImageFilter.GaussianBlur(2))
+    draw = ImageDraw.Draw(image)
+    for _ in range(8):
+        x, y = rng.integers(0, size[0]), rng.integers(0, size[1])
+        w, h = rng.integers(size[0] // 20, size[0] // 4), rng.integers(size[1] // 20, size[1] // 4)
+        draw.rectangle([x, y, x + w, y + h], fill=tuple(int(c) for c in rng.integers(0, 255, 3)))
+    return image
+
+
+def make_folder(folder_path, count, subdirs=0, seed=0):
+    # Folder of count images cycling through every size and format. Each distinct image is encoded
+    # once and hard-linked (or copied) under the other names, which keeps 100k-image folders cheap
+    # to generate. With subdirs > 0 the images are spread over that many subfolders.
+    os.makedirs(folder_path, exist_ok=True)
+    templates_folder = os.path.join(folder_path, ".templates")
+    os.makedirs(templates_folder, exist_ok=True)
+    templates = []
+    for i, size in enumerate(IMAGE_SIZES):
+        image = make_image(size, seed + i)
+        for image_format in FORMATS:
+            template = os.path.join(templates_folder, f"{size[0]}x{size[1]}.{image_format}")
+            if not os.path.exists(template):
+                image.save(template, quality=90) if image_format == "jpg" else image.save(template, compress_level=1)
+            templates.append((template, size, image_format))
+
+    paths = []
+    sizes = np.empty((count, 2), dtype=np.float64)
+    for i in range(count):
+        template, size, image_format = templates[i % len(templates)]
+        directory = os.path.join(folder_path, f"part{i % subdirs:03d}") if subdirs else folder_path
+        path = os.path.join(directory, f"img{i:07d}.{image_format}")
+        if not os.path.exists(path):
+            os.makedirs(directory, exist_ok=True)
+            try:
+                os.link(template, path)
+            except OSError:
+                shutil.copyfile(template, path)
+        paths.append(path)
+        sizes[i] = size
+    return paths, sizes
+
+
+def box_counts(count, max_boxes, seed=0):
+    # Boxes per image: a quarter of the images are unlabelled, the rest follow a long-tailed
+    # distribution capped at max_boxes, with at least one image at the cap
+    rng = np.random.default_rng(seed)
+    if max_boxes <= 0 or count == 0:
+        return np.zeros(count, dtype=np.int64)
+    counts = np.minimum(rng.geometric(min(1.0, 4.0 / max_boxes), count), max_boxes)
+    counts[rng.random(count) < 0.25] = 0
+    counts[rng.integers(0, count)] = max_boxes
+    return counts.astype(np.int64)
+
+
+def make_boxes(sizes, counts, seed=0):
+    # Random boxes inside each image: (image index per box, class name per box, (n, 4) x1 y1 x2 y2)
+    rng = np.random.default_rng(seed)
+    image_index = np.repeat(np.arange(len(counts)), counts)
+    box_sizes = sizes[image_index]
+    wh = rng.uniform(0.02, 0.3, (len(image_index), 2)) * box_sizes
+    xy = rng.uniform(0, 1, (len(image_index), 2)) * (box_sizes - wh)
+    coords = np.column_stack((xy, xy + wh))
+    labels = [CLASS_NAMES[i] for i in rng.integers(0, len(CLASS_NAMES), len(image_index)).tolist()]
+    return image_index, labels, coords
+
+
+def fill_store(store, paths, sizes, counts, seed=0):
+    image_index, labels, coords = make_boxes(sizes, counts, seed)
+    store.extend([paths[i] for i in image_index.tolist()], labels, coords)
+    return len(image_index)
@@ -0,0 +1,81 @@
+from app.box_panel import BoxListModel
+from app.store import AnnotationStore
+
+
+def model_of(labels, path="a.jpg"):
+    store = AnnotationStore()
+    boxes = [store.add(path, label, (i, i, i + 10, i + 10)) for i, label in enumerate(labels)]
+    model = BoxListModel(store)
+    model.show(path)
+    return store, model, boxes
+
+
+def add(store, model, label, path="a.jpg"):
+    box = store.add(path, label, (0, 0, 5, 5))
+    return box, model.add(box)
+
+
+def remove(store, model, box):
+    label = store.label(box)
+    store.remove(box)
+    return model.remove(box, label)
+
+
+def test_rows_follow_insertion_order():
+    store, model, boxes = model_of(["cat", "dog", "cat"])
+    assert model.rows == boxes
+    box, index = add(store, model, "bird")
+    assert (index, model.rows) == (3, boxes + [box])
+    assert remove(store, model, boxes[1]) == 1
+    assert model.rows == [boxes[0], boxes[2], box]
+    assert model.filter_choices() == ["All classes (3)", "bird (1)", "cat (2)"]
+
+
+def test_grouped_rows_are_sorted_by_class_then_insertion():
+    store, model, boxes = model_of(["dog", "cat", "dog", "cat"])
+    model.set_view(None, True)
+    assert model.rows == [boxes[1], boxes[3], boxes[0], boxes[2]]
+    box, index = add(store, model, "cat")
+    assert (index, model.rows) == (2, [boxes[1], boxes[3], box, boxes[0], boxes[2]])
+    box, index = add(store, model, "ant")
+    assert index == 0
+    assert remove(store, model, boxes[0]) == 4
+    assert model.keys == sorted(model.keys)
+    assert len(model.keys) == len(model.rows) == 5
+
+
+def test_filter_hides_other_classes():
+    store, model, boxes = model_of(["cat", "dog", "cat"])
+    model.set_view("cat", False)
+    assert model.rows == [boxes[0], boxes[2]]
+    # A box of another class is counted but not shown
+    box, index = add(store, model, "dog")
+    assert index is None and box not in model.rows
+    assert model.class_counts["dog"] == 2
+    assert remove(store, model, boxes[1]) is None
+    box, index = add(store, model, "cat")
+    assert (index, model.rows) == (2, [boxes[0], boxes[2], box])
+
+
+def test_removing_the_last_box_of_the_filtered_class_shows_every_class():
+    store, model, boxes = model_of(["cat", "dog"])
+    model.set_view("dog", True)
+    assert model.rows == [boxes[1]]
+    assert remove(store, model, boxes[1]) == 0
+    assert model.class_filter is None
+    assert model.rows == [boxes[0]]
+
+
+def test_window_scrolls_to_reveal_rows():
+    store, model, boxes = model_of(["cat"] * 50)
+    model.visible = 10
+    assert model.window() == boxes[:10]
+    assert not model.reveal(5)
+    assert model.reveal(30)
+    assert model.first == 25 and 30 in range(model.first, model.first + model.visible)
+    assert model.scroll_to(100) == 40
+    # Deleting near the end keeps the window full
+    for box in boxes[45:]:
+        remove(store, model, box)
+    assert model.first == 35 and len(model.window()) == 10
+    assert model.row_text(0).startswith("1. cat  (0, 0) to (10, 10)")
@@ -0,0 +1,99 @@
+import json
+import os
+
+import pytest
+from PIL import Image
+
+from app.export import MANIFEST_FILE, export_dataset
+from app.label_import import LabelImporter, label_stem
+from app.store import AnnotationStore
+from app.video import export_name
+
+
+def make_image(folder, relative_path, size=(100, 80)):
+    path = os.path.join(folder, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.new("RGB", size).save(path)
+    return path
+
+
+def listing(folder):
+    return sorted(os.listdir(folder))
+
+
+def test_export_names_follow_the_path_inside_the_folder(tmp_path):
+    folder = str(tmp_path)
+    assert export_name(os.path.join(folder, "x.jpg"), folder) == "x.jpg"
+    assert export_name(os.path.join(folder, "a", "b", "x.jpg"), folder) == "a__b__x.jpg"
+    assert export_name(os.path.join(folder, "clip.mp4#frame=000012"), folder) == "clip_mp4_frame000012.jpg"
+    assert export_name(os.path.join(folder, "clip.mov#frame=000012"), folder) == "clip_mov_frame000012.jpg"
+    assert label_stem(os.path.join(folder, "a", "x.jpg"), folder) == "a__x"
+
+
+def test_images_with_equal_names_in_subfolders_keep_their_labels(tmp_path):
+    folder = str(tmp_path / "images")
+    output = str(tmp_path / "output")
+    first = make_image(folder, "a/x.jpg")
+    second = make_image(folder, "b/x.jpg")
+    store = AnnotationStore()
+    store.add(first, "cat", (10, 10, 20, 20))
+    store.add(second, "cat", (50, 40, 90, 70))
+
+    stats = export_dataset(store, [first, second], output, workers=2, folder=folder)
+    assert stats.errors == []
+    assert listing(os.path.join(output, "labels")) == ["a__x.txt", "b__x.txt"]
+    assert listing(os.path.join(output, "dataset")) == ["a__x.jpg", "b__x.jpg"]
+
+    # Resuming from labels/ gives each image its own boxes back
+    resumed = AnnotationStore()
+    importer = LabelImporter(os.path.join(output, "labels"), os.path.join(output, "data.yaml"), folder=folder)
+    importer.load_now(resumed, [first, second])
+    importer.close()
+    for path in (first, second):
+        assert [resumed.box_coords(box) for box in resumed.rows(path)] == \
+            pytest.approx([store.box_coords(box) for box in store.rows(path)], abs=1e-3)
+
+
+def test_images_sharing_a_label_file_are_reported(tmp_path):
+    folder = str(tmp_path / "images")
+    output = str(tmp_path / "output")
+    jpeg = make_image(folder, "y.jpg")
+    png = make_image(folder, "y.png")
+    store = AnnotationStore()
+    store.add(jpeg, "cat", (1, 1, 5, 5))
+    store.add(png, "cat", (2, 2, 6, 6))
+
+    stats = export_dataset(store, [jpeg, png], output, workers=2, folder=folder)
+    assert [path for path, _ in stats.errors] == [png]
+    assert listing(os.path.join(output, "labels")) == ["y.txt"]
+    assert listing(os.path.join(output, "dataset")) == ["y.jpg"]
+    # The collided image stays dirty, and is reported again on the next export
+    assert store.dirty_paths() == [png]
+    assert [path for path, _ in export_dataset(store, [jpeg, png], output, workers=2, folder=folder).errors] == [png]
+
+
+def test_incremental_export(tmp_path):
+    folder = str(tmp_path / "images")
+    output = str(tmp_path / "output")
+    paths = [make_image(folder, f"{i}.jpg") for i in range(4)]
+    store = AnnotationStore()
+    boxes = [store.add(path, "cat", (10, 10, 20, 20)) for path in paths]
+
+    stats = export_dataset(store, paths, output, workers=2, folder=folder)
+    assert (stats.images, stats.labels_written) == (4, 4)
+    assert store.dirty_paths() == []
+
+    # Nothing changed
+    stats = export_dataset(store, paths, output, workers=2, folder=folder)
+    assert (stats.images, stats.labels_written, stats.labels_unchanged) == (0, 0, 0)
+
+    # One image edited, one emptied
+    store.add(paths[1], "cat", (30, 30, 40, 40))
+    store.remove(boxes[2])
+    stats = export_dataset(store, paths, output, workers=2, folder=folder)
+    assert (stats.images, stats.labels_written, stats.removed) == (0, 1, 1)
+    assert listing(os.path.join(output, "labels")) == ["0.txt", "1.txt", "3.txt"]
+    with open(os.path.join(output, MANIFEST_FILE)) as f:
+        assert sorted(json.load(f)["images"]) == [paths[0], paths[1], paths[3]]
+    with open(os.path.join(output, "labels", "1.txt")) as f:
+        assert len(f.read().splitlines()) == 2
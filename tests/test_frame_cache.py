@@ -0,0 +1,87 @@
+import itertools
+import os
+
+import pytest
+from PIL import Image
+
+from app import frame_cache
+from app.display import DecodedImage
+from app.frame_cache import FrameCache
+
+TARGET = (40, 30)
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    # Strictly increasing last_used stamps, so LRU order does not depend on timer resolution
+    ticks = itertools.count(1)
+    monkeypatch.setattr(frame_cache.time, "time", lambda: float(next(ticks)))
+
+
+def frame(tmp_path, name, color=(255, 0, 0), quality="full"):
+    path = tmp_path / name
+    if not path.exists():
+        Image.new("RGB", (80, 60), color).save(path)
+    image = Image.new("RGB", TARGET, color)
+    return DecodedImage(str(path), image, (80, 60), 0.5, quality)
+
+
+def test_put_then_get_round_trips_pixels(tmp_path):
+    cache = FrameCache(str(tmp_path / "cache"))
+    cache.put(frame(tmp_path, "a.png", (1, 2, 3)), TARGET)
+    decoded = cache.get(str(tmp_path / "a.png"), TARGET)
+    assert decoded.image.size == TARGET
+    assert decoded.image.getpixel((0, 0)) == (1, 2, 3)
+    assert (decoded.original_size, decoded.quality) == ((80, 60), "full")
+    assert cache.get(str(tmp_path / "a.png"), (50, 30)) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.close()
+
+
+def test_changed_source_invalidates_frame(tmp_path):
+    cache = FrameCache(str(tmp_path / "cache"))
+    cache.put(frame(tmp_path, "a.png"), TARGET)
+    stat = os.stat(tmp_path / "a.png")
+    os.utime(tmp_path / "a.png", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert cache.get(str(tmp_path / "a.png"), TARGET) is None
+    cache.close()
+
+
+def test_fast_render_never_replaces_full_one(tmp_path):
+    cache = FrameCache(str(tmp_path / "cache"))
+    cache.put(frame(tmp_path, "a.png", (255, 0, 0)), TARGET)
+    cache.put(frame(tmp_path, "a.png", (0, 255, 0), quality="fast"), TARGET)
+    decoded = cache.get(str(tmp_path / "a.png"), TARGET)
+    assert (decoded.quality, decoded.image.getpixel((0, 0))) == ("full", (255, 0, 0))
+    cache.close()
+
+
+def test_least_recently_used_frames_are_evicted(tmp_path):
+    nbytes = TARGET[0] * TARGET[1] * 3
+    cache = FrameCache(str(tmp_path / "cache"), max_bytes=2 * nbytes)
+    cache.put(frame(tmp_path, "a.png"), TARGET)
+    cache.put(frame(tmp_path, "b.png"), TARGET)
+    assert cache.get(str(tmp_path / "a.png"), TARGET) is not None
+    cache.put(frame(tmp_path, "c.png"), TARGET)
+    assert (cache.evictions, cache.total_bytes) == (1, 2 * nbytes)
+    assert cache.get(str(tmp_path / "b.png"), TARGET) is None
+    assert cache.get(str(tmp_path / "a.png"), TARGET) is not None
+    assert len([f for f in os.listdir(tmp_path / "cache") if f.endswith(".raw")]) == 2
+    cache.close()
+
+    # The total is read back from the index on reopen
+    reopened = FrameCache(str(tmp_path / "cache"), max_bytes=2 * nbytes)
+    assert reopened.total_bytes == 2 * nbytes
+    assert reopened.get(str(tmp_path / "c.png"), TARGET) is not None
+    reopened.close()
+
+
+def test_deleted_frame_file_is_a_miss(tmp_path):
+    cache = FrameCache(str(tmp_path / "cache"))
+    cache.put(frame(tmp_path, "a.png"), TARGET)
+    for file in os.listdir(tmp_path / "cache"):
+        if file.endswith(".raw"):
+            os.remove(tmp_path / "cache" / file)
+    assert cache.get(str(tmp_path / "a.png"), TARGET) is None
+    assert cache.total_bytes == 0
+    cache.close()
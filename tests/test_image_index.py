@@ -0,0 +1,126 @@
+import os
+
+import pytest
+from PIL import Image
+
+import app.image_index
+from app.image_index import ImageIndex, file_hash
+
+
+def make_image(folder, relative_path, size=(40, 30)):
+    path = os.path.join(folder, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.new("RGB", size).save(path)
+    return path
+
+
+def touch(path, mtime_ns):
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.fixture
+def probes(monkeypatch):
+    # Paths probed, in order
+    probed = []
+    probe_image = app.image_index.probe_image
+
+    def counting(image_path):
+        probed.append(image_path)
+        return probe_image(image_path)
+
+    monkeypatch.setattr(app.image_index, "probe_image", counting)
+    return probed
+
+
+def test_refresh_only_probes_new_and_changed_files(tmp_path, probes):
+    folder = str(tmp_path)
+    first = make_image(folder, "a.jpg")
+    second = make_image(folder, "sub/b.png", (50, 20))
+    index = ImageIndex(folder, database=":memory:", workers=2)
+    assert index.refresh() == (2, 0)
+    assert index.paths() == [first, second]
+    assert index.info(second)["width"] == 50
+
+    probes.clear()
+    assert index.refresh() == (0, 0)
+    assert probes == []
+
+    make_image(folder, "sub/b.png", (60, 20))
+    touch(second, 10 ** 18)
+    third = make_image(folder, "c.jpg")
+    assert index.refresh() == (2, 0)
+    assert sorted(probes) == sorted([second, third])
+    assert index.info(second)["width"] == 60
+    index.close()
+
+
+def test_remove_missing(tmp_path):
+    folder = str(tmp_path)
+    kept = make_image(folder, "a.jpg")
+    gone = make_image(folder, "b.jpg")
+    index = ImageIndex(folder, database=":memory:", workers=2)
+    index.refresh()
+    index.set_labelled([gone])
+    os.remove(gone)
+    assert index.refresh() == (0, 1)
+    assert index.paths() == [kept]
+    assert index.count(labelled=True) == 0
+
+    # The scanner's half: names seen by the walk against the known files before it
+    known = index.known_files()
+    assert index.remove_missing([], known) == [kept]
+    assert index.count() == 0
+    index.close()
+
+
+def test_the_index_is_kept_between_sessions(tmp_path, probes):
+    folder = str(tmp_path)
+    make_image(folder, "a.jpg")
+    database = str(tmp_path / "index.sqlite")
+    index = ImageIndex(folder, database=database, workers=2)
+    index.refresh()
+    index.close()
+    probes.clear()
+    index = ImageIndex(folder, database=database, workers=2)
+    assert index.refresh() == (0, 0)
+    assert probes == []
+    index.close()
+
+
+def test_get_many_reprobes_files_changed_since_the_refresh(tmp_path):
+    folder = str(tmp_path)
+    first = make_image(folder, "a.jpg", (40, 30))
+    second = make_image(folder, "b.jpg", (20, 10))
+    index = ImageIndex(folder, database=":memory:", workers=2)
+    index.refresh()
+    make_image(folder, "a.jpg", (80, 60))
+    touch(first, 10 ** 18)
+    assert index.get_many([first, second, first]).tolist() == [[80, 60], [20, 10], [80, 60]]
+    with pytest.raises(OSError):
+        index.get_many([os.path.join(folder, "missing.jpg")])
+    index.close()
+
+
+def test_content_hashes_are_computed_on_demand(tmp_path, monkeypatch):
+    folder = str(tmp_path)
+    path = make_image(folder, "a.png")
+    index = ImageIndex(folder, database=":memory:", workers=2)
+    index.refresh()
+    # Probing reads headers only
+    assert index.info(path)["hash"] is None
+    digest = index.content_hash(path)
+    assert digest == file_hash(path)
+    assert index.info(path)["hash"] == digest
+
+    # Stored hashes are reused while the file is unchanged...
+    monkeypatch.setattr(app.image_index, "file_hash", lambda file_path: pytest.fail("hashed again"))
+    assert index.content_hash(path) == digest
+    monkeypatch.undo()
+    # ...and dropped when it changes
+    make_image(folder, "a.png", (41, 30))
+    touch(path, 10 ** 18)
+    index.refresh()
+    assert index.info(path)["hash"] is None
+    assert index.content_hash(path) == file_hash(path) != digest
+    assert index.content_hash(os.path.join(folder, "missing.png")) is None
+    index.close()
@@ -0,0 +1,146 @@
+import os
+
+from app.journal import ADD, OP_ADD, Journal, encode_record
+from app.store import AnnotationStore
+
+
+def journaled_session(folder, edits):
+    # Apply edits ("add", path, label, coords) / ("remove", box) to a new store through a journal
+    store = AnnotationStore()
+    journal = Journal(str(folder))
+    journal.replay(store)
+    journal.start()
+    for edit in edits:
+        if edit[0] == "add":
+            _, path, label, coords = edit
+            box = store.add(path, label, coords)
+            journal.record_add(box, path, label, coords)
+        else:
+            store.remove(edit[1])
+            journal.record_remove(edit[1])
+    journal.close()
+    return store, journal
+
+
+def boxes(store):
+    return {box: (store.path(box), store.label(box), store.box_coords(box)) for box in store.live_rows().tolist()}
+
+
+def test_replay_restores_boxes_with_their_ids(tmp_path):
+    store, journal = journaled_session(tmp_path, [
+        ("add", "a.jpg", "cat", (1, 2, 3, 4)),
+        ("add", "a.jpg", "dog", (5, 6, 7, 8)),
+        ("add", "b.jpg", "cat", (9, 10, 11, 12)),
+        ("remove", 1),
+    ])
+    replayed = AnnotationStore()
+    # Two paths, two classes, three additions and a removal
+    assert Journal(str(tmp_path)).replay(replayed) == 8
+    assert boxes(replayed) == boxes(store)
+    assert list(replayed.rows("a.jpg")) == [0]
+    # The row of the removed box is handed out again
+    assert replayed.add("c.jpg", "cat", (0, 0, 1, 1)) == 1
+
+
+def test_replay_drops_a_torn_tail(tmp_path):
+    store, journal = journaled_session(tmp_path, [("add", "a.jpg", "cat", (1, 2, 3, 4))])
+    intact = os.path.getsize(journal.journal_path)
+    # A crash in the middle of writing the next record
+    record = encode_record(OP_ADD, ADD.pack(1, 0, 0, 5, 6, 7, 8))
+    with open(journal.journal_path, "ab") as f:
+        f.write(record[:len(record) - 3])
+
+    replayed = AnnotationStore()
+    assert Journal(str(tmp_path)).replay(replayed) == 3  # Path, class and one box
+    assert boxes(replayed) == boxes(store)
+    assert os.path.getsize(journal.journal_path) == intact
+
+
+def test_replay_stops_at_a_corrupt_record(tmp_path):
+    journaled_session(tmp_path, [("add", "a.jpg", "cat", (1, 2, 3, 4)), ("add", "a.jpg", "cat", (5, 6, 7, 8))])
+    path = os.path.join(tmp_path, ".yolo_labeling", "journal.bin")
+    with open(path, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xFF]))
+
+    replayed = AnnotationStore()
+    Journal(str(tmp_path)).replay(replayed)
+    assert boxes(replayed) == {0: ("a.jpg", "cat", (1.0, 2.0, 3.0, 4.0))}
+
+
+def test_compaction_moves_the_journal_into_a_snapshot(tmp_path):
+    store = AnnotationStore()
+    journal = Journal(str(tmp_path))
+    journal.replay(store)
+    journal.start()
+    first = store.add("a.jpg", "cat", (1, 2, 3, 4))
+    journal.record_add(first, "a.jpg", "cat", (1, 2, 3, 4))
+    second = store.add("b.jpg", "dog", (5, 6, 7, 8))
+    journal.record_add(second, "b.jpg", "dog", (5, 6, 7, 8))
+    journal.compact(store)
+    journal.flush()
+    assert os.path.exists(journal.snapshot_path)
+    assert os.path.getsize(journal.journal_path) == 0
+
+    # Edits after the compaction go to the emptied journal, with fresh path and class ids
+    store.remove(first)
+    journal.record_remove(first)
+    third = store.add("c.jpg", "bird", (9, 10, 11, 12))
+    journal.record_add(third, "c.jpg", "bird", (9, 10, 11, 12))
+    journal.close()
+
+    replayed = AnnotationStore()
+    assert Journal(str(tmp_path)).replay(replayed) == 4  # Remove, path, class, add
+    assert boxes(replayed) == boxes(store)
+
+
+def test_has_session(tmp_path):
+    journal = Journal(str(tmp_path))
+    assert not journal.has_session()
+    # A session closed by DONE: journal only, no snapshot
+    journaled_session(tmp_path, [("add", "a.jpg", "cat", (1, 2, 3, 4))])
+    assert not os.path.exists(journal.snapshot_path)
+    assert journal.has_session()
+
+
+def test_extend_records_replay_at_their_box_ids(tmp_path):
+    store = AnnotationStore()
+    journal = Journal(str(tmp_path))
+    journal.replay(store)
+    journal.start()
+    box = store.add("a.jpg", "cat", (1, 2, 3, 4))
+    journal.record_add(box, "a.jpg", "cat", (1, 2, 3, 4))
+    store.remove(box)
+    journal.record_remove(box)
+    # An imported chunk is appended after every row ever handed out, not in the freed one
+    start = store.rows_used
+    store.extend(["b.jpg", "c.jpg", "b.jpg"], ["dog", "cat", "bird"], [(5, 6, 7, 8), (9, 10, 11, 12), (1, 1, 2, 2)])
+    journal.record_extend(store, start, store.rows_used)
+    journal.close()
+
+    replayed = AnnotationStore()
+    # Path, class, add and remove, then two paths, two classes and the extend
+    assert Journal(str(tmp_path)).replay(replayed) == 9
+    assert boxes(replayed) == boxes(store)
+    assert list(replayed.rows("b.jpg")) == [1, 3]
+    assert replayed.add("d.jpg", "cat", (0, 0, 1, 1)) == 0
+
+
+def test_import_marker_is_removed_once_the_import_is_in_a_snapshot(tmp_path):
+    store = AnnotationStore()
+    journal = Journal(str(tmp_path))
+    journal.replay(store)
+    journal.start()
+    journal.begin_import()
+    assert Journal(str(tmp_path)).import_pending()
+    store.extend(["a.jpg"], ["cat"], [(1, 2, 3, 4)])
+    journal.record_extend(store, 0, store.rows_used)
+    journal.end_import(store)
+    journal.close()
+    assert not journal.import_pending()
+    assert os.path.getsize(journal.journal_path) == 0
+    replayed = AnnotationStore()
+    Journal(str(tmp_path)).replay(replayed)
+    assert boxes(replayed) == boxes(store)
@@ -0,0 +1,96 @@
+import os
+
+from PIL import Image
+
+from app.stored_label_check import render_label_checks
+
+
+def make_dataset(directory, names):
+    os.makedirs(os.path.join(directory, "dataset"), exist_ok=True)
+    os.makedirs(os.path.join(directory, "labels"), exist_ok=True)
+    for name in names:
+        Image.new("RGB", (120, 90), "gray").save(os.path.join(directory, "dataset", name + ".jpg"))
+        write_label(directory, name, "0 0.5 0.5 0.4 0.3\n")
+
+
+def write_label(directory, name, text, mtime_ns=None):
+    path = os.path.join(directory, "labels", name + ".txt")
+    with open(path, "w") as f:
+        f.write(text)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def counts(stats):
+    return stats.rendered, stats.unchanged, stats.removed, stats.errors
+
+
+def test_label_checks_are_rendered_incrementally(tmp_path):
+    directory = str(tmp_path)
+    output = os.path.join(directory, "labelcheck")
+    make_dataset(directory, ["a", "b", "c"])
+    assert counts(render_label_checks(directory, workers=1)) == (3, 0, 0, [])
+    assert sorted(name for name in os.listdir(output) if name.endswith(".jpg")) == ["a.jpg", "b.jpg", "c.jpg"]
+
+    # Nothing changed
+    assert counts(render_label_checks(directory, workers=1)) == (0, 3, 0, [])
+
+    # An edited label is rendered again, an image that left the dataset loses its output
+    write_label(directory, "b", "0 0.2 0.2 0.1 0.1\n1 0.7 0.7 0.2 0.2\n", mtime_ns=10 ** 18)
+    os.remove(os.path.join(directory, "dataset", "c.jpg"))
+    assert counts(render_label_checks(directory, workers=1)) == (1, 1, 1, [])
+    assert not os.path.exists(os.path.join(output, "c.jpg"))
+
+    # A missing output is rendered again even if its inputs did not change, and force renders all
+    os.remove(os.path.join(output, "a.jpg"))
+    assert counts(render_label_checks(directory, workers=1)) == (1, 1, 0, [])
+    assert counts(render_label_checks(directory, workers=1, force=True)) == (2, 0, 0, [])
+
+
+def test_a_bad_image_is_reported_without_stopping_the_run(tmp_path):
+    directory = str(tmp_path)
+    make_dataset(directory, ["a", "b"])
+    with open(os.path.join(directory, "dataset", "b.jpg"), "wb") as f:
+        f.write(b"not a jpeg")
+    stats = render_label_checks(directory, workers=1)
+    assert (stats.rendered, [name for name, _ in stats.errors]) == (1, ["b.jpg"])
+    # Failed outputs are not recorded, so the next run tries again
+    assert [name for name, _ in render_label_checks(directory, workers=1).errors] == ["b.jpg"]
+
+
+def test_previews_are_rendered_incrementally(tmp_path):
+    directory = str(tmp_path)
+    output = os.path.join(directory, "labelcheck", "previews")
+    make_dataset(directory, ["a", "b", "c"])
+    assert counts(render_label_checks(directory, workers=1, mode="previews")) == (3, 0, 0, [])
+    assert sorted(name for name in os.listdir(output) if name.endswith(".jpg")) == ["a.jpg", "b.jpg", "c.jpg"]
+    with Image.open(os.path.join(output, "a.jpg")) as preview:
+        assert max(preview.size) <= 256
+
+    # Nothing changed
+    assert counts(render_label_checks(directory, workers=1, mode="previews")) == (0, 3, 0, [])
+
+    # An edited label is rendered again, an image that left the dataset loses its output
+    write_label(directory, "b", "0 0.2 0.2 0.1 0.1\n1 0.7 0.7 0.2 0.2\n", mtime_ns=10 ** 18)
+    os.remove(os.path.join(directory, "dataset", "c.jpg"))
+    assert counts(render_label_checks(directory, workers=1, mode="previews")) == (1, 1, 1, [])
+    assert not os.path.exists(os.path.join(output, "c.jpg"))
+
+    # A missing output is rendered again even if its inputs did not change, and force renders all
+    os.remove(os.path.join(output, "a.jpg"))
+    assert counts(render_label_checks(directory, workers=1, mode="previews")) == (1, 1, 0, [])
+    assert counts(render_label_checks(directory, workers=1, mode="previews", force=True)) == (2, 0, 0, [])
+
+
+def test_contact_sheets_are_paged(tmp_path):
+    directory = str(tmp_path)
+    make_dataset(directory, [f"{i:02d}" for i in range(7)])
+    stats = render_label_checks(directory, workers=1, mode="sheets", columns=2, rows=2, preview_size=(64, 64))
+    assert counts(stats) == (2, 0, 0, [])
+    output = os.path.join(directory, "labelcheck", "sheets")
+    assert sorted(os.listdir(output)) == ["index.html", "labelcheck_manifest.json", "sheet_00001.jpg",
+                                          "sheet_00002.jpg"]
+    # Only the page holding a changed image is rendered again
+    write_label(directory, "05", "0 0.3 0.3 0.2 0.2\n", mtime_ns=10 ** 18)
+    stats = render_label_checks(directory, workers=1, mode="sheets", columns=2, rows=2, preview_size=(64, 64))
+    assert counts(stats) == (1, 1, 0, [])
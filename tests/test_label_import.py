@@ -0,0 +1,84 @@
+import os
+
+import pytest
+from PIL import Image
+
+from app.export import MANIFEST_FILE, export_dataset
+from app.label_import import LabelImporter
+from app.store import AnnotationStore
+
+
+def make_images(folder, names, size=(100, 80)):
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for name in names:
+        paths.append(os.path.join(folder, name))
+        Image.new("RGB", size).save(paths[-1])
+    return paths
+
+
+def exported(tmp_path, names=("x.jpg", "y.jpg")):
+    # Images of tmp_path/images with one box each, exported to tmp_path/output
+    folder = str(tmp_path / "images")
+    output = str(tmp_path / "output")
+    paths = make_images(folder, names)
+    store = AnnotationStore()
+    for i, path in enumerate(paths):
+        store.add(path, "cat", (10 + i, 10, 30, 40))
+    export_dataset(store, paths, output, workers=2, folder=folder)
+    return folder, output, paths, store
+
+
+def imported(output, folder, image_paths, skip=()):
+    store = AnnotationStore()
+    importer = LabelImporter(os.path.join(output, "labels"), os.path.join(output, "data.yaml"), folder=folder,
+                             skip=skip)
+    empty = importer.empty()
+    importer.load_now(store, image_paths)
+    importer.close()
+    return store, empty
+
+
+def test_labels_come_back_for_the_exported_folder(tmp_path):
+    folder, output, paths, store = exported(tmp_path)
+    resumed, empty = imported(output, folder, paths)
+    assert not empty
+    for path in paths:
+        assert [resumed.box_coords(box) for box in resumed.rows(path)] == \
+            pytest.approx([store.box_coords(box) for box in store.rows(path)], abs=1e-3)
+
+
+def test_labels_of_another_folder_are_not_imported(tmp_path):
+    _, output, _, _ = exported(tmp_path)
+    # Same file names, different folder
+    other = make_images(str(tmp_path / "other"), ["x.jpg", "y.jpg"])
+    resumed, empty = imported(output, str(tmp_path / "other"), other)
+    assert empty
+    assert len(resumed) == 0
+
+
+def test_without_a_manifest_labels_are_matched_by_name(tmp_path):
+    _, output, _, _ = exported(tmp_path)
+    os.remove(os.path.join(output, MANIFEST_FILE))
+    other = make_images(str(tmp_path / "other"), ["x.jpg", "z.jpg"])
+    resumed, _ = imported(output, str(tmp_path / "other"), other)
+    assert resumed.count(other[0]) == 1
+    assert resumed.count(other[1]) == 0
+
+
+def test_skipped_and_already_loaded_images_are_not_imported_again(tmp_path):
+    folder, output, paths, _ = exported(tmp_path)
+    resumed, _ = imported(output, folder, paths, skip=[paths[0]])
+    assert (resumed.count(paths[0]), resumed.count(paths[1])) == (0, 1)
+
+    store = AnnotationStore()
+    importer = LabelImporter(os.path.join(output, "labels"), os.path.join(output, "data.yaml"), folder=folder)
+    importer.load_now(store, paths[:1])
+    # The background pass gets every image; the one loaded already is left out
+    importer.submit(paths)
+    for future in importer.futures:
+        future.result()
+    importer.apply_ready(store)
+    importer.close()
+    assert (store.count(paths[0]), store.count(paths[1])) == (1, 1)
+    assert importer.empty()
@@ -0,0 +1,63 @@
+import os
+import time
+
+from app.scanner import FolderScanner, walk_images
+
+
+def make_files(root, names):
+    for name in names:
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"x" * len(name))
+
+
+def walked(root, **patterns):
+    return [entry[0] for entry in walk_images(str(root), **patterns)]
+
+
+def test_default_patterns_fold_case_and_skip_hidden_directories(tmp_path):
+    make_files(tmp_path, ["a.jpg", "B.JPG", "c.Png", "d.jpeg", "e.txt", "f.gif", "clip.MP4",
+                          os.path.join("sub", "g.jpg"), os.path.join(".yolo_labeling", "h.jpg"),
+                          os.path.join(".hidden", "i.png")])
+    assert sorted(walked(tmp_path)) == sorted(["a.jpg", "B.JPG", "c.Png", "d.jpeg", "clip.MP4",
+                                               os.path.join("sub", "g.jpg")])
+
+
+def test_include_and_exclude_patterns(tmp_path):
+    make_files(tmp_path, ["a.jpg", "a.png", os.path.join("raw", "b.jpg"), os.path.join("keep", "raw.jpg")])
+    assert sorted(walked(tmp_path, include=("*.PNG",))) == ["a.png"]
+    # Patterns match the file name or the path relative to the root; an excluded directory is not entered
+    assert sorted(walked(tmp_path, exclude=("raw",))) == sorted(["a.jpg", "a.png", os.path.join("keep", "raw.jpg")])
+    assert sorted(walked(tmp_path, exclude=("RAW.*",))) == sorted(["a.jpg", "a.png", os.path.join("raw", "b.jpg")])
+    assert walked(tmp_path, include=("keep/*",)) == [os.path.join("keep", "raw.jpg")]
+
+
+def test_entries_carry_size_and_mtime_and_subfolders_come_in_name_order(tmp_path):
+    make_files(tmp_path, [os.path.join("b", "x.jpg"), os.path.join("a", "y.jpg"), os.path.join("a", "c", "z.jpg")])
+    entries = list(walk_images(str(tmp_path)))
+    assert [entry[0] for entry in entries] == [os.path.join("a", "y.jpg"), os.path.join("a", "c", "z.jpg"),
+                                               os.path.join("b", "x.jpg")]
+    path = os.path.join(tmp_path, "a", "y.jpg")
+    assert entries[0][1:] == (os.path.getsize(path), os.stat(path).st_mtime_ns)
+
+
+def test_symlinked_directories_are_not_followed(tmp_path):
+    make_files(tmp_path / "real", ["a.jpg"])
+    os.symlink(tmp_path / "real", tmp_path / "link", target_is_directory=True)
+    assert walked(tmp_path) == [os.path.join("real", "a.jpg")]
+
+
+def test_scanner_delivers_processed_batches(tmp_path):
+    make_files(tmp_path, [f"{i:03d}.jpg" for i in range(50)])
+    scanner = FolderScanner(str(tmp_path), batch_size=16, process=lambda batch: [entry[0] for entry in batch])
+    scanner.start()
+    batches = []
+    deadline = time.monotonic() + 10
+    while not scanner.done() and time.monotonic() < deadline:
+        batches.extend(scanner.poll())
+        time.sleep(0.01)
+    assert scanner.done() and scanner.error is None
+    # The first file comes on its own so the GUI can show it right away
+    assert len(batches[0]) == 1
+    assert sorted(name for batch in batches for name in batch) == [f"{i:03d}.jpg" for i in range(50)]
@@ -0,0 +1,57 @@
+from app.spatial_index import GridIndex
+
+
+def test_pick_prefers_the_smallest_box():
+    index = GridIndex((1000, 800))
+    index.insert("large", (0, 0, 500, 500))
+    index.insert("small", (100, 100, 150, 150))
+    index.insert("medium", (50, 50, 300, 300))
+    assert index.pick(120, 120) == "small"
+    assert index.pick(200, 200) == "medium"
+    assert index.pick(400, 400) == "large"
+    assert index.pick(900, 700) is None
+
+
+def test_pick_prefers_the_newest_of_equal_boxes():
+    index = GridIndex((1000, 800))
+    index.insert("first", (10, 10, 60, 60))
+    index.insert("second", (20, 20, 70, 70))
+    assert index.pick(40, 40) == "second"
+    # Inserting again moves a box to the top
+    index.insert("first", (10, 10, 60, 60))
+    assert index.pick(40, 40) == "first"
+    index.remove("first")
+    assert index.pick(40, 40) == "second"
+
+
+def test_corners_in_any_order_and_edges_count():
+    index = GridIndex((1000, 800))
+    index.insert(1, (60, 70, 10, 20))
+    assert index.pick(10, 20) == 1
+    assert index.pick(60, 70) == 1
+    assert index.pick(61, 70) is None
+
+
+def test_query_rect():
+    index = GridIndex((1000, 800), cells_per_side=10)
+    index.insert("a", (0, 0, 50, 50))
+    index.insert("b", (200, 200, 260, 240))
+    index.insert("c", (900, 700, 990, 790))
+    assert sorted(index.query_rect(40, 40, 210, 210)) == ["a", "b"]
+    assert sorted(index.query_rect(260, 240, 100, 100)) == ["b"]
+    assert index.query_rect(300, 300, 400, 400) == []
+    # A query larger than the image walks the occupied cells instead of every cell
+    assert sorted(index.query_rect(-1e6, -1e6, 1e6, 1e6)) == ["a", "b", "c"]
+
+
+def test_oversized_boxes_are_still_found():
+    index = GridIndex((1000, 800), cells_per_side=64, max_cells_per_box=4)
+    index.insert("whole", (0, 0, 1000, 800))
+    index.insert("small", (10, 10, 12, 12))
+    assert "whole" in index.oversized
+    assert index.pick(500, 400) == "whole"
+    assert index.pick(11, 11) == "small"
+    assert sorted(index.query_rect(5, 5, 15, 15)) == ["small", "whole"]
+    index.remove("whole")
+    assert index.pick(500, 400) is None
+    assert len(index) == 1
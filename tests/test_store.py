@@ -0,0 +1,48 @@
+import numpy as np
+
+from app.store import AnnotationStore
+
+
+def test_put_places_boxes_at_their_ids():
+    store = AnnotationStore(capacity=2)
+    store.put(5, "a.jpg", "cat", (1, 2, 3, 4))
+    store.put(2, "b.jpg", "dog", (5, 6, 7, 8))
+    store.rebuild_free_rows()
+    assert len(store) == 2
+    assert store.path(5) == "a.jpg" and store.label(2) == "dog"
+    # Free rows are handed out lowest first
+    assert [store.add("c.jpg", "cat", (0, 0, 1, 1)) for _ in range(5)] == [0, 1, 3, 4, 6]
+
+
+def test_put_over_a_live_box_moves_it():
+    store = AnnotationStore()
+    store.put(0, "a.jpg", "cat", (1, 2, 3, 4))
+    store.put(0, "b.jpg", "cat", (1, 2, 3, 4))
+    assert list(store.rows("a.jpg")) == []
+    assert list(store.rows("b.jpg")) == [0]
+
+
+def test_snapshot_and_restore_keep_box_ids():
+    store = AnnotationStore()
+    for i in range(6):
+        store.add(f"{i % 2}.jpg", ("cat", "dog")[i % 3 == 0], (i, i, i + 1, i + 1))
+    store.remove(2)
+    restored = AnnotationStore()
+    restored.restore(store.snapshot())
+    assert len(restored) == 5
+    for path in ("0.jpg", "1.jpg"):
+        assert list(restored.rows(path)) == list(store.rows(path))
+    for box in store.live_rows().tolist():
+        assert restored.box_coords(box) == store.box_coords(box)
+        assert restored.label(box) == store.label(box)
+    assert restored.add("2.jpg", "cat", (0, 0, 1, 1)) == 2
+
+
+def test_extend_groups_rows_per_image():
+    store = AnnotationStore(capacity=1)
+    rows = store.extend(["a", "b", "a", "c", "b"], ["x", "y", "x", "x", "y"], np.arange(20).reshape(5, 4))
+    assert rows.tolist() == [0, 1, 2, 3, 4]
+    assert list(store.rows("a")) == [0, 2]
+    assert list(store.rows("b")) == [1, 4]
+    assert store.used_class_names() == ["x", "y"]
+    assert sorted(store.dirty_paths()) == ["a", "b", "c"]
@@ -0,0 +1,77 @@
+import itertools
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app import tiles
+from app.tiles import TileSource
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    # Strictly increasing last_used stamps, so LRU order does not depend on timer resolution
+    ticks = itertools.count(1)
+    monkeypatch.setattr(tiles.time, "time", lambda: float(next(ticks)))
+
+
+def image(tmp_path, name, size=(1000, 700)):
+    path = tmp_path / name
+    pixels = np.random.default_rng(len(name)).integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+    Image.fromarray(pixels).save(path)
+    return str(path)
+
+
+def saved_tiles(root):
+    return sorted(os.path.relpath(os.path.join(d, f), root) for d, _, files in os.walk(root)
+                  for f in files if f.endswith(".jpg"))
+
+
+def test_levels_are_saved_and_read_back(tmp_path):
+    source = TileSource(workers=1)
+    source.set_folder(str(tmp_path))
+    pyramid = source.pyramid(image(tmp_path, "a.png"), (1000, 700))
+    assert pyramid.max_level == 2 and pyramid.grid(0) == (4, 3)
+    tile = source.tile(pyramid, 0, 3, 2)
+    assert tile.size == (1000 - 768, 700 - 512)
+    assert source.disk.has_level(pyramid, 0) and not source.disk.has_level(pyramid, 1)
+    # Every tile of the level was cut from the one decode
+    assert len(saved_tiles(source.cache_root)) == 12
+    source.tiles.clear()
+    assert source._read_saved(pyramid, 0, 0, 0).size == (256, 256)
+    source.close()
+
+
+def test_disk_cache_evicts_least_recently_used_levels(tmp_path):
+    source = TileSource(workers=1)
+    source.set_folder(str(tmp_path))
+    a = source.pyramid(image(tmp_path, "a.png"), (1000, 700))
+    b = source.pyramid(image(tmp_path, "bb.png"), (1000, 700))
+    source.tile(a, 0, 0, 0)
+    level_bytes = source.disk.total_bytes
+    source.close()
+
+    # Room for about one and a half full-resolution levels
+    source = TileSource(workers=1, max_disk_bytes=level_bytes * 3 // 2)
+    source.set_folder(str(tmp_path))
+    assert source.disk.has_level(a, 0)
+    source.tile(b, 0, 0, 0)
+    assert source.disk.evictions == 1
+    assert not source.disk.has_level(a, 0) and source.disk.has_level(b, 0)
+    assert source.disk.total_bytes <= source.max_disk_bytes
+    assert not os.path.exists(a.cache_dir)
+    assert all(path.startswith(os.path.basename(b.cache_dir)) for path in saved_tiles(source.cache_root))
+    source.close()
+
+
+def test_unindexed_tiles_are_not_used(tmp_path):
+    # Tiles of an interrupted save are on disk but not in the index
+    source = TileSource(workers=1)
+    source.set_folder(str(tmp_path))
+    pyramid = source.pyramid(image(tmp_path, "a.png", (300, 200)), (300, 200))
+    os.makedirs(pyramid.cache_dir)
+    Image.new("RGB", (256, 200)).save(pyramid.tile_file(0, 0, 0))
+    assert source._read_saved(pyramid, 0, 0, 0) is None
+    assert source.tile(pyramid, 0, 0, 0).getpixel((0, 0)) != (0, 0, 0)
+    source.close()
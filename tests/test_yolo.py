@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.yolo import denormalize, format_label_bodies, format_labels, normalize, probe_size
+
+
+def test_label_formatter_matches_printf():
+    rng = np.random.default_rng(0)
+    classes = rng.integers(0, 120, 500)
+    boxes = rng.random((500, 4))
+    boxes[:5] = [[0, 0, 1, 1], [1, 1, 1, 1], [0.5, 0.5, 0.5, 0.5], [1e-7, 0.9999996, 0.3, 0.25], [0, 1, 0, 1]]
+    expected = [f"{c} {x:.6f} {y:.6f} {w:.6f} {h:.6f}\n" for c, (x, y, w, h) in zip(classes.tolist(), boxes.tolist())]
+    assert format_labels(classes, boxes) == "".join(expected)
+    counts = np.array([3, 0, 497])
+    assert format_label_bodies(classes, boxes, counts) == ["".join(expected[:3]), "", "".join(expected[3:])]
+
+
+def test_normalize_swaps_corners_clamps_and_round_trips():
+    sizes = np.array([[200, 100], [200, 100]])
+    boxes = normalize([[150, 80, 50, 20], [-10, -10, 100, 50]], sizes)
+    assert boxes == pytest.approx(np.array([[0.5, 0.5, 0.5, 0.6], [0.25, 0.25, 0.5, 0.5]]))
+    rows = np.column_stack((np.zeros(2), boxes))
+    assert denormalize(rows, sizes) == pytest.approx(np.array([[50, 20, 150, 80], [0, 0, 100, 50]]))
+
+
+def test_probe_size_reads_headers(tmp_path):
+    for name, size, options in (("a.png", (37, 21), {}), ("b.jpg", (640, 480), {}),
+                                ("c.jpg", (33, 17), {"progressive": True}), ("d.bmp", (5, 9), {})):
+        path = str(tmp_path / name)
+        Image.new("RGB", size).save(path, **options)
+        assert probe_size(path) == size